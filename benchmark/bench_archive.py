@@ -0,0 +1,173 @@
+"""Hot/cold archival: everyday invoice queries before and after moving closed years out
+
+Builds a temporary SQLite database with several years of invoices, times the everyday
+queries, archives the closed years with model.invoice_archive (stopping the first run
+half way and leaving a batch copied but not deleted, as a crash between the two files
+would) and runs it again to finish. Then checks that nothing was lost or duplicated,
+that monthly revenue of archived months is unchanged, that get_invoice_by_id and the
+reports still reach archived invoices with include_archive=True, and times the
+everyday queries again.
+
+Usage: python -m benchmark.bench_archive [--invoices 200000] [--months 36] [--repeat 5]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+from benchmark.generate import generate
+from model.connection_pool import close_all_pools, get_pool
+
+
+class Stop(Exception):
+    pass
+
+
+def _timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def _everyday(invoice_model, report, repeat):
+    now = datetime.now()
+    invoice_model.catalog.invalidate()
+    cases = {
+        "Invoice.get_invoices_page": lambda: invoice_model.get_invoices_page(100),
+        "Invoice.get_all_invoices": invoice_model.get_all_invoices,
+        "Invoice.search_invoices": lambda: invoice_model.search_invoices("nguyen"),
+        "MedicineCatalog.get_all": lambda: (invoice_model.catalog.invalidate(), invoice_model.get_all_medicines()),
+        "ReportModel.get_revenue_by_month": lambda: report.get_revenue_by_month(now.month, now.year),
+        "InvoiceTotals.verify": invoice_model.totals.verify,
+    }
+    return {label: _timed(fn, repeat) for label, fn in cases.items()}
+
+
+def _check(condition, message):
+    if not condition:
+        raise SystemExit(f"Sai: {message}")
+    print(f"  đạt: {message}")
+
+
+def run(db, path, repeat, batch_size):
+    from model.invoice import Invoice
+    from model.invoice_archive import InvoiceArchive
+    from model.report import ReportModel
+
+    invoice_model = Invoice(db)
+    invoice_model.totals.ensure_table()
+    invoice_model.search_index.ensure_table()
+    report = ReportModel(path, "sqlite")
+    report.ensure_indexes()
+    archive = InvoiceArchive(db, batch_size=batch_size)
+    through = datetime.now().year - 1 - archive.keep_years
+
+    def counts():
+        row = db.fetch_query("""
+            SELECT (SELECT COUNT(*) FROM HOA_DON) as hoa_don, (SELECT COUNT(*) FROM HOA_DON_THUOC) as dong,
+                   (SELECT COUNT(*) FROM HOA_DON_TONG) as tong
+        """)[0]
+        return row['hoa_don'], row['dong'], row['tong']
+
+    old = db.fetch_query("SELECT ma_hoa_don, ngay_gio FROM HOA_DON WHERE ngay_gio < %s ORDER BY ngay_gio LIMIT 1",
+                         (f"{through + 1}-01-01",))
+    if not old:
+        raise SystemExit(f"Không có hóa đơn nào đến hết năm {through}; tăng --months")
+    old_id = old[0]['ma_hoa_don']
+    old_date = datetime.strptime(str(old[0]['ngay_gio'])[:10], "%Y-%m-%d")
+    old_invoice = invoice_model.get_invoice_by_id(old_id)
+    old_revenue = report.sum_revenue(report.get_revenue_by_month(old_date.month, old_date.year))
+    old_lines = report.revenue_exists(old_date.month, old_date.year)
+    before_counts = counts()
+    before = _everyday(invoice_model, report, repeat)
+
+    print(f"Lưu trữ hóa đơn đến hết năm {through} (lô {archive.batch_size}):")
+    batches = []
+
+    def stop_after_three(moved):
+        batches.append(moved)
+        if len(batches) == 3:
+            raise Stop()
+    try:
+        archive.run(progress=stop_after_three)
+    except Stop:
+        pass
+    tables = archive.tables()
+    # A crash between the two files: the next batch is in the archive but still in the hot tables
+    pending = [r['ma_hoa_don'] for r in db.fetch_query(
+        "SELECT ma_hoa_don FROM HOA_DON WHERE ngay_gio < %s ORDER BY ngay_gio, ma_hoa_don LIMIT 10",
+        (f"{through + 1}-01-01",))]
+    placeholders = ", ".join(["%s"] * len(pending))
+    with db.transaction():
+        for hot in ("HOA_DON_THUOC", "HOA_DON_TONG", "HOA_DON"):
+            db.execute_query(f"INSERT INTO {tables[hot]} SELECT * FROM {hot} WHERE ma_hoa_don IN ({placeholders})",
+                             tuple(pending))
+    start = time.perf_counter()
+    moved = archive.run()
+    seconds = time.perf_counter() - start
+    print(f"  dừng sau {batches[-1]} hóa đơn, chạy lại chuyển nốt {moved} hóa đơn "
+          f"trong {seconds:.1f}s ({moved / seconds:,.0f} hóa đơn/s)")
+
+    status = archive.status()
+    for table, (hot, cold) in status["counts"].items():
+        print(f"  {table:<14} đang dùng {hot:>9}   lưu trữ {cold:>9}")
+    _check(all(hot + cold == total for (hot, cold), total in zip(status["counts"].values(), before_counts)),
+           "không mất và không trùng dòng nào")
+    _check(db.fetch_query("SELECT COUNT(*) as n FROM HOA_DON WHERE ngay_gio < %s",
+                          (f"{through + 1}-01-01",))[0]['n'] == 0, "bảng đang dùng không còn hóa đơn năm cũ")
+    _check(invoice_model.get_invoice_by_id(old_id) == [], "tra cứu thường chỉ đọc bảng đang dùng")
+    _check(invoice_model.get_invoice_by_id(old_id, include_archive=True) == old_invoice,
+           "get_invoice_by_id(include_archive=True) đọc được hóa đơn đã lưu trữ")
+    _check(report.sum_revenue(report.get_revenue_by_month(old_date.month, old_date.year)) == old_revenue,
+           "doanh thu tháng đã lưu trữ không đổi")
+    _check(report.revenue_exists(old_date.month, old_date.year) == 0
+           and report.revenue_exists(old_date.month, old_date.year, include_archive=True) == old_lines,
+           "revenue_exists(include_archive=True) gộp cả hai tầng")
+    _check(archive.run() == 0, "chạy lại khi đã xong không làm gì")
+
+    after = _everyday(invoice_model, report, repeat)
+    print(f"\n{'truy vấn hằng ngày':<36}{'trước (ms)':>12}{'sau (ms)':>12}{'nhanh hơn':>11}")
+    for label in before:
+        print(f"{label:<36}{before[label]:>12.1f}{after[label]:>12.1f}{before[label] / after[label]:>10.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--invoices", type=int, default=200000)
+    parser.add_argument("--months", type=int, default=36)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, "archive_bench.db")
+        os.environ["DB_SLOW_QUERY_LOG"] = os.path.join(tmp, "slow.log")
+        os.environ["DB_JOURNAL_PATH"] = os.path.join(tmp, "journal.db")
+        os.environ["DB_ARCHIVE_PATH"] = os.path.join(tmp, "archive.db")
+        os.environ["DB_BACKEND"] = "sqlite"
+        os.environ["DB_SQLITE_PATH"] = path
+        conn = get_pool("sqlite", None, path).acquire()
+        try:
+            generate(conn, invoices=args.invoices, staff=100, medicines=1000, months=args.months, progress=False)
+        finally:
+            conn.close()
+
+        from model.database import Database
+        db = Database()
+        if not db.connect():
+            raise SystemExit("Không kết nối được cơ sở dữ liệu")
+        run(db, path, args.repeat, args.batch)
+    finally:
+        close_all_pools()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
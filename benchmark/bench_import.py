@@ -0,0 +1,133 @@
+"""Bulk import throughput: controller.bulk_import against typing records in one at a time
+
+Writes CSV files with staff, medicines and historical invoices (with a few bad rows
+mixed in), imports them into a temporary SQLite database and checks the rows per
+minute against the target. The baseline is Staff.create_staff called row by row,
+which is what the staff form does.
+
+Usage: python -m benchmark.bench_import [--staff 100000] [--invoices 35000] [--target 100000]
+"""
+import argparse
+import csv
+import os
+import random
+import tempfile
+import time
+
+from benchmark.generate import DON_VI, HANG_SX, HOAT_CHAT, POSITIONS, _name, generate
+from controller.bulk_import import COLUMNS, BulkImporter
+from model.connection_pool import close_all_pools, get_pool
+
+# One row in this many is broken on purpose
+BAD_EVERY = 200
+
+
+def _write(path, kind, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS[kind])
+        writer.writerows(rows)
+
+
+def _staff_rows(count, rng):
+    managers = []
+    for i in range(count):
+        ma_nv = f"NK{i:07d}"
+        chuc_vu = POSITIONS[0][0] if i % 50 == 0 else rng.choice(POSITIONS[1:])[0]
+        sdt = f"09{rng.randrange(10 ** 8):08d}"
+        if i % BAD_EVERY == 7:
+            sdt = "09x"
+        if chuc_vu == POSITIONS[0][0]:
+            ma_quan_ly = ""
+            managers.append(ma_nv)
+        elif i % 50 == 1 and i + 49 < count:
+            # Listed before their manager, so the row has to wait for it
+            ma_quan_ly = f"NK{i + 49:07d}"
+        else:
+            ma_quan_ly = managers[-1]
+        yield (ma_nv, _name(rng), sdt, chuc_vu, f"20{rng.randrange(10, 25)}-0{rng.randrange(1, 10)}-15", ma_quan_ly)
+
+
+def _medicine_rows(count, rng):
+    for i in range(count):
+        yield (f"TK{i:05d}", f"{rng.choice(HOAT_CHAT)} {rng.choice((250, 500))}mg", rng.choice(HANG_SX),
+               -5 if i % BAD_EVERY == 3 else rng.randrange(100, 5000))
+
+
+def _invoice_rows(count, rng, staff, medicines):
+    for i in range(count):
+        ma_hoa_don = f"HK{i:08d}"
+        ngay_gio = f"2023-{i % 12 + 1:02d}-{i % 28 + 1:02d} {i % 24:02d}:15:00"
+        ma_nv = "NVXX" if i % BAD_EVERY == 5 else rng.choice(staff)
+        for ma_thuoc in rng.sample(medicines, 3):
+            yield (ma_hoa_don, _name(rng), ngay_gio, ma_nv, rng.choice((0, 5, 10)), ma_thuoc,
+                   rng.choice(DON_VI), rng.randrange(1, 5), rng.randrange(10, 500) * 1000)
+
+
+def _report(label, result):
+    rate = result['imported'] / result['seconds'] * 60
+    print(f"  {label:<22}{result['imported']:>8} dòng, loại {result['rejected']:>5}, "
+          f"{result['seconds']:>6.1f}s  {rate:>10,.0f} dòng/phút")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--staff", type=int, default=100000)
+    parser.add_argument("--medicines", type=int, default=2000)
+    parser.add_argument("--invoices", type=int, default=35000, help="hóa đơn 3 dòng mỗi hóa đơn")
+    parser.add_argument("--baseline", type=int, default=2000, help="số nhân viên thêm từng người một để so sánh")
+    parser.add_argument("--target", type=float, default=100000, help="dòng mỗi phút")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "import.db")
+        os.environ["DB_BACKEND"] = "sqlite"
+        os.environ["DB_SQLITE_PATH"] = path
+        os.environ["DB_SLOW_QUERY_LOG"] = os.path.join(tmp, "slow.log")
+        conn = get_pool("sqlite", None, path).acquire()
+        try:
+            generate(conn, invoices=1000, staff=50, medicines=50, months=3, progress=False)
+        finally:
+            conn.close()
+
+        from model.database import Database
+        db = Database()
+        try:
+            db.connect()
+            importer = BulkImporter(db)
+            files = {kind: os.path.join(tmp, f"{kind}.csv") for kind in COLUMNS}
+            _write(files["staff"], "staff", _staff_rows(args.staff, rng))
+            _write(files["medicines"], "medicines", _medicine_rows(args.medicines, rng))
+
+            print("Nhập hàng loạt:")
+            rates = [_report("nhân viên", importer.import_staff(files["staff"], files["staff"] + ".rej"))]
+            rates.append(_report("thuốc", importer.import_medicines(files["medicines"], files["medicines"] + ".rej")))
+            staff = [r['ma_nv'] for r in db.fetch_query("SELECT ma_nv FROM NHAN_VIEN")]
+            medicines = [r['ma_thuoc'] for r in db.fetch_query("SELECT ma_thuoc FROM THUOC")]
+            _write(files["invoices"], "invoices", _invoice_rows(args.invoices, rng, staff, medicines))
+            rates.append(_report("hóa đơn (dòng)", importer.import_invoices(files["invoices"],
+                                                                             files["invoices"] + ".rej")))
+
+            positions = [p[0] for p in POSITIONS]
+            start = time.perf_counter()
+            for i in range(args.baseline):
+                ok, msg = importer.staff_model.create_staff(f"NB{i:07d}", _name(rng), "0900000000",
+                                                            positions[0], "2020-01-01", "")
+                if not ok:
+                    raise SystemExit(f"Không tạo được nhân viên: {msg}")
+            seconds = time.perf_counter() - start
+            print(f"  {'từng người (form)':<22}{args.baseline:>8} dòng, {seconds:>18.1f}s  "
+                  f"{args.baseline / seconds * 60:>10,.0f} dòng/phút")
+        finally:
+            db.disconnect()
+            close_all_pools()
+
+    if min(rates) < args.target:
+        raise SystemExit(f"{min(rates):,.0f} dòng/phút thấp hơn mục tiêu {args.target:,.0f}")
+
+
+if __name__ == "__main__":
+    main()
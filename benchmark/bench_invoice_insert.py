@@ -0,0 +1,91 @@
+"""Invoices per second: per-line autocommit inserts vs Invoice.create_invoice
+
+Usage: python -m benchmark.bench_invoice_insert [--invoices 300] [--lines 30]
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+
+from model.connection_pool import close_all_pools
+
+
+def _prepare(path, lines):
+    conn = sqlite3.connect(path)
+    from benchmark.schema import create_schema
+    create_schema(conn)
+    conn.execute("INSERT INTO BAC_LUONG VALUES ('Nhân viên bán hàng', 1.0)")
+    conn.execute("INSERT INTO NHAN_VIEN VALUES ('NV01', 'Nhân viên', NULL, 'Nhân viên bán hàng', '2020-01-01', NULL)")
+    conn.executemany("INSERT INTO THUOC VALUES (?, ?, 'SX', 1000000)",
+                     [(f"T{i:04d}", f"Thuốc {i}") for i in range(lines)])
+    conn.commit()
+    conn.close()
+
+
+def _items(lines):
+    return [{'ma_thuoc': f"T{i:04d}", 'ten_thuoc': f"Thuốc {i}", 'don_vi_tinh': 'Hộp',
+             'so_luong': 1, 'don_gia': 10000.0} for i in range(lines)]
+
+
+def legacy_create_invoice(db, ma_hoa_don, ten_khach_hang, ma_nv, giam_gia, items):
+    """Previous strategy: one committed statement per header and per line"""
+    ngay_gio = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    db.execute_query("INSERT INTO HOA_DON (ma_hoa_don, ten_khach_hang, ngay_gio, ma_nv) VALUES (%s, %s, %s, %s)",
+                     (ma_hoa_don, ten_khach_hang, ngay_gio, ma_nv))
+    for item in items:
+        db.execute_query(
+            "INSERT INTO HOA_DON_THUOC (ma_hoa_don, ma_thuoc, don_vi_tinh, so_luong, giam_gia, gia_ban) "
+            "VALUES (%s, %s, %s, %s, %s, %s)",
+            (ma_hoa_don, item['ma_thuoc'], item['don_vi_tinh'], item['so_luong'], giam_gia, item['don_gia']))
+    return True, ""
+
+
+def run(invoices, lines):
+    from model.database import Database
+    from model.invoice import Invoice
+
+    db = Database()
+    if not db.connect():
+        raise SystemExit("Không kết nối được cơ sở dữ liệu")
+    invoice_model = Invoice(db)
+    invoice_model.totals.ensure_table()
+    items = _items(lines)
+    results = {}
+    for label, create in (("before", lambda *a: legacy_create_invoice(db, *a)),
+                          ("after", invoice_model.create_invoice)):
+        start = time.perf_counter()
+        for i in range(invoices):
+            ok, msg = create(f"B{label[0]}{i:07d}", "Khách lẻ", "NV01", 0, items)
+            if not ok:
+                raise SystemExit(msg)
+        elapsed = time.perf_counter() - start
+        results[label] = invoices / elapsed
+        print(f"{label:>6}: {invoices} hóa đơn x {lines} dòng trong {elapsed:.2f}s -> {results[label]:.1f} hóa đơn/giây")
+    print(f"speedup: x{results['after'] / results['before']:.1f}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--invoices", type=int, default=300)
+    parser.add_argument("--lines", type=int, default=30)
+    parser.add_argument("--mysql", action="store_true", help="chạy trên MySQL đã cấu hình thay vì SQLite tạm")
+    args = parser.parse_args()
+    if args.mysql:
+        run(args.invoices, args.lines)
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        _prepare(path, args.lines)
+        os.environ["DB_BACKEND"] = "sqlite"
+        os.environ["DB_SQLITE_PATH"] = path
+        try:
+            run(args.invoices, args.lines)
+        finally:
+            close_all_pools()
+
+
+if __name__ == "__main__":
+    main()
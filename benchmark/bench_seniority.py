@@ -0,0 +1,134 @@
+"""Seniority report over a large staff table: SQL tenure against the per-row Python loop
+
+Builds a temporary SQLite database with N staff (mixed yyyy-mm-dd and dd/mm/yyyy
+dates, as older rows have), times ReportModel.get_seniority / get_seniority_histogram
+and the per-row strptime loop the SQLite path used to run, and checks that both
+produce the same rows.
+
+Usage: python -m benchmark.bench_seniority [--staff 100000] [--repeat 5]
+       python -m benchmark.bench_seniority --mysql   (configured MySQL, existing data)
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from collections import Counter
+from datetime import date, datetime
+
+from benchmark.schema import create_schema
+from config.db_config import load_db_config
+from model.connection_pool import close_all_pools
+from model.report import ReportModel
+
+
+def python_seniority(raw_rows, today=None):
+    """Reference: the old per-row loop, with the tenure rules both backends now share"""
+    today = today or date.today()
+    rows = []
+    for ma_nv, ho_va_ten, chuc_vu, ngay_vao_lam in raw_rows:
+        start = None
+        if isinstance(ngay_vao_lam, date):
+            start = ngay_vao_lam
+        else:
+            for fmt in ("%Y-%m-%d", "%d/%m/%Y"):
+                try:
+                    start = datetime.strptime(ngay_vao_lam, fmt).date()
+                    break
+                except ValueError:
+                    continue
+        if start is None:
+            months = 0
+        else:
+            months = (today.year - start.year) * 12 + today.month - start.month - (today.day < start.day)
+            months = max(months, 0)
+        label = next(label for bound, label in ReportModel.TENURE_GROUPS if bound is None or months < bound)
+        rows.append({
+            "ma_nv": ma_nv,
+            "ho_va_ten": ho_va_ten,
+            "chuc_vu": chuc_vu,
+            "ngay_vao_lam": start.strftime("%d/%m/%Y") if start else ngay_vao_lam,
+            "tham_nien": f"{months // 12} năm {months % 12} tháng",
+            "nhom_tham_nien": label
+        })
+    return rows
+
+
+def _fill(path, staff, seed):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    create_schema(conn)
+    conn.execute("INSERT INTO BAC_LUONG (chuc_vu, he_so_luong) VALUES ('Nhân viên bán hàng', 1.2)")
+    rows = []
+    for i in range(staff):
+        hired = date.fromordinal(date.today().toordinal() - rng.randint(-30, 4000))
+        text = hired.strftime("%d/%m/%Y") if i % 5 == 0 else hired.strftime("%Y-%m-%d")
+        rows.append((f"NV{i:06d}", f"Nhân viên {i}", "Nhân viên bán hàng", text))
+    conn.executemany("INSERT INTO NHAN_VIEN (ma_nv, ho_va_ten, chuc_vu, ngay_vao_lam) VALUES (?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def _time(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return result, statistics.median(samples)
+
+
+def run(report, repeat):
+    def python_path():
+        with report._get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT ma_nv, ho_va_ten, chuc_vu, ngay_vao_lam FROM NHAN_VIEN ORDER BY ngay_vao_lam")
+            return python_seniority(cur.fetchall())
+
+    sql_rows, sql_ms = _time(report.get_seniority, repeat)
+    histogram, histogram_ms = _time(report.get_seniority_histogram, repeat)
+    py_rows, py_ms = _time(python_path, repeat)
+
+    key = lambda r: r["ma_nv"]
+    if sorted(sql_rows, key=key) != sorted(py_rows, key=key):
+        diff = next(pair for pair in zip(sorted(sql_rows, key=key), sorted(py_rows, key=key)) if pair[0] != pair[1])
+        raise SystemExit(f"Kết quả SQL khác tham chiếu Python: {diff}")
+    expected = Counter(r["nhom_tham_nien"] for r in py_rows)
+    if {h["nhom_tham_nien"]: h["so_nhan_vien"] for h in histogram} != {label: expected.get(label, 0)
+                                                                     for _, label in ReportModel.TENURE_GROUPS}:
+        raise SystemExit(f"Biểu đồ thâm niên sai: {histogram}")
+
+    print(f"{len(sql_rows)} nhân viên ({report.backend}), trung vị {repeat} lần:")
+    print(f"  vòng lặp Python (strptime):  {py_ms:>9.1f} ms")
+    print(f"  get_seniority (SQL):         {sql_ms:>9.1f} ms  ({py_ms / sql_ms:.1f}x)")
+    print(f"  get_seniority_histogram:     {histogram_ms:>9.1f} ms  ({py_ms / histogram_ms:.1f}x)")
+    for h in histogram:
+        print(f"    {h['nhom_tham_nien']:<12}{h['so_nhan_vien']:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--staff", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mysql", action="store_true", help="chạy trên MySQL đã cấu hình thay vì SQLite tạm")
+    args = parser.parse_args()
+    if args.mysql:
+        try:
+            run(ReportModel(backend="mysql", mysql_config=load_db_config()), args.repeat)
+        finally:
+            close_all_pools()
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "seniority.db")
+        _fill(path, args.staff, args.seed)
+        try:
+            run(ReportModel(db_path=path), args.repeat)
+        finally:
+            close_all_pools()
+
+
+if __name__ == "__main__":
+    main()
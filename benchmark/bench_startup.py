@@ -0,0 +1,144 @@
+"""Cold start: import cost of main and time to the first painted window
+
+Runs `python -X importtime -c "import main"` in a fresh interpreter and lists the
+slowest imports, then (unless --imports-only) starts the application N times on a
+temporary SQLite database and times, from process start, the first paint of the window,
+the staff tab being built and its rows loaded. It also checks that the database drivers
+and openpyxl are not imported before the first paint. The application part needs a
+display; on a headless machine run it under Xvfb.
+
+Usage: xvfb-run -a python -m benchmark.bench_startup [--runs 5] [--target 300]
+       python -m benchmark.bench_startup --imports-only
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmark.generate import generate
+from model.connection_pool import close_all_pools, get_pool
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Modules that must stay out of the way of the first paint
+DEFERRED = ("mysql.connector", "openpyxl", "dotenv", "sqlite3", "model.database", "controller.report_controller")
+
+# Marks are wall-clock times so the parent can measure them from the moment it spawned the child
+CHILD = """
+import json, sys, time
+import tkinter as tk
+from main import MainApplication
+
+DEFERRED = %r
+root = tk.Tk()
+marks = {}
+
+def painted():
+    root.update_idletasks()
+    marks['painted'] = time.time()
+    marks['loaded_at_paint'] = [m for m in DEFERRED if m in sys.modules]
+
+def on_map(event):
+    if event.widget is root and 'painted' not in marks:
+        root.after_idle(painted)
+
+# Bound before MainApplication binds its own handler, so this idle callback runs first
+root.bind('<Map>', on_map, add='+')
+app = MainApplication(root)
+
+def check():
+    tab = app.tabs.current
+    if tab is not None and 'built' not in marks:
+        marks['built'] = time.time()
+    if tab is not None and tab.view.tree.get_children() and not app.runner.busy:
+        marks['loaded'] = time.time()
+        app.quit_application()
+        return
+    root.after(2, check)
+
+root.after(2, check)
+root.mainloop()
+print(json.dumps(marks))
+"""
+
+
+def import_times(top):
+    """Cumulative microseconds of `import main` and its `top` slowest imports"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        # Skips the header line
+        if cumulative.isdigit():
+            rows.append((int(cumulative), name))
+    total = next((cumulative for cumulative, name in rows if name == "main"), 0)
+    slowest = sorted((r for r in rows if r[1] != "main"), reverse=True)[:top]
+    return total, slowest
+
+
+def _fill(path):
+    conn = get_pool("sqlite", None, path).acquire()
+    try:
+        generate(conn, invoices=5000, staff=500, medicines=200, months=6, progress=False)
+    finally:
+        conn.close()
+        close_all_pools()
+
+
+def start_once(env):
+    """Marks of one application start, in ms from spawning the interpreter"""
+    spawned = time.time()
+    result = subprocess.run([sys.executable, "-c", CHILD % (DEFERRED,)], cwd=ROOT, env=env,
+                            capture_output=True, text=True, timeout=120)
+    if result.returncode:
+        raise SystemExit(f"Ứng dụng lỗi khi khởi động:\n{result.stderr}")
+    marks = json.loads(result.stdout.strip().splitlines()[-1])
+    timings = {name: (marks[name] - spawned) * 1000 for name in ("painted", "built", "loaded")}
+    return timings, marks["loaded_at_paint"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--target", type=float, default=300, help="ngân sách ms đến lần vẽ đầu tiên")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--imports-only", action="store_true", help="chỉ đo thời gian import, không cần màn hình")
+    args = parser.parse_args()
+
+    total, slowest = import_times(args.top)
+    print(f"import main: {total / 1000:.1f} ms (tích lũy); chậm nhất:")
+    for cumulative, name in slowest:
+        print(f"  {cumulative / 1000:>8.1f} ms  {name}")
+    if args.imports_only:
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "startup.db")
+        env = dict(os.environ, DB_BACKEND="sqlite", DB_SQLITE_PATH=path,
+                   DB_SLOW_QUERY_LOG=os.path.join(tmp, "slow.log"))
+        os.environ.update(env)
+        _fill(path)
+        runs = []
+        for _ in range(args.runs):
+            timings, loaded = start_once(env)
+            if loaded:
+                raise SystemExit(f"Đã import trước lần vẽ đầu tiên: {', '.join(loaded)}")
+            runs.append(timings)
+
+    print(f"Khởi động, trung vị {args.runs} lần (tính từ lúc tạo tiến trình):")
+    for name, label in (("painted", "cửa sổ được vẽ"), ("built", "dựng tab nhân viên"),
+                        ("loaded", "tải xong danh sách")):
+        print(f"  {label:<22}{statistics.median(r[name] for r in runs):>8.1f} ms")
+    painted = statistics.median(r["painted"] for r in runs)
+    if painted > args.target:
+        raise SystemExit(f"Lần vẽ đầu tiên {painted:.1f} ms vượt ngân sách {args.target:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
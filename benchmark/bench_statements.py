@@ -0,0 +1,128 @@
+"""Statements per second with and without the prepared-statement cache
+
+Runs the hottest model statements in a tight loop through Database, alternating rounds
+with the cache off (a new cursor and a full parse for every call) and on, and prints
+the median rate of each plus the cache hit ratio. Uses a temporary
+SQLite database unless --mysql is given; on MySQL the gain is the server skipping
+the parse and the binary protocol, on SQLite it is the reused cursor.
+
+Usage: python -m benchmark.bench_statements [--calls 2000] [--rounds 15] [--cache 64]
+       python -m benchmark.bench_statements --mysql
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from benchmark.generate import generate
+from model.connection_pool import close_all_pools, get_pool
+
+
+def _cases(db):
+    """(label, fn(i)) pairs issuing one statement per call, as the models do"""
+    staff = db.fetch_query("SELECT ma_nv, chuc_vu FROM NHAN_VIEN ORDER BY ma_nv LIMIT 50")
+    invoices = [r['ma_hoa_don'] for r in db.fetch_query(
+        "SELECT ma_hoa_don FROM HOA_DON ORDER BY ma_hoa_don DESC LIMIT 50")]
+    medicines = [r['ma_thuoc'] for r in db.fetch_query("SELECT ma_thuoc FROM THUOC ORDER BY ma_thuoc")]
+    from model.invoice import Invoice
+    from model.staff import Staff
+    staff_model, invoice_model = Staff(db), Invoice(db)
+
+    def insert_line(i):
+        # A fresh header every len(medicines) lines, so each (invoice, medicine) pair is new
+        if i % len(medicines) == 0:
+            db.execute_query("INSERT INTO HOA_DON (ma_hoa_don, ten_khach_hang, ngay_gio, ma_nv) "
+                             "VALUES (%s, %s, %s, %s)",
+                             (f"BENCHST{i}", "Khách lẻ", "2024-01-01 08:00:00", staff[0]['ma_nv']))
+        db.execute_query("""
+        INSERT INTO HOA_DON_THUOC (ma_hoa_don, ma_thuoc, don_vi_tinh, so_luong, giam_gia, gia_ban)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        """, (f"BENCHST{i - i % len(medicines)}", medicines[i % len(medicines)], 'Hộp', 1, 0, 1000))
+
+    return [
+        ("Staff.check_position_exists", lambda i: staff_model.check_position_exists(staff[i % len(staff)]['chuc_vu'])),
+        ("Staff.get_staff_by_id", lambda i: staff_model.get_staff_by_id(staff[i % len(staff)]['ma_nv'])),
+        ("Invoice.get_invoice_by_id", lambda i: invoice_model.get_invoice_by_id(invoices[i % len(invoices)])),
+        ("UPDATE THUOC (tồn kho)", lambda i: db.execute_query(
+            "UPDATE THUOC SET so_luong_ton_kho = so_luong_ton_kho + %s WHERE ma_thuoc = %s",
+            (0, medicines[i % len(medicines)]))),
+        ("INSERT HOA_DON_THUOC", insert_line),
+    ]
+
+
+def _rate(db, fn, calls):
+    # One pinned connection, as in a transaction; rolled back so nothing is written
+    with db.transaction() as conn:
+        start = time.perf_counter()
+        for i in range(calls):
+            fn(i)
+        rate = calls / (time.perf_counter() - start)
+        conn.rollback()
+        conn.start_transaction()
+    return rate
+
+
+def measure(calls, rounds, cache_size):
+    """Median statements per second of every case without and with the cache.
+
+    Rounds alternate between the two on the same connection, so drift of the machine
+    hits both sides alike.
+    """
+    from model.database import Database
+
+    db = Database()
+    if not db.connect():
+        raise SystemExit("Không kết nối được cơ sở dữ liệu")
+    before, after = {}, {}
+    try:
+        for label, fn in _cases(db):
+            samples = {0: [], cache_size: []}
+            for _ in range(rounds):
+                for size in samples:
+                    db.pool.statement_cache = size
+                    samples[size].append(_rate(db, fn, calls))
+            before[label] = statistics.median(samples[0])
+            after[label] = statistics.median(samples[cache_size])
+        return before, after, db.pool.stats()
+    finally:
+        db.disconnect()
+        close_all_pools()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=2000, help="câu lệnh mỗi lượt")
+    parser.add_argument("--rounds", type=int, default=15)
+    parser.add_argument("--cache", type=int, default=64, help="số câu lệnh giữ trong cache mỗi kết nối")
+    parser.add_argument("--mysql", action="store_true", help="đo trên MySQL đã cấu hình")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DB_SLOW_QUERY_LOG"] = os.path.join(tmp, "slow.log")
+        if args.mysql:
+            os.environ["DB_BACKEND"] = "mysql"
+        else:
+            path = os.path.join(tmp, "statements.db")
+            os.environ["DB_BACKEND"] = "sqlite"
+            os.environ["DB_SQLITE_PATH"] = path
+            conn = get_pool("sqlite", None, path).acquire()
+            try:
+                generate(conn, invoices=20000, staff=500, medicines=500, months=6, progress=False)
+            finally:
+                conn.close()
+                close_all_pools()
+
+        before, after, stats = measure(args.calls, args.rounds, args.cache)
+
+    print(f"{'câu lệnh':<32}{'không cache':>14}{'có cache':>14}{'tăng':>10}   (câu lệnh/giây)")
+    for label in before:
+        gain = after[label] / before[label] - 1
+        print(f"{label:<32}{before[label]:>14,.0f}{after[label]:>14,.0f}{gain:>+10.0%}")
+    total = stats['statement_hits'] + stats['statement_misses']
+    print(f"Cache: {stats['statement_hits']} lần dùng lại / {total} lần chạy "
+          f"({stats['statement_hits'] / total:.1%})" if total else "Cache: không dùng")
+
+
+if __name__ == "__main__":
+    main()
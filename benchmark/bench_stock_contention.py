@@ -0,0 +1,128 @@
+"""Concurrent invoice writers selling the same medicines: throughput and oversell check
+
+Every round seeds a few hot medicines with limited stock and lets N threads create
+invoices until the stock runs out. The round fails if stock ever goes negative or
+stock + sold quantity does not add up to the seeded amount.
+
+Usage: python -m benchmark.bench_stock_contention [--writers 1,4,16] [--invoices 200] [--lines 3]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from model.connection_pool import close_all_pools
+
+MEDICINES = 5
+
+
+def _seed(db, prefix, stock, ma_nv):
+    """Hot medicines for one round; ids carry the round prefix so MySQL runs never collide"""
+    ids = [f"{prefix}T{i}" for i in range(MEDICINES)]
+    db.execute_many("INSERT INTO THUOC (ma_thuoc, ten_thuoc, hang_sx, so_luong_ton_kho) VALUES (%s, %s, 'SX', %s)",
+                    [(ma_thuoc, f"Thuốc {ma_thuoc}", stock) for ma_thuoc in ids])
+    if not db.fetch_query("SELECT ma_nv FROM NHAN_VIEN WHERE ma_nv = %s", (ma_nv,)):
+        db.execute_query("INSERT INTO BAC_LUONG (chuc_vu, he_so_luong) VALUES ('Nhân viên bán hàng', 1.0)")
+        db.execute_query("INSERT INTO NHAN_VIEN (ma_nv, ho_va_ten, sdt, chuc_vu, ngay_vao_lam, ma_quan_ly) "
+                         "VALUES (%s, 'Nhân viên', NULL, 'Nhân viên bán hàng', '2020-01-01', NULL)", (ma_nv,))
+    return ids
+
+
+def _writer(invoice_model, prefix, writer, ids, invoices, lines, ma_nv, stats, lock):
+    rng = random.Random(writer)
+    for i in range(invoices):
+        # Random line order: the model must lock rows in its own order
+        items = [{'ma_thuoc': ma_thuoc, 'don_vi_tinh': 'Hộp', 'so_luong': rng.randint(1, 3), 'don_gia': 10000.0}
+                 for ma_thuoc in rng.sample(ids, lines)]
+        ok, msg = invoice_model.create_invoice(f"{prefix}W{writer:02d}I{i:05d}", "Khách lẻ", ma_nv, 0, items)
+        with lock:
+            if ok:
+                stats['created'] += 1
+            elif "không đủ tồn kho" in msg:
+                stats['rejected'] += 1
+            else:
+                stats['errors'].append(msg)
+
+
+def run_round(writers, invoices, lines, stock, ma_nv="NV01"):
+    from model.database import Database
+    from model.invoice import Invoice
+
+    db = Database()
+    if not db.connect():
+        raise SystemExit("Không kết nối được cơ sở dữ liệu")
+    invoice_model = Invoice(db)
+    invoice_model.totals.ensure_table()
+    invoice_model.search_index.ensure_table()
+    prefix = f"S{int(time.time() * 1000) % 10**8}N{writers}"
+    ids = _seed(db, prefix, stock, ma_nv)
+
+    stats = {'created': 0, 'rejected': 0, 'errors': []}
+    lock = threading.Lock()
+    threads = [threading.Thread(target=_writer,
+                                args=(invoice_model, prefix, w, ids, invoices, lines, ma_nv, stats, lock))
+               for w in range(writers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    placeholders = ", ".join(["%s"] * len(ids))
+    rows = db.fetch_query(f"""
+        SELECT t.ma_thuoc, t.so_luong_ton_kho,
+               COALESCE((SELECT SUM(ht.so_luong) FROM HOA_DON_THUOC ht WHERE ht.ma_thuoc = t.ma_thuoc), 0) as da_ban
+        FROM THUOC t WHERE t.ma_thuoc IN ({placeholders})
+    """, tuple(ids))
+    negative = [r['ma_thuoc'] for r in rows if r['so_luong_ton_kho'] < 0]
+    drift = [r['ma_thuoc'] for r in rows if r['so_luong_ton_kho'] + r['da_ban'] != stock]
+    rate = stats['created'] / elapsed if elapsed else 0
+    print(f"{writers:>3} luồng: {stats['created']} hóa đơn, {stats['rejected']} bị từ chối vì hết hàng, "
+          f"{elapsed:.2f}s -> {rate:.1f} hóa đơn/giây")
+    if stats['errors']:
+        print(f"    lỗi khác: {len(stats['errors'])} (vd: {stats['errors'][0]})")
+    if negative or drift:
+        raise SystemExit(f"Tồn kho sai: âm={negative} lệch={drift}")
+    return {'writers': writers, 'created': stats['created'], 'rejected': stats['rejected'],
+            'errors': len(stats['errors']), 'seconds': elapsed, 'invoices_per_second': rate}
+
+
+def run(writer_counts, invoices, lines, stock):
+    # Every writer needs its own connection for the length of its transaction
+    os.environ["DB_POOL_SIZE"] = str(max(max(writer_counts), int(os.getenv("DB_POOL_SIZE", "5"))))
+    return [run_round(writers, invoices, lines, stock) for writers in writer_counts]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writers", default="1,4,16", help="số luồng ghi đồng thời, cách nhau bởi dấu phẩy")
+    parser.add_argument("--invoices", type=int, default=200, help="số hóa đơn mỗi luồng thử tạo")
+    parser.add_argument("--lines", type=int, default=3)
+    parser.add_argument("--stock", type=int, default=3000, help="tồn kho ban đầu của mỗi thuốc")
+    parser.add_argument("--mysql", action="store_true", help="chạy trên MySQL đã cấu hình thay vì SQLite tạm")
+    args = parser.parse_args()
+    writer_counts = [int(w) for w in args.writers.split(",")]
+    lines = min(args.lines, MEDICINES)
+    if args.mysql:
+        run(writer_counts, args.invoices, lines, args.stock)
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        from benchmark.schema import create_schema
+        conn = sqlite3.connect(path)
+        create_schema(conn)
+        conn.close()
+        os.environ["DB_BACKEND"] = "sqlite"
+        os.environ["DB_SQLITE_PATH"] = path
+        try:
+            run(writer_counts, args.invoices, lines, args.stock)
+        finally:
+            close_all_pools()
+
+
+if __name__ == "__main__":
+    main()
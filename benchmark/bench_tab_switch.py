@@ -0,0 +1,161 @@
+"""Tab switching and zoom with kept-alive views against rebuilding them every time
+
+Fills a temporary SQLite database, starts MainApplication on it and builds every tab
+once, then times switches between the warm tabs and zooming in and out on each of them
+(until Tk has laid them out), and checks that neither ran a query. For comparison it
+also times the old behaviour, where every switch destroyed the view, built a new one
+and queried its data again. Needs a display; on a headless machine run it under Xvfb.
+
+Usage: xvfb-run -a python -m benchmark.bench_tab_switch [--invoices 20000] [--switches 60]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import tkinter as tk
+from tkinter import messagebox
+
+from benchmark.generate import generate
+from model.connection_pool import close_all_pools, get_pool
+from model.query_stats import get_query_stats
+
+TABS = ("staff", "invoice", "report")
+BUDGET_MS = 50
+# Zoom steps in one direction before moving to the next tab
+ZOOM_STEPS = 4
+
+
+def _fill(path, invoices, staff, seed):
+    conn = get_pool("sqlite", None, path).acquire()
+    try:
+        generate(conn, invoices=invoices, staff=staff, medicines=500, months=12, seed=seed, progress=False)
+    finally:
+        conn.close()
+        close_all_pools()
+
+
+def _wait_idle(root, app, timeout=60):
+    """Run the event loop until no background query is left"""
+    deadline = time.monotonic() + timeout
+    while True:
+        root.update()
+        if not app.runner.busy:
+            root.update()
+            if not app.runner.busy:
+                return
+        if time.monotonic() > deadline:
+            raise SystemExit("Hết thời gian chờ tải dữ liệu")
+        time.sleep(0.005)
+
+
+def _query_count():
+    return sum(s['count'] for s in get_query_stats().snapshot())
+
+
+def _switch(root, app, name):
+    start = time.perf_counter()
+    getattr(app, f"show_{name}_view")()
+    root.update_idletasks()
+    return (time.perf_counter() - start) * 1000
+
+
+def _summary(label, samples):
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    print(f"  {label:<28}trung vị {statistics.median(ordered):>8.2f} ms   p95 {p95:>8.2f} ms   "
+          f"tối đa {ordered[-1]:>8.2f} ms")
+    return p95
+
+
+def run(switches):
+    from main import MainApplication
+
+    root = tk.Tk()
+    app = MainApplication(root)
+    try:
+        # The first tab is built once the window is mapped
+        while app.tabs.current is None:
+            root.update()
+        _wait_idle(root, app)
+        for name in TABS[1:] + TABS[:1]:
+            app.tabs.show(name)
+            _wait_idle(root, app)
+
+        get_query_stats().reset()
+        warm = []
+        for i in range(switches):
+            warm.append(_switch(root, app, TABS[(i + 1) % len(TABS)]))
+            root.update()
+        _wait_idle(root, app)
+        warm_queries = _query_count()
+
+        # Zoom in a few steps on one tab, out again on the next
+        get_query_stats().reset()
+        zoom = []
+        for i in range(switches):
+            if i % ZOOM_STEPS == 0:
+                app.tabs.show(TABS[i // ZOOM_STEPS % len(TABS)])
+                root.update()
+            step = app.zoom_in if i // ZOOM_STEPS % 2 == 0 else app.zoom_out
+            start = time.perf_counter()
+            step()
+            root.update_idletasks()
+            zoom.append((time.perf_counter() - start) * 1000)
+            root.update()
+        _wait_idle(root, app)
+        zoom_queries = _query_count()
+        app.zoom_reset()
+
+        # Old behaviour: every switch threw the view away and queried its data again
+        get_query_stats().reset()
+        cold = []
+        for i in range(min(switches, 15)):
+            app.runner.cancel_all()
+            app.tabs.close_all()
+            cold.append(_switch(root, app, TABS[(i + 1) % len(TABS)]))
+            _wait_idle(root, app)
+        cold_queries = _query_count()
+    finally:
+        app.quit_application()
+
+    print(f"{switches} lần chuyển tab:")
+    p95 = _summary("giữ view (không truy vấn):", warm)
+    _summary("dựng lại view mỗi lần:", cold)
+    zoom_p95 = _summary("phóng to / thu nhỏ:", zoom)
+    print(f"  truy vấn: chuyển tab {warm_queries}, phóng to {zoom_queries}, "
+          f"dựng lại {cold_queries} ({cold_queries / len(cold):.1f} mỗi lần)")
+    if warm_queries:
+        raise SystemExit("Chuyển sang tab đã dựng không được chạy truy vấn")
+    if zoom_queries:
+        raise SystemExit("Phóng to / thu nhỏ không được chạy truy vấn")
+    if max(p95, zoom_p95) > BUDGET_MS:
+        raise SystemExit(f"p95 {max(p95, zoom_p95):.1f} ms vượt ngân sách {BUDGET_MS} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--invoices", type=int, default=20000)
+    parser.add_argument("--staff", type=int, default=500)
+    parser.add_argument("--switches", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    # Dialogs would stop the run waiting for a click
+    for name in ("showinfo", "showwarning", "showerror"):
+        setattr(messagebox, name, lambda title, message, **kw: print(f"[{title}] {message}"))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tabs.db")
+        os.environ["DB_BACKEND"] = "sqlite"
+        os.environ["DB_SQLITE_PATH"] = path
+        os.environ["DB_SLOW_QUERY_LOG"] = os.path.join(tmp, "slow.log")
+        _fill(path, args.invoices, args.staff, args.seed)
+        try:
+            run(args.switches)
+        finally:
+            close_all_pools()
+
+
+if __name__ == "__main__":
+    main()
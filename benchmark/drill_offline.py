@@ -0,0 +1,186 @@
+"""Offline drill: sell while the database is down, then check the journal catches up
+
+Creates invoices against a running database, stops it, keeps selling (the invoices go
+to the local journal, and one selling more than the catalog's stock is refused), reopens the journal as a restarted application would, starts the
+database again and lets InvoiceReplayer flush. Checks that every invoice arrived exactly
+once with its stock and totals, and that replaying a flushed batch again is a no-op.
+
+On SQLite (default, a temporary database) "stopping" moves the file away and puts a
+directory in its place, so every connection fails as with a dead server. On MySQL pass
+the commands that stop and start the local server.
+
+Usage: python -m benchmark.drill_offline [--online 50] [--offline 500]
+       python -m benchmark.drill_offline --mysql --stop-cmd "..." --start-cmd "..."
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+from benchmark.generate import generate
+from model.connection_pool import close_all_pools, get_pool
+
+
+class SQLiteStandIn:
+    """A SQLite file that can be taken away and given back like a server process"""
+    def __init__(self, path):
+        self.path = path
+        self.parked = path + ".stopped"
+
+    def stop(self):
+        os.rename(self.path, self.parked)
+        os.mkdir(self.path)
+
+    def start(self):
+        os.rmdir(self.path)
+        os.rename(self.parked, self.path)
+
+
+class CommandStandIn:
+    def __init__(self, stop_cmd, start_cmd):
+        self.stop_cmd = stop_cmd
+        self.start_cmd = start_cmd
+
+    def stop(self):
+        subprocess.run(self.stop_cmd, shell=True, check=True)
+
+    def start(self):
+        subprocess.run(self.start_cmd, shell=True, check=True)
+
+
+def _sell(invoice_model, prefix, count, ma_nv, items):
+    """Create `count` invoices; returns how many were queued instead of written"""
+    queued = 0
+    for i in range(count):
+        ok, msg = invoice_model.create_invoice(f"{prefix}{i:06d}", "Khách lẻ", ma_nv, 0, items)
+        if not ok:
+            raise SystemExit(f"Bán hàng thất bại: {msg}")
+        queued += "hàng chờ" in msg
+    return queued
+
+
+def run(db, stand_in, journal_path, online, offline):
+    from model.invoice import Invoice
+    from model.invoice_journal import InvoiceJournal, InvoiceReplayer
+
+    invoice_model = Invoice(db)
+    invoice_model.totals.ensure_table()
+    invoice_model.journal = InvoiceJournal.for_path(journal_path)
+    ma_nv = db.fetch_query("SELECT ma_nv FROM NHAN_VIEN ORDER BY ma_nv LIMIT 1")[0]['ma_nv']
+    medicines = db.fetch_query("SELECT ma_thuoc, so_luong_ton_kho FROM THUOC ORDER BY ma_thuoc LIMIT 3")
+    items = [{'ma_thuoc': m['ma_thuoc'], 'don_vi_tinh': 'Hộp', 'so_luong': 1, 'don_gia': 10000.0}
+             for m in medicines]
+    stock_before = {m['ma_thuoc']: m['so_luong_ton_kho'] for m in medicines}
+
+    if _sell(invoice_model, "DRILLON", online, ma_nv, items):
+        raise SystemExit("Hóa đơn bị đưa vào hàng chờ khi cơ sở dữ liệu vẫn chạy")
+
+    # The invoice form loads the catalog on open; offline sales are checked against its stock
+    invoice_model.get_all_medicines()
+    stand_in.stop()
+    start = time.perf_counter()
+    queued = _sell(invoice_model, "DRILLOFF", offline, ma_nv, items)
+    queue_seconds = time.perf_counter() - start
+    if queued != offline:
+        raise SystemExit(f"Chỉ {queued}/{offline} hóa đơn vào hàng chờ khi mất kết nối")
+    too_many = dict(items[0], so_luong=stock_before[items[0]['ma_thuoc']] - online - offline + 1)
+    ok, msg = invoice_model.create_invoice("DRILLQUA", "Khách lẻ", ma_nv, 0, [too_many])
+    if ok or not msg.startswith("Dòng 1:"):
+        raise SystemExit(f"Hàng chờ nhận hóa đơn vượt tồn kho: {msg}")
+
+    # A restarted application finds the same backlog on disk
+    invoice_model.journal.close()
+    InvoiceJournal._instances.clear()
+    invoice_model.journal = InvoiceJournal.for_path(journal_path)
+    waiting, failed = invoice_model.journal.counts()
+    print(f"Mất kết nối: {queued} hóa đơn vào hàng chờ ({queued / queue_seconds:.0f} hóa đơn/s), "
+          f"đọc lại từ đĩa: {waiting} chờ, {failed} lỗi")
+    if waiting != offline:
+        raise SystemExit("Hàng chờ không giữ được hóa đơn sau khi mở lại")
+
+    replayer = InvoiceReplayer(invoice_model)
+    if replayer.flush() or replayer.online:
+        raise SystemExit("Đồng bộ khi cơ sở dữ liệu còn dừng")
+
+    stand_in.start()
+    start = time.perf_counter()
+    written = replayer.flush()
+    flush_seconds = time.perf_counter() - start
+    print(f"Đồng bộ lại: {written} hóa đơn trong {flush_seconds * 1000:.0f} ms "
+          f"({written / flush_seconds:.0f} hóa đơn/s, lô {replayer.batch_size})")
+
+    # Idempotency: replaying invoices that already arrived only clears them from the journal
+    sample = [{'ma_hoa_don': f"DRILLOFF{i:06d}", 'ten_khach_hang': "Khách lẻ", 'ngay_gio': row['ngay_gio'],
+               'ma_nv': ma_nv, 'giam_gia': 0, 'items': items}
+              for i, row in enumerate(db.fetch_query(
+                  "SELECT ngay_gio FROM HOA_DON WHERE ma_hoa_don LIKE 'DRILLOFF%' ORDER BY ma_hoa_don LIMIT 5"))]
+    for invoice in sample:
+        invoice['ngay_gio'] = str(invoice['ngay_gio'])[:19]
+    applied, failures, reachable = invoice_model.replay(sample)
+    if len(applied) != len(sample) or failures or not reachable:
+        raise SystemExit(f"Phát lại lần hai không bỏ qua hóa đơn đã có: {failures}")
+
+    counts = db.fetch_query("""
+        SELECT COUNT(DISTINCT h.ma_hoa_don) as hoa_don, COUNT(t.ma_hoa_don) as tong
+        FROM HOA_DON h LEFT JOIN HOA_DON_TONG t ON t.ma_hoa_don = h.ma_hoa_don
+        WHERE h.ma_hoa_don LIKE 'DRILL%'
+    """)[0]
+    stock_after = {m['ma_thuoc']: m['so_luong_ton_kho'] for m in db.fetch_query(
+        "SELECT ma_thuoc, so_luong_ton_kho FROM THUOC ORDER BY ma_thuoc LIMIT 3")}
+    expected_stock = {ma: qty - (online + offline) for ma, qty in stock_before.items()}
+    waiting, failed = invoice_model.journal.counts()
+    print(f"Kiểm tra: {counts['hoa_don']} hóa đơn, {counts['tong']} tổng tiền, "
+          f"hàng chờ còn {waiting}, lỗi {failed}")
+    if counts['hoa_don'] != online + offline or counts['tong'] != online + offline:
+        raise SystemExit("Thiếu hoặc thừa hóa đơn sau khi đồng bộ")
+    if stock_after != expected_stock:
+        raise SystemExit(f"Tồn kho sai: {stock_after} thay vì {expected_stock}")
+    if waiting or failed:
+        raise SystemExit("Hàng chờ chưa được xóa hết")
+    print("Diễn tập mất kết nối: đạt")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--online", type=int, default=50)
+    parser.add_argument("--offline", type=int, default=500)
+    parser.add_argument("--mysql", action="store_true", help="diễn tập trên MySQL đã cấu hình")
+    parser.add_argument("--stop-cmd", help="lệnh dừng máy chủ MySQL")
+    parser.add_argument("--start-cmd", help="lệnh khởi động lại máy chủ MySQL")
+    args = parser.parse_args()
+    if args.mysql and not (args.stop_cmd and args.start_cmd):
+        parser.error("--mysql cần --stop-cmd và --start-cmd")
+
+    tmp = tempfile.mkdtemp()
+    try:
+        os.environ["DB_SLOW_QUERY_LOG"] = os.path.join(tmp, "slow.log")
+        os.environ["DB_JOURNAL_RETRY_SECONDS"] = "0"
+        if args.mysql:
+            os.environ["DB_BACKEND"] = "mysql"
+            stand_in = CommandStandIn(args.stop_cmd, args.start_cmd)
+        else:
+            path = os.path.join(tmp, "drill.db")
+            os.environ["DB_BACKEND"] = "sqlite"
+            os.environ["DB_SQLITE_PATH"] = path
+            conn = get_pool("sqlite", None, path).acquire()
+            try:
+                generate(conn, invoices=2000, staff=50, medicines=50, months=3, progress=False)
+            finally:
+                conn.close()
+            stand_in = SQLiteStandIn(path)
+
+        from model.database import Database
+        db = Database()
+        if not db.connect():
+            raise SystemExit("Không kết nối được cơ sở dữ liệu")
+        db.disconnect()
+        run(db, stand_in, os.path.join(tmp, "journal.db"), args.online, args.offline)
+    finally:
+        close_all_pools()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
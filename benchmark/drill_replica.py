@@ -0,0 +1,189 @@
+"""Replica drill: reports and search on a read replica, with fallback to the primary
+
+Uses two SQLite stand-ins: a primary and a replica copied from it with
+model.replica.sync. Then checks that:
+  - searches and reports read the replica and lookups by key read the primary;
+  - a search right after this process saved something reads the primary;
+  - a replica behind more than DB_REPLICA_MAX_LAG, or one that is gone, hands the
+    reads back to the primary without errors.
+Finally it times checkout (Invoice.create_invoice) while another thread runs the
+monthly revenue report over and over, with the report on the primary and on the replica.
+
+Usage: python -m benchmark.drill_replica [--invoices 60000] [--sales 200] [--rounds 3]
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from benchmark.drill_offline import SQLiteStandIn
+from benchmark.generate import generate
+from model.connection_pool import close_all_pools, get_pool
+
+
+def _check(condition, message):
+    if not condition:
+        raise SystemExit(f"Sai: {message}")
+    print(f"  đạt: {message}")
+
+
+def _revenue(report):
+    now = datetime.now()
+    return report.sum_revenue(report.get_revenue_by_month(now.month, now.year))
+
+
+def _sell_behind(primary_path, ma_nv, ma_thuoc, tag):
+    """An invoice written by another process: the replica has not seen it yet"""
+    conn = sqlite3.connect(primary_path)
+    try:
+        conn.execute("INSERT INTO HOA_DON (ma_hoa_don, ten_khach_hang, ngay_gio, ma_nv) VALUES (?, ?, ?, ?)",
+                     (tag, "Khách quầy khác", datetime.now().strftime("%Y-%m-%d %H:%M:%S"), ma_nv))
+        conn.execute("INSERT INTO HOA_DON_THUOC (ma_hoa_don, ma_thuoc, don_vi_tinh, so_luong, giam_gia, gia_ban) "
+                     "VALUES (?, ?, 'Hộp', 1, 0, 9999000)", (tag, ma_thuoc))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _checkout_latency(invoice_model, report, prefix, sales, ma_nv, items):
+    """Milliseconds per create_invoice while a report loops in the background"""
+    stop = threading.Event()
+
+    def reporting():
+        while not stop.is_set():
+            _revenue(report)
+
+    worker = threading.Thread(target=reporting, daemon=True)
+    worker.start()
+    samples = []
+    try:
+        for i in range(sales):
+            start = time.perf_counter()
+            ok, msg = invoice_model.create_invoice(f"{prefix}{i:05d}", "Khách lẻ", ma_nv, 0, items)
+            samples.append((time.perf_counter() - start) * 1000)
+            if not ok:
+                raise SystemExit(f"Bán hàng thất bại: {msg}")
+    finally:
+        stop.set()
+        worker.join()
+    return samples
+
+
+def run(db, primary_path, replica_path, sales, rounds):
+    from model.invoice import Invoice
+    from model.replica import ReplicaRouter, sync
+    from model.report import ReportModel
+    from model.staff import Staff
+
+    staff_model, invoice_model = Staff(db), Invoice(db)
+    report = ReportModel(primary_path, "sqlite")
+    router = ReplicaRouter.get()
+    ma_nv = db.fetch_query("SELECT ma_nv FROM NHAN_VIEN ORDER BY ma_nv LIMIT 1")[0]['ma_nv']
+    medicines = [r['ma_thuoc'] for r in db.fetch_query("SELECT ma_thuoc FROM THUOC ORDER BY ma_thuoc LIMIT 3")]
+    items = [{'ma_thuoc': m, 'don_vi_tinh': 'Hộp', 'so_luong': 1, 'don_gia': 10000.0} for m in medicines]
+    invoice_model.totals.ensure_table()
+    staff_model.search_index.ensure_table()
+
+    # Someone saved before the copy was taken; another process removes it after
+    ok, msg = staff_model.create_staff("NVSAO01", "Trần Bản Sao", "0900000001", "Nhân viên bán hàng",
+                                       "2020-01-01", ma_nv)
+    _check(ok, f"tạo nhân viên trên máy chủ chính ({msg})")
+    time.sleep(1.1)
+    sync(primary_path, replica_path)
+    conn = sqlite3.connect(primary_path)
+    conn.execute("DELETE FROM NHAN_VIEN WHERE ma_nv = 'NVSAO01'")
+    conn.commit()
+    conn.close()
+    _sell_behind(primary_path, ma_nv, medicines[0], "HDSAO001")
+
+    print("Bản sao mới:")
+    _check(router.read_pool("sqlite") is not None, f"bản sao dùng được (trễ {router.lag:.1f}s)")
+    _check([r['ma_nv'] for r in staff_model.search_staff("Bản Sao")] == ["NVSAO01"],
+           "tìm kiếm đọc bản sao (thấy nhân viên chưa bị xóa ở đó)")
+    _check(staff_model.get_staff_by_id("NVSAO01") is None, "tra theo mã đọc máy chủ chính")
+    on_replica = _revenue(report)
+
+    print("Vừa ghi trong tiến trình này:")
+    staff_model.create_staff("NVSAO02", "Lê Vừa Lưu", "0900000002", "Nhân viên bán hàng", "2020-01-01", ma_nv)
+    _check([r['ma_nv'] for r in staff_model.search_staff("Vừa Lưu")] == ["NVSAO02"],
+           "tìm kiếm ngay sau khi lưu đọc máy chủ chính")
+    _check(_revenue(report) == on_replica, "báo cáo vẫn đọc bản sao")
+
+    print(f"Bản sao trễ quá {router.max_lag:g}s:")
+    conn = sqlite3.connect(replica_path)
+    conn.execute("UPDATE BAN_SAO_MOC SET sao_luc = ?", (time.time() - router.max_lag - 60,))
+    conn.commit()
+    conn.close()
+    on_primary = _revenue(report)
+    _check(on_primary == on_replica + 9999000, "báo cáo đọc máy chủ chính (có hóa đơn bản sao chưa nhận)")
+    _check(staff_model.search_staff("Bản Sao") == [], "tìm kiếm đọc máy chủ chính")
+
+    print("Bản sao ngừng:")
+    stand_in = SQLiteStandIn(replica_path)
+    stand_in.stop()
+    _check(_revenue(report) == on_primary, "báo cáo đọc máy chủ chính")
+    _check(staff_model.search_staff("Bản Sao") == [], "tìm kiếm đọc máy chủ chính")
+    stand_in.start()
+    time.sleep(1.1)
+    sync(primary_path, replica_path)
+    _check(_revenue(report) == on_primary and router.usable, "bản sao đồng bộ lại được dùng tiếp")
+
+    print("Bán hàng trong khi chạy báo cáo tháng (ms mỗi hóa đơn):")
+    samples = {"máy chủ chính": [], "bản sao": []}
+    max_lag = router.max_lag
+    for r in range(rounds):
+        for label in samples:
+            # A negative limit makes every replica too far behind
+            router.max_lag = max_lag if label == "bản sao" else -1
+            router._checked_at = None
+            samples[label] += _checkout_latency(invoice_model, report, f"HDB{r}{len(label)}", sales, ma_nv, items)
+    router.max_lag = max_lag
+    for label, values in samples.items():
+        values.sort()
+        print(f"  báo cáo trên {label:<14} trung vị {statistics.median(values):7.1f}  "
+              f"p95 {values[int(len(values) * 0.95)]:7.1f}  tối đa {values[-1]:7.1f}")
+    print("Diễn tập bản sao đọc: đạt")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--invoices", type=int, default=60000)
+    parser.add_argument("--sales", type=int, default=200, help="hóa đơn bán mỗi lượt đo")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    try:
+        primary_path = os.path.join(tmp, "primary.db")
+        replica_path = os.path.join(tmp, "replica.db")
+        os.environ["DB_SLOW_QUERY_LOG"] = os.path.join(tmp, "slow.log")
+        os.environ["DB_JOURNAL_PATH"] = os.path.join(tmp, "journal.db")
+        os.environ["DB_BACKEND"] = "sqlite"
+        os.environ["DB_SQLITE_PATH"] = primary_path
+        os.environ["DB_REPLICA_DSN"] = f"sqlite:///{replica_path}"
+        os.environ.setdefault("DB_REPLICA_MAX_LAG", "30")
+        os.environ["DB_REPLICA_CHECK_SECONDS"] = "0"
+        conn = get_pool("sqlite", None, primary_path).acquire()
+        try:
+            # The last 30 days: the current month's report runs live on the detail rows
+            generate(conn, invoices=args.invoices, staff=50, medicines=200, months=1, progress=False)
+        finally:
+            conn.close()
+
+        from model.database import Database
+        db = Database()
+        if not db.connect():
+            raise SystemExit("Không kết nối được cơ sở dữ liệu")
+        run(db, primary_path, replica_path, args.sales, args.rounds)
+    finally:
+        close_all_pools()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""TaskRunner drill, headless: a fake scheduler stands in for the Tk root
+
+Checks that:
+  - callbacks run on the scheduler's thread, in completion order (one worker: submit order);
+  - cancel_all() drops the results of running tasks and cancels the queued ones;
+  - on_busy goes True once when work starts and False once when the last task is done;
+  - a callback that submits more work (a page fetch, the live search) keeps a single poll chain.
+
+Usage: python -m benchmark.drill_task_runner
+"""
+import threading
+import time
+
+from controller.task_runner import TaskRunner
+
+
+class FakeScheduler:
+    """after()/after_cancel() like the Tk root; pump() runs the due callbacks on the calling thread"""
+    def __init__(self):
+        self._calls = {}
+        self._next_id = 0
+        # Most callbacks scheduled at once: one per poll chain
+        self.peak = 0
+
+    def after(self, ms, fn, *args):
+        self._next_id += 1
+        self._calls[self._next_id] = (time.monotonic() + ms / 1000, fn, args)
+        self.peak = max(self.peak, len(self._calls))
+        return self._next_id
+
+    def after_cancel(self, after_id):
+        self._calls.pop(after_id, None)
+
+    @property
+    def scheduled(self):
+        return len(self._calls)
+
+    def pump(self, until, timeout=5):
+        """Run due callbacks until until() is true"""
+        deadline = time.monotonic() + timeout
+        while not until():
+            if time.monotonic() > deadline:
+                raise SystemExit("Sai: hết thời gian chờ kết quả")
+            now = time.monotonic()
+            for after_id, (due, fn, args) in sorted(self._calls.items()):
+                if due <= now and self._calls.pop(after_id, None):
+                    fn(*args)
+            time.sleep(0.002)
+
+
+def _check(condition, message):
+    if not condition:
+        raise SystemExit(f"Sai: {message}")
+    print(f"  đạt: {message}")
+
+
+def check_order():
+    scheduler, busy = FakeScheduler(), []
+    runner = TaskRunner(scheduler, max_workers=1, on_busy=busy.append)
+    delivered, threads = [], set()
+
+    def done(value):
+        delivered.append(value)
+        threads.add(threading.get_ident())
+
+    for i in range(5):
+        runner.submit(lambda i=i: time.sleep(0.01) or i, on_done=done)
+    errors = []
+    runner.submit(lambda: 1 / 0, on_error=errors.append)
+    scheduler.pump(lambda: not runner.busy)
+    _check(delivered == [0, 1, 2, 3, 4], "kết quả đến theo thứ tự hoàn thành")
+    _check(threads == {threading.get_ident()}, "callback chạy trên luồng của scheduler")
+    _check(len(errors) == 1 and isinstance(errors[0], ZeroDivisionError), "lỗi đến on_error")
+    _check(busy == [True, False], "on_busy bật một lần rồi tắt một lần")
+    runner.shutdown()
+
+
+def check_cancel_all():
+    scheduler = FakeScheduler()
+    runner = TaskRunner(scheduler, max_workers=1)
+    started, release = threading.Event(), threading.Event()
+    delivered = []
+
+    def running():
+        started.set()
+        release.wait(5)
+        return "cũ"
+
+    runner.submit(running, on_done=delivered.append)
+    queued = runner.submit(lambda: "xếp hàng", on_done=delivered.append)
+    started.wait(5)
+    runner.cancel_all()
+    release.set()
+    runner.submit(lambda: "mới", on_done=delivered.append)
+    scheduler.pump(lambda: not runner.busy)
+    _check(queued.cancelled(), "cancel_all hủy việc còn xếp hàng")
+    _check(delivered == ["mới"], "cancel_all bỏ kết quả của việc đang chạy, giữ việc gửi sau đó")
+    runner.shutdown()
+
+
+def check_single_poll_chain():
+    scheduler = FakeScheduler()
+    runner = TaskRunner(scheduler, max_workers=2)
+    pages = []
+
+    def page(n):
+        pages.append(n)
+        if n < 5:
+            # Like PagedTreeview fetching the next page from the previous page's callback
+            runner.submit(lambda: time.sleep(0.01) or n + 1, on_done=page)
+
+    runner.submit(lambda: 1, on_done=page)
+    scheduler.pump(lambda: not runner.busy)
+    _check(pages == [1, 2, 3, 4, 5], "callback gửi việc mới vẫn nhận đủ kết quả")
+    _check(scheduler.peak == 1 and scheduler.scheduled == 0, "chỉ một chuỗi poll, dừng khi hết việc")
+    runner.shutdown()
+
+
+def main():
+    print("TaskRunner với scheduler giả:")
+    check_order()
+    check_cancel_all()
+    check_single_poll_chain()
+    print("Diễn tập TaskRunner: đạt")
+
+
+if __name__ == "__main__":
+    main()
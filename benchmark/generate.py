@@ -0,0 +1,146 @@
+"""Synthetic pharmacy data at production scale for the benchmarks
+
+Builds BAC_LUONG, NHAN_VIEN, LUONG, THUOC, HOA_DON and HOA_DON_THUOC with
+Vietnamese names, invoice ids that grow with time and dates spread over the
+last N months. The same --seed always gives the same data.
+
+Usage: python -m benchmark.generate --out bench.db [--invoices 1000000] [--staff 200]
+                                    [--medicines 2000] [--lines 3] [--months 24] [--seed 42]
+       python -m benchmark.generate --mysql ...   (fills the configured, empty MySQL database)
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from benchmark.schema import SCHEMA_SQL
+from config.db_config import load_db_config
+from model.connection_pool import close_all_pools, get_pool
+
+POSITIONS = [('Quản lí', 2.5), ('Quản lí của hàng', 2.0), ('Nhân viên bán hàng', 1.2), ('Nhân viên kho', 1.0)]
+HO = ['Nguyễn', 'Trần', 'Lê', 'Phạm', 'Hoàng', 'Huỳnh', 'Phan', 'Vũ', 'Võ', 'Đặng', 'Bùi', 'Đỗ', 'Hồ', 'Ngô', 'Dương']
+DEM = ['Văn', 'Thị', 'Hữu', 'Đức', 'Minh', 'Ngọc', 'Thanh', 'Quốc', 'Thu', 'Gia']
+TEN = ['An', 'Bình', 'Châu', 'Dũng', 'Giang', 'Hà', 'Hải', 'Hạnh', 'Hùng', 'Khánh', 'Lan', 'Linh', 'Long',
+       'Mai', 'Nam', 'Nga', 'Phúc', 'Quân', 'Sơn', 'Tâm', 'Thảo', 'Trang', 'Tuấn', 'Vy', 'Yến']
+HOAT_CHAT = ['Paracetamol', 'Amoxicillin', 'Vitamin C', 'Ibuprofen', 'Cefuroxim', 'Omeprazol', 'Loratadin',
+             'Metformin', 'Amlodipin', 'Berberin', 'Azithromycin', 'Salbutamol', 'Cetirizin', 'Diclofenac']
+HANG_SX = ['DHG', 'Imexpharm', 'Traphaco', 'Domesco', 'Pymepharco', 'Stada', 'Sanofi']
+DON_VI = ['Hộp', 'Vỉ', 'Lọ', 'Chai', 'Tuýp']
+
+CHUNK = 5000
+
+
+def _name(rng):
+    return f"{rng.choice(HO)} {rng.choice(DEM)} {rng.choice(TEN)}"
+
+
+def _create_schema(conn):
+    cur = conn.cursor()
+    for statement in SCHEMA_SQL.split(";"):
+        if statement.strip():
+            cur.execute(statement)
+    conn.commit()
+
+
+def _insert(conn, sql, rows):
+    cur = conn.cursor()
+    cur.executemany(sql, rows)
+
+
+def generate(conn, invoices=1000000, staff=200, medicines=2000, lines=3, months=24, seed=42, progress=True):
+    """Fill an empty database; returns the row count of each table"""
+    rng = random.Random(seed)
+    _create_schema(conn)
+    cur = conn.cursor()
+    cur.execute("SELECT COUNT(*) FROM HOA_DON")
+    if cur.fetchone()[0]:
+        raise SystemExit("Cơ sở dữ liệu đích đã có hóa đơn; hãy dùng một cơ sở dữ liệu trống")
+
+    conn.start_transaction()
+    _insert(conn, "INSERT INTO BAC_LUONG (chuc_vu, he_so_luong) VALUES (%s, %s)", POSITIONS)
+    staff_ids = [f"NV{i:05d}" for i in range(1, staff + 1)]
+    start = datetime.now() - timedelta(days=30 * months)
+    staff_rows = []
+    for i, ma_nv in enumerate(staff_ids):
+        chuc_vu = POSITIONS[0][0] if i == 0 else rng.choice(POSITIONS[1:])[0]
+        hired = start - timedelta(days=rng.randint(0, 3650))
+        staff_rows.append((ma_nv, _name(rng), f"09{rng.randint(0, 99999999):08d}", chuc_vu,
+                           hired.strftime('%Y-%m-%d'), None if i == 0 else staff_ids[0]))
+    _insert(conn, "INSERT INTO NHAN_VIEN (ma_nv, ho_va_ten, sdt, chuc_vu, ngay_vao_lam, ma_quan_ly) "
+                  "VALUES (%s, %s, %s, %s, %s, %s)", staff_rows)
+    _insert(conn, "INSERT INTO LUONG (ma_nv, so_gio_lam, thuong) VALUES (%s, %s, %s)",
+            [(ma_nv, rng.randint(100, 200), rng.choice([0, 500000, 1000000])) for ma_nv in staff_ids])
+
+    medicine_ids = [f"T{i:06d}" for i in range(1, medicines + 1)]
+    prices = {ma_thuoc: (rng.randint(5, 500) * 1000, rng.choice(DON_VI)) for ma_thuoc in medicine_ids}
+    _insert(conn, "INSERT INTO THUOC (ma_thuoc, ten_thuoc, hang_sx, so_luong_ton_kho) VALUES (%s, %s, %s, %s)",
+            [(ma_thuoc, f"{rng.choice(HOAT_CHAT)} {rng.choice([250, 500, 850])}mg {i}", rng.choice(HANG_SX),
+              10 ** 9) for i, ma_thuoc in enumerate(medicine_ids)])
+    conn.commit()
+
+    # Invoice ids grow with time, like ids handed out at the counter
+    span = (datetime.now() - start).total_seconds()
+    step = span / max(invoices, 1)
+    detail_count = 0
+    started = time.perf_counter()
+    for chunk_start in range(0, invoices, CHUNK):
+        headers, details = [], []
+        conn.start_transaction()
+        for n in range(chunk_start, min(chunk_start + CHUNK, invoices)):
+            ma_hoa_don = f"HD{n + 1:09d}"
+            ngay_gio = start + timedelta(seconds=n * step + rng.random() * step)
+            headers.append((ma_hoa_don, _name(rng) if rng.random() < 0.6 else 'Khách lẻ',
+                            ngay_gio.strftime('%Y-%m-%d %H:%M:%S'), rng.choice(staff_ids)))
+            giam_gia = rng.choice([0, 0, 0, 5, 10])
+            count = min(rng.randint(1, 2 * lines - 1), medicines)
+            for ma_thuoc in rng.sample(medicine_ids, count):
+                gia_ban, don_vi_tinh = prices[ma_thuoc]
+                details.append((ma_hoa_don, ma_thuoc, don_vi_tinh, rng.randint(1, 5), giam_gia, gia_ban))
+        _insert(conn, "INSERT INTO HOA_DON (ma_hoa_don, ten_khach_hang, ngay_gio, ma_nv) VALUES (%s, %s, %s, %s)",
+                headers)
+        _insert(conn, "INSERT INTO HOA_DON_THUOC (ma_hoa_don, ma_thuoc, don_vi_tinh, so_luong, giam_gia, gia_ban) "
+                      "VALUES (%s, %s, %s, %s, %s, %s)", details)
+        conn.commit()
+        detail_count += len(details)
+        done = min(chunk_start + CHUNK, invoices)
+        if progress and (done % (CHUNK * 20) == 0 or done == invoices):
+            print(f"  {done}/{invoices} hóa đơn ({time.perf_counter() - started:.0f}s)", file=sys.stderr)
+    return {'BAC_LUONG': len(POSITIONS), 'NHAN_VIEN': staff, 'LUONG': staff, 'THUOC': medicines,
+            'HOA_DON': invoices, 'HOA_DON_THUOC': detail_count}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", default="bench.db", help="tệp SQLite sẽ tạo")
+    parser.add_argument("--force", action="store_true", help="ghi đè tệp --out nếu đã có")
+    parser.add_argument("--mysql", action="store_true", help="ghi vào MySQL đã cấu hình thay vì SQLite")
+    parser.add_argument("--invoices", type=int, default=1000000)
+    parser.add_argument("--staff", type=int, default=200)
+    parser.add_argument("--medicines", type=int, default=2000)
+    parser.add_argument("--lines", type=int, default=3, help="số dòng trung bình mỗi hóa đơn")
+    parser.add_argument("--months", type=int, default=24)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.mysql:
+        pool = get_pool("mysql", load_db_config(), None)
+    else:
+        if os.path.exists(args.out):
+            if not args.force:
+                raise SystemExit(f"{args.out} đã tồn tại (dùng --force để ghi đè)")
+            os.remove(args.out)
+        pool = get_pool("sqlite", None, args.out)
+    conn = pool.acquire()
+    try:
+        counts = generate(conn, args.invoices, args.staff, args.medicines, args.lines, args.months, args.seed)
+    finally:
+        conn.close()
+        close_all_pools()
+    for table, count in counts.items():
+        print(f"{table}: {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Pharmacy schema used by the benchmarks on the SQLite stand-in"""
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS BAC_LUONG (
+    chuc_vu VARCHAR(50) PRIMARY KEY,
+    he_so_luong DECIMAL(5,2) NOT NULL
+);
+CREATE TABLE IF NOT EXISTS NHAN_VIEN (
+    ma_nv VARCHAR(50) PRIMARY KEY,
+    ho_va_ten VARCHAR(100) NOT NULL,
+    sdt VARCHAR(11),
+    chuc_vu VARCHAR(50) NOT NULL,
+    ngay_vao_lam DATE NOT NULL,
+    ma_quan_ly VARCHAR(50),
+    FOREIGN KEY (chuc_vu) REFERENCES BAC_LUONG(chuc_vu),
+    FOREIGN KEY (ma_quan_ly) REFERENCES NHAN_VIEN(ma_nv)
+);
+CREATE TABLE IF NOT EXISTS LUONG (
+    ma_nv VARCHAR(50) PRIMARY KEY,
+    so_gio_lam INT DEFAULT 0,
+    thuong DECIMAL(12,2) DEFAULT 0,
+    FOREIGN KEY (ma_nv) REFERENCES NHAN_VIEN(ma_nv) ON DELETE CASCADE
+);
+CREATE TABLE IF NOT EXISTS THUOC (
+    ma_thuoc VARCHAR(50) PRIMARY KEY,
+    ten_thuoc VARCHAR(100) NOT NULL,
+    hang_sx VARCHAR(100),
+    so_luong_ton_kho INT NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS HOA_DON (
+    ma_hoa_don VARCHAR(50) PRIMARY KEY,
+    ten_khach_hang VARCHAR(100),
+    ngay_gio DATETIME NOT NULL,
+    ma_nv VARCHAR(50),
+    FOREIGN KEY (ma_nv) REFERENCES NHAN_VIEN(ma_nv)
+);
+CREATE TABLE IF NOT EXISTS HOA_DON_THUOC (
+    ma_hoa_don VARCHAR(50) NOT NULL,
+    ma_thuoc VARCHAR(50) NOT NULL,
+    don_vi_tinh VARCHAR(20) NOT NULL,
+    so_luong INT NOT NULL,
+    giam_gia DECIMAL(12,2) DEFAULT 0,
+    gia_ban DECIMAL(12,2) NOT NULL,
+    PRIMARY KEY (ma_hoa_don, ma_thuoc),
+    FOREIGN KEY (ma_hoa_don) REFERENCES HOA_DON(ma_hoa_don),
+    FOREIGN KEY (ma_thuoc) REFERENCES THUOC(ma_thuoc)
+);
+"""
+
+
+def create_schema(conn):
+    """Create every table on a raw sqlite3 connection"""
+    conn.executescript(SCHEMA_SQL)
+    conn.commit()
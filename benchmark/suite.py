@@ -0,0 +1,358 @@
+"""Timing of every public model method, saved as JSON to compare between commits
+
+Usage: python -m benchmark.suite --db bench.db [--repeat 7] [--json results.json]
+                                 [--compare baseline.json] [--threshold 0.25] [--only REGEX] [--skip REGEX]
+       python -m benchmark.suite --mysql ...
+
+Build the database first with python -m benchmark.generate. Write cases create their
+own BENCH* rows and delete them again. With --compare the run exits with status 1
+when a method's median got slower than the baseline by more than --threshold.
+"""
+import argparse
+import inspect
+import itertools
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from config.db_config import load_backend_config, load_db_config
+from model.connection_pool import close_all_pools
+from model.query_stats import format_snapshot, snapshot
+
+# Differences below this many milliseconds are noise, never a regression
+MIN_DELTA_MS = 1.0
+
+
+class Case:
+    """One timed call; setup() runs untimed before each call and returns its arguments"""
+    def __init__(self, name, fn, setup=None):
+        self.name = name
+        self.fn = fn
+        self.setup = setup
+
+    def run(self, repeat, warmup=1):
+        for _ in range(warmup):
+            self.fn(*(self.setup() if self.setup else ()))
+        samples = []
+        for _ in range(repeat):
+            args = self.setup() if self.setup else ()
+            start = time.perf_counter()
+            self.fn(*args)
+            samples.append((time.perf_counter() - start) * 1000)
+        samples.sort()
+        return {
+            'repeat': repeat,
+            'min_ms': round(samples[0], 3),
+            'median_ms': round(statistics.median(samples), 3),
+            'mean_ms': round(statistics.fmean(samples), 3),
+            'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Context:
+    """Models plus sample keys taken from the benchmark database"""
+    def __init__(self):
+        from model.database import Database
+        from model.invoice import Invoice
+        from model.report import ReportModel
+        from model.staff import Staff
+
+        self.db = Database()
+        if not self.db.connect():
+            raise SystemExit("Không kết nối được cơ sở dữ liệu")
+        self.invoice = Invoice(self.db)
+        self.staff = Staff(self.db)
+        backend = load_backend_config()
+        self.report = ReportModel(db_path=backend['sqlite_path'], backend=backend['backend'],
+                                  mysql_config=load_db_config())
+        self.ids = itertools.count()
+        self.run_tag = datetime.now().strftime('%H%M%S')
+
+    def prepare(self):
+        """Build derived tables and indexes untimed, so the first case does not pay for them"""
+        steps = [("bảng tổng hóa đơn", self.invoice.totals.ensure_table),
+                 ("chỉ mục tìm kiếm", self.invoice.search_index.ensure_table),
+                 ("chỉ mục báo cáo", self.report.ensure_indexes),
+                 ("tổng hợp doanh thu", self.report.refresh_rollup)]
+        for label, step in steps:
+            start = time.perf_counter()
+            step()
+            print(f"  chuẩn bị {label}: {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+        newest = self.invoice.get_invoices_page(1)
+        if not newest:
+            raise SystemExit("Cơ sở dữ liệu chưa có hóa đơn (chạy python -m benchmark.generate trước)")
+        self.invoice_id = newest[0]['ma_hoa_don']
+        middle = self.db.fetch_query("SELECT COUNT(*) as count FROM HOA_DON")[0]['count'] // 2
+        deep = self.db.fetch_query(
+            "SELECT ngay_gio, ma_hoa_don FROM HOA_DON ORDER BY ngay_gio DESC, ma_hoa_don DESC LIMIT 1 OFFSET %s",
+            (middle,))
+        self.deep_key = (deep[0]['ngay_gio'], deep[0]['ma_hoa_don'])
+        staff = self.db.fetch_query("SELECT ma_nv, chuc_vu FROM NHAN_VIEN ORDER BY ma_nv LIMIT 1")[0]
+        self.staff_id, self.position = staff['ma_nv'], staff['chuc_vu']
+        self.medicines = [m['ma_thuoc'] for m in self.db.fetch_query("SELECT ma_thuoc FROM THUOC LIMIT 3")]
+        now = datetime.now()
+        closed = datetime(now.year - (now.month == 1), (now.month - 2) % 12 + 1, 1)
+        self.closed_month = (f"{closed.month:02d}", str(closed.year))
+        self.current_month = (f"{now.month:02d}", str(now.year))
+
+    def next_id(self, prefix):
+        return f"BENCH{prefix}{self.run_tag}{next(self.ids):06d}"
+
+    def _items(self):
+        return [{'ma_thuoc': m, 'don_vi_tinh': 'Hộp', 'so_luong': 1, 'don_gia': 10000.0} for m in self.medicines]
+
+    def journal_invoice(self):
+        """An invoice as the offline journal stores it"""
+        return {'ma_hoa_don': self.next_id("J"), 'ten_khach_hang': "Khách lẻ",
+                'ngay_gio': datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'ma_nv': self.staff_id,
+                'giam_gia': 0, 'items': self._items()}
+
+    def new_invoice(self):
+        ma_hoa_don = self.next_id("H")
+        ok, msg = self.invoice.create_invoice(ma_hoa_don, "Khách lẻ", self.staff_id, 0, self._items())
+        if not ok:
+            raise SystemExit(f"Không tạo được hóa đơn thử: {msg}")
+        return ma_hoa_don
+
+    def new_staff(self):
+        ma_nv = self.next_id("N")
+        ok, msg = self.staff.create_staff(ma_nv, "Nguyễn Văn Thử", "0900000000", self.position, "2020-01-01", "")
+        if not ok:
+            raise SystemExit(f"Không tạo được nhân viên thử: {msg}")
+        return ma_nv
+
+
+def build_cases(ctx):
+    inv, staff, report = ctx.invoice, ctx.staff, ctx.report
+    created_invoices, created_staff = [], []
+    revenue_rows = report.get_revenue_by_month(*ctx.closed_month)
+
+    def create_invoice():
+        created_invoices.append(ctx.new_invoice())
+
+    def pop_invoice():
+        return (created_invoices.pop() if created_invoices else ctx.new_invoice(),)
+
+    def create_staff():
+        created_staff.append(ctx.new_staff())
+
+    def pop_staff():
+        return (created_staff.pop() if created_staff else ctx.new_staff(),)
+
+    imported = {'staff': [], 'invoices': [], 'medicines': []}
+
+    def import_batch(kind, make, size=100):
+        # Drop the previous batch untimed, so every call inserts rows that are new
+        def setup():
+            cleanup(kind)
+            batch = [make() for _ in range(size)]
+            imported[kind] = [row['ma_hoa_don'] if kind == 'invoices' else row[0] for row in batch]
+            return (batch,)
+        return setup
+
+    def cleanup(kind):
+        ids = imported[kind]
+        if kind == 'staff':
+            for ma_nv in ids:
+                staff.delete_staff(ma_nv)
+        elif kind == 'invoices':
+            for ma_hoa_don in ids:
+                inv.delete_invoice(ma_hoa_don)
+        elif ids:
+            ctx.db.execute_query(f"DELETE FROM THUOC WHERE ma_thuoc IN ({', '.join(['%s'] * len(ids))})",
+                                 tuple(ids))
+        imported[kind] = []
+
+    def in_transaction(write):
+        def run(batch):
+            with ctx.db.transaction():
+                write(batch)
+        return run
+
+    def uncached():
+        report.cache.invalidate()
+        return ()
+
+    def peek_staff():
+        if not created_staff:
+            created_staff.append(ctx.new_staff())
+        return (created_staff[-1],)
+
+    return [
+        Case("Invoice.create_invoice", create_invoice),
+        Case("Invoice.delete_invoice", inv.delete_invoice, setup=pop_invoice),
+        Case("Invoice.replay", inv.replay, setup=import_batch('invoices', ctx.journal_invoice, size=20)),
+        Case("Invoice.import_invoices", in_transaction(inv.import_invoices),
+             setup=import_batch('invoices', ctx.journal_invoice)),
+        Case("Invoice.import_medicines", in_transaction(inv.import_medicines),
+             setup=import_batch('medicines', lambda: (ctx.next_id("T"), "Thuốc thử", "SX", 100))),
+        Case("Invoice.refresh_rollup_months", lambda: inv.refresh_rollup_months(
+            [(int(ctx.closed_month[1]), int(ctx.closed_month[0]))])),
+        Case("Invoice.get_all_invoices", inv.get_all_invoices),
+        Case("Invoice.get_invoices_page", lambda: inv.get_invoices_page(100)),
+        Case("Invoice.get_invoices_page[deep]", lambda: inv.get_invoices_page(100, after=ctx.deep_key)),
+        Case("Invoice.get_invoice_by_id", lambda: inv.get_invoice_by_id(ctx.invoice_id)),
+        Case("Invoice.get_invoice_by_id[archive]", lambda: inv.get_invoice_by_id("KHONGCO", include_archive=True)),
+        Case("Invoice.search_invoices[name]", lambda: inv.search_invoices("nguyen van")),
+        Case("Invoice.search_invoices[id]", lambda: inv.search_invoices(ctx.invoice_id[-6:])),
+        Case("Invoice.get_all_medicines", inv.get_all_medicines),
+        Case("Invoice.get_all_medicines[cold]", inv.get_all_medicines, setup=lambda: inv.catalog.invalidate() or ()),
+        Case("Staff.get_all_positions", staff.get_all_positions),
+        Case("Staff.check_position_exists", lambda: staff.check_position_exists(ctx.position)),
+        Case("Staff.create_staff", create_staff),
+        Case("Staff.import_staff", in_transaction(staff.import_staff), setup=import_batch('staff', lambda: (
+            ctx.next_id("N"), "Nguyễn Văn Nhập", "0900000000", ctx.position, "2020-01-01", None))),
+        Case("Staff.get_all_staff", staff.get_all_staff),
+        Case("Staff.search_staff", lambda: staff.search_staff("tran thi")),
+        Case("Staff.get_staff_by_id", lambda: staff.get_staff_by_id(ctx.staff_id)),
+        Case("Staff.update_staff", lambda ma_nv: staff.update_staff(
+            ma_nv, "Lê Thị Sửa", "0911111111", ctx.position, "2021-02-02", ""), setup=peek_staff),
+        Case("Staff.delete_staff", staff.delete_staff, setup=pop_staff),
+        # The report cases time the queries; the [cached] ones time a repeat served from the report cache
+        Case("ReportModel.get_positions", report.get_positions, setup=uncached),
+        Case("ReportModel.get_positions[cached]", report.get_positions),
+        Case("ReportModel.get_seniority", report.get_seniority, setup=uncached),
+        Case("ReportModel.get_seniority[position]", lambda: report.get_seniority(ctx.position), setup=uncached),
+        Case("ReportModel.get_seniority[cached]", report.get_seniority),
+        Case("ReportModel.get_seniority_histogram", report.get_seniority_histogram),
+        Case("ReportModel.iter_seniority", lambda: sum(len(batch) for batch in report.iter_seniority())),
+        Case("ReportModel.refresh_rollup", report.refresh_rollup),
+        Case("ReportModel.get_revenue_by_month[closed]", lambda: report.get_revenue_by_month(*ctx.closed_month),
+             setup=uncached),
+        Case("ReportModel.get_revenue_by_month[current]", lambda: report.get_revenue_by_month(*ctx.current_month),
+             setup=uncached),
+        Case("ReportModel.get_revenue_by_month[cached]", lambda: report.get_revenue_by_month(*ctx.current_month)),
+        Case("ReportModel.iter_revenue[closed]",
+             lambda: sum(len(batch) for batch in report.iter_revenue(*ctx.closed_month))),
+        Case("ReportModel.revenue_exists", lambda: report.revenue_exists(*ctx.current_month), setup=uncached),
+        Case("ReportModel.revenue_exists[archive]",
+             lambda: report.revenue_exists(*ctx.closed_month, include_archive=True), setup=uncached),
+        Case("ReportModel.revenue_exists[cached]", lambda: report.revenue_exists(*ctx.current_month)),
+        Case("ReportModel.cache_stats", report.cache_stats),
+        Case("ReportModel.ensure_indexes", report.ensure_indexes),
+        Case("ReportModel.explain_revenue", lambda: report.explain_revenue(*ctx.current_month)),
+        Case("ReportModel.sum_revenue", lambda: report.sum_revenue(revenue_rows)),
+    ]
+
+
+def uncovered_methods(ctx, cases):
+    """Public methods of the benchmarked models that have no case"""
+    covered = {case.name.split("[")[0] for case in cases}
+    missing = []
+    for obj in (ctx.invoice, ctx.staff, ctx.report):
+        cls = type(obj)
+        for name, _ in inspect.getmembers(cls, inspect.isfunction):
+            if not name.startswith("_") and f"{cls.__name__}.{name}" not in covered:
+                missing.append(f"{cls.__name__}.{name}")
+    return missing
+
+
+def compare(results, baseline, threshold):
+    """Print the per-case change against a baseline; returns the names that regressed"""
+    regressions = []
+    print(f"\n{'phương thức':<48}{'trước (ms)':>12}{'sau (ms)':>12}{'tỉ lệ':>8}")
+    for name, current in results['results'].items():
+        before = baseline.get('results', {}).get(name)
+        if not before:
+            print(f"{name:<48}{'-':>12}{current['median_ms']:>12.3f}{'mới':>8}")
+            continue
+        old, new = before['median_ms'], current['median_ms']
+        ratio = new / old if old else float('inf')
+        # The fastest sample must be slower too, so one noisy run does not fail the check
+        regressed = (ratio > 1 + threshold and new - old > MIN_DELTA_MS
+                     and current['min_ms'] > before['min_ms'] * (1 + threshold))
+        flag = "  <-- chậm hơn" if regressed else ""
+        print(f"{name:<48}{old:>12.3f}{new:>12.3f}{ratio:>8.2f}{flag}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def run(repeat, only=None, skip=None):
+    ctx = Context()
+    ctx.prepare()
+    cases = build_cases(ctx)
+    missing = uncovered_methods(ctx, cases)
+    if only:
+        cases = [c for c in cases if re.search(only, c.name)]
+    if skip:
+        cases = [c for c in cases if not re.search(skip, c.name)]
+    results = {}
+    for case in cases:
+        results[case.name] = case.run(repeat)
+        r = results[case.name]
+        print(f"{case.name:<48} median {r['median_ms']:>10.3f} ms   p95 {r['p95_ms']:>10.3f} ms")
+    counts = {table: ctx.db.fetch_query(f"SELECT COUNT(*) as count FROM {table}")[0]['count']
+              for table in ("NHAN_VIEN", "THUOC", "HOA_DON", "HOA_DON_THUOC")}
+    if missing:
+        print(f"Chưa có phép đo cho: {', '.join(missing)}", file=sys.stderr)
+    return {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'backend': ctx.db.backend,
+            'rows': counts,
+            'repeat': repeat,
+            'uncovered': missing,
+        },
+        'results': results,
+        # Per-statement timings collected while the cases ran
+        'queries': snapshot(top=30),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default="bench.db", help="tệp SQLite do benchmark.generate tạo")
+    parser.add_argument("--mysql", action="store_true", help="đo trên MySQL đã cấu hình")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--json", help="ghi kết quả ra tệp JSON")
+    parser.add_argument("--compare", help="tệp JSON của lần chạy trước để so sánh")
+    parser.add_argument("--threshold", type=float, default=0.25, help="mức chậm hơn cho phép (0.25 = 25%%)")
+    parser.add_argument("--only", help="chỉ chạy các phép đo khớp biểu thức này")
+    parser.add_argument("--skip", help="bỏ qua các phép đo khớp biểu thức này")
+    args = parser.parse_args()
+    if not args.mysql:
+        if not os.path.exists(args.db):
+            raise SystemExit(f"Không thấy {args.db} (chạy python -m benchmark.generate --out {args.db} trước)")
+        os.environ["DB_BACKEND"] = "sqlite"
+        os.environ["DB_SQLITE_PATH"] = args.db
+    else:
+        os.environ["DB_BACKEND"] = "mysql"
+    try:
+        results = run(args.repeat, args.only, args.skip)
+    finally:
+        close_all_pools()
+    print(format_snapshot(top=10), file=sys.stderr)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Đã ghi {args.json}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} phương thức chậm hơn ngưỡng {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,416 @@
+"""Bulk import of staff, medicines and historical invoices from CSV or Excel files
+
+Rows are streamed from the file, checked with the same rules as the entry forms
+(the StaffView / InvoiceView validators) and against keys preloaded from the database,
+then written with executemany, one transaction per batch. A bad row never stops the
+import: it goes to a reject file (CSV: source line, error, original columns). If the
+database refuses a whole batch, its rows are retried one at a time so only the
+offending ones are rejected.
+
+Staff: ma_nv, ho_va_ten, sdt, chuc_vu, ngay_vao_lam, ma_quan_ly
+Medicines: ma_thuoc, ten_thuoc, hang_sx, so_luong_ton_kho
+Invoices, one row per line (lines of an invoice next to each other):
+    ma_hoa_don, ten_khach_hang, ngay_gio, ma_nv, giam_gia, ma_thuoc, don_vi_tinh, so_luong, don_gia
+
+Usage: python -m controller.bulk_import staff|medicines|invoices FILE [--rejects FILE] [--batch 1000]
+"""
+import argparse
+import csv
+import datetime
+import os
+import sys
+import time
+
+from model import data_version
+from view.invoice_view import InvoiceView
+from view.staff_view import StaffView
+
+COLUMNS = {
+    "staff": ("ma_nv", "ho_va_ten", "sdt", "chuc_vu", "ngay_vao_lam", "ma_quan_ly"),
+    "medicines": ("ma_thuoc", "ten_thuoc", "hang_sx", "so_luong_ton_kho"),
+    "invoices": ("ma_hoa_don", "ten_khach_hang", "ngay_gio", "ma_nv", "giam_gia",
+                 "ma_thuoc", "don_vi_tinh", "so_luong", "don_gia"),
+}
+# Optional columns may be missing from the file altogether
+OPTIONAL = {"sdt", "ma_quan_ly", "hang_sx", "so_luong_ton_kho", "giam_gia"}
+MANAGER_POSITIONS = ("quản lý", "quản lí")
+
+
+class ImportFileError(ValueError):
+    """The file cannot be imported at all (unreadable, missing columns)"""
+
+
+def _text(value):
+    """Cell value as the text a user would have typed into the form"""
+    if value is None:
+        return ""
+    if isinstance(value, datetime.datetime):
+        if value.time() == datetime.time():
+            return value.strftime('%Y-%m-%d')
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def _row(header, values):
+    # Short rows get empty cells, so every column of the header is present
+    return {name: values[i] if i < len(values) else "" for i, name in enumerate(header) if name}
+
+
+def read_rows(path):
+    """Yield (line number, {column: text}) from a CSV or .xlsx file, one row at a time"""
+    if path.lower().endswith((".xlsx", ".xlsm")):
+        import openpyxl
+        workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [_text(name).lower() for name in next(rows, ())]
+            for line, values in enumerate(rows, start=2):
+                values = [_text(v) for v in values]
+                if any(values):
+                    yield line, _row(header, values)
+        finally:
+            workbook.close()
+        return
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        header = [name.strip().lower() for name in next(reader, [])]
+        for values in reader:
+            values = [v.strip() for v in values]
+            if any(values):
+                yield reader.line_num, _row(header, values)
+
+
+class RejectWriter:
+    """CSV of the rows that were not imported, created on the first reject"""
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = columns
+        self.count = 0
+        self._file = None
+        self._writer = None
+
+    def add(self, line, source, error):
+        if self._file is None:
+            self._file = open(self.path, "w", newline="", encoding="utf-8-sig")
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(("dong", "loi") + self.columns)
+        self._writer.writerow((line, error) + tuple(source.get(c, "") for c in self.columns))
+        self.count += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class _Item:
+    """One record to load: its value for the model and the source lines it came from"""
+    __slots__ = ("lines", "value")
+
+    def __init__(self, lines, value):
+        self.lines = lines
+        self.value = value
+
+
+def _first_error(*checks):
+    for valid, msg in checks:
+        if not valid:
+            return msg
+    return None
+
+
+class BulkImporter:
+    """Stream, validate and batch-load one kind of record; returns counts from each import_*"""
+    BATCH_SIZE = 1000
+
+    def __init__(self, db, batch_size=None):
+        from model.invoice import Invoice
+        from model.staff import Staff
+
+        self.db = db
+        self.batch_size = batch_size or self.BATCH_SIZE
+        self.staff_model = Staff(db)
+        self.invoice_model = Invoice(db)
+
+    def _keys(self, query):
+        return {row['ma'] for row in self.db.fetch_query(query)}
+
+    def _check_columns(self, kind, header):
+        missing = [c for c in COLUMNS[kind] if c not in header and c not in OPTIONAL]
+        if missing:
+            raise ImportFileError(f"Tệp thiếu cột: {', '.join(missing)}")
+
+    def _rows(self, kind, path):
+        """Rows of the file, after checking the header of the first one"""
+        rows = read_rows(path)
+        first = next(rows, None)
+        if first is None:
+            return
+        self._check_columns(kind, first[1])
+        yield first
+        yield from rows
+
+    def _load(self, batch, write, rejects):
+        """Write one batch in a transaction; if it fails, retry row by row. Returns the rows written."""
+        if not batch:
+            return 0
+        try:
+            with self.db.transaction():
+                write([item.value for item in batch])
+            return sum(len(item.lines) for item in batch)
+        except Exception:
+            pass
+        loaded = 0
+        for item in batch:
+            try:
+                with self.db.transaction():
+                    write([item.value])
+                loaded += len(item.lines)
+            except Exception as e:
+                for line, source in item.lines:
+                    rejects.add(line, source, str(e))
+        return loaded
+
+    def _run(self, kind, path, rejects_path, validate, write, finish=None):
+        """Drive one import: validate(line, row, emit, rejects) feeds items, write(values) stores a batch"""
+        rejects = RejectWriter(rejects_path, COLUMNS[kind])
+        batch = []
+        loaded = 0
+        start = time.perf_counter()
+
+        def emit(item):
+            nonlocal loaded
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                loaded += self._load(batch, write, rejects)
+                batch.clear()
+
+        try:
+            for line, row in self._rows(kind, path):
+                validate(line, row, emit, rejects)
+            if finish:
+                finish(emit, rejects)
+            loaded += self._load(batch, write, rejects)
+        finally:
+            rejects.close()
+        return {'imported': loaded, 'rejected': rejects.count, 'seconds': time.perf_counter() - start,
+                'rejects_path': rejects_path if rejects.count else None}
+
+    def import_staff(self, path, rejects_path):
+        """Staff rows; a manager listed after their staff is loaded first, the staff wait for it"""
+        self.staff_model.search_index.ensure_table()
+        positions = {p['chuc_vu'] for p in self.staff_model.get_all_positions()}
+        known = self._keys("SELECT ma_nv as ma FROM NHAN_VIEN")
+        # ma_quan_ly -> rows waiting for that manager further down the file
+        waiting = {}
+        waiting_ids = set()
+
+        def accept(item, emit):
+            stack = [item]
+            while stack:
+                item = stack.pop()
+                known.add(item.value[0])
+                emit(item)
+                for child in waiting.pop(item.value[0], []):
+                    waiting_ids.discard(child.value[0])
+                    stack.append(child)
+
+        def validate(line, row, emit, rejects):
+            data = {c: row.get(c, "") for c in COLUMNS["staff"]}
+            chuc_vu = data['chuc_vu']
+            is_manager = chuc_vu.strip().lower() in MANAGER_POSITIONS
+            error = _first_error(
+                StaffView.validate_id(data['ma_nv'], "Mã nhân viên", 50, required=True),
+                StaffView.validate_string_length(data['ho_va_ten'], "Họ và tên", 100, required=True),
+                StaffView.validate_phone_number(data['sdt']),
+                (bool(chuc_vu), "Vui lòng chọn chức vụ"),
+                StaffView.validate_date_format(data['ngay_vao_lam']),
+                StaffView.validate_id(data['ma_quan_ly'], "Mã quản lý", 50, required=not is_manager))
+            if not error and chuc_vu not in positions:
+                error = f"Chức vụ '{chuc_vu}' không tồn tại trong hệ thống"
+            if not error and (data['ma_nv'] in known or data['ma_nv'] in waiting_ids):
+                error = f"Mã nhân viên {data['ma_nv']} đã tồn tại"
+            if error:
+                rejects.add(line, row, error)
+                return
+            item = _Item([(line, row)], (data['ma_nv'], data['ho_va_ten'], data['sdt'] or None, chuc_vu,
+                                         data['ngay_vao_lam'], data['ma_quan_ly'] or None))
+            manager = data['ma_quan_ly']
+            if manager and manager not in known:
+                waiting.setdefault(manager, []).append(item)
+                waiting_ids.add(data['ma_nv'])
+                return
+            accept(item, emit)
+
+        def finish(emit, rejects):
+            for manager, items in waiting.items():
+                for item in items:
+                    for line, row in item.lines:
+                        rejects.add(line, row, f"Mã quản lý {manager} không tồn tại")
+
+        result = self._run("staff", path, rejects_path, validate, self.staff_model.import_staff, finish)
+        data_version.bump("NHAN_VIEN")
+        return result
+
+    def import_medicines(self, path, rejects_path):
+        known = self._keys("SELECT ma_thuoc as ma FROM THUOC")
+
+        def validate(line, row, emit, rejects):
+            data = {c: row.get(c, "") for c in COLUMNS["medicines"]}
+            error = _first_error(
+                InvoiceView.validate_id(data['ma_thuoc'], "Mã thuốc", 50, required=True),
+                InvoiceView.validate_string_length(data['ten_thuoc'], "Tên thuốc", 100, required=True),
+                InvoiceView.validate_string_length(data['hang_sx'], "Hãng sản xuất", 100, required=False),
+                InvoiceView.validate_integer(data['so_luong_ton_kho'], "Số lượng tồn kho", min_val=0))
+            if not error and data['ma_thuoc'] in known:
+                error = f"Mã thuốc {data['ma_thuoc']} đã tồn tại"
+            if error:
+                rejects.add(line, row, error)
+                return
+            known.add(data['ma_thuoc'])
+            emit(_Item([(line, row)], (data['ma_thuoc'], data['ten_thuoc'], data['hang_sx'] or None,
+                                       int(data['so_luong_ton_kho'] or 0))))
+
+        result = self._run("medicines", path, rejects_path, validate, self.invoice_model.import_medicines)
+        data_version.bump("THUOC")
+        return result
+
+    def import_invoices(self, path, rejects_path):
+        """Historical invoices: lines are grouped by consecutive ma_hoa_don, stock is not touched"""
+        self.invoice_model.totals.ensure_table()
+        self.invoice_model.search_index.ensure_table()
+        staff = self._keys("SELECT ma_nv as ma FROM NHAN_VIEN")
+        medicines = self._keys("SELECT ma_thuoc as ma FROM THUOC")
+        seen = set()
+        months = set()
+        # Lines of the invoice being read, as (line, row)
+        current = []
+
+        def header_error(data):
+            error = _first_error(
+                InvoiceView.validate_id(data['ma_hoa_don'], "Mã hóa đơn", 50, required=True),
+                InvoiceView.validate_string_length(data['ten_khach_hang'], "Tên khách hàng", 100, required=True),
+                InvoiceView.validate_id(data['ma_nv'], "Mã nhân viên", 50, required=True),
+                InvoiceView.validate_percentage(data['giam_gia'] or "0", "Giảm giá"),
+                StaffView.validate_date_format(data['ngay_gio'][:10]))
+            if error:
+                return error
+            try:
+                datetime.datetime.strptime(data['ngay_gio'][10:].strip() or "00:00:00", '%H:%M:%S')
+            except ValueError:
+                return "Giờ phải theo định dạng HH:MM:SS"
+            if data['ma_nv'] not in staff:
+                return f"Nhân viên {data['ma_nv']} không tồn tại"
+            if data['ma_hoa_don'] in seen:
+                return f"Mã hóa đơn {data['ma_hoa_don']} bị trùng (các dòng của một hóa đơn phải liền nhau)"
+            return None
+
+        def line_error(data, ma_thuoc_seen):
+            error = _first_error(
+                InvoiceView.validate_integer(data['so_luong'], "Số lượng", min_val=1, max_val=100000, required=True),
+                InvoiceView.validate_float(data['don_gia'], "Đơn giá", min_val=0, max_val=1000000000, required=True),
+                InvoiceView.validate_string_length(data['don_vi_tinh'], "Đơn vị tính", 20, required=True))
+            if error:
+                return error
+            if data['ma_thuoc'] not in medicines:
+                return f"Thuốc {data['ma_thuoc']} không tồn tại"
+            if data['ma_thuoc'] in ma_thuoc_seen:
+                return f"Thuốc {data['ma_thuoc']} xuất hiện hai lần trong hóa đơn"
+            return None
+
+        def close_invoice(emit, rejects):
+            lines = list(current)
+            current.clear()
+            if not lines:
+                return
+            data = {c: lines[0][1].get(c, "") for c in COLUMNS["invoices"]}
+            error = header_error(data)
+            seen.add(data['ma_hoa_don'])
+            items, ma_thuoc_seen = [], set()
+            for line, row in lines:
+                if error:
+                    break
+                line_data = {c: row.get(c, "") for c in COLUMNS["invoices"]}
+                error = line_error(line_data, ma_thuoc_seen)
+                if error:
+                    error = f"Dòng {line}: {error}"
+                    break
+                ma_thuoc_seen.add(line_data['ma_thuoc'])
+                items.append({'ma_thuoc': line_data['ma_thuoc'], 'don_vi_tinh': line_data['don_vi_tinh'],
+                              'so_luong': int(line_data['so_luong']), 'don_gia': float(line_data['don_gia'])})
+            if error:
+                for line, row in lines:
+                    rejects.add(line, row, error)
+                return
+            ngay_gio = data['ngay_gio'] if len(data['ngay_gio']) > 10 else f"{data['ngay_gio']} 00:00:00"
+            months.add((int(ngay_gio[:4]), int(ngay_gio[5:7])))
+            emit(_Item(lines, {'ma_hoa_don': data['ma_hoa_don'], 'ten_khach_hang': data['ten_khach_hang'],
+                               'ngay_gio': ngay_gio, 'ma_nv': data['ma_nv'],
+                               'giam_gia': float(data['giam_gia'] or 0), 'items': items}))
+
+        def validate(line, row, emit, rejects):
+            if current and row.get('ma_hoa_don', "") != current[0][1].get('ma_hoa_don', ""):
+                close_invoice(emit, rejects)
+            current.append((line, row))
+
+        def write(invoices):
+            # Ids already in the database are refused by the primary key; find them first for a clear error
+            ids = [inv['ma_hoa_don'] for inv in invoices]
+            placeholders = ", ".join(["%s"] * len(ids))
+            existing = [row['ma_hoa_don'] for row in self.db.fetch_query(
+                f"SELECT ma_hoa_don FROM HOA_DON WHERE ma_hoa_don IN ({placeholders})", tuple(ids))]
+            # Nothing stops an archived id from coming back into the hot tables
+            existing = existing or self.invoice_model.archive.archived_ids(ids)
+            if existing:
+                raise RuntimeError(f"Mã hóa đơn {existing[0]} đã tồn tại")
+            self.invoice_model.import_invoices(invoices)
+
+        result = self._run("invoices", path, rejects_path, validate, write, close_invoice)
+        if result['imported']:
+            self.invoice_model.refresh_rollup_months(months)
+        data_version.bump("HOA_DON")
+        return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("kind", choices=sorted(COLUMNS))
+    parser.add_argument("file")
+    parser.add_argument("--rejects", help="tệp CSV ghi các dòng bị loại (mặc định: FILE.rejects.csv)")
+    parser.add_argument("--batch", type=int, default=BulkImporter.BATCH_SIZE, help="số bản ghi mỗi giao dịch")
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.file):
+        print(f"Không thấy tệp {args.file}")
+        return 2
+
+    from model.connection_pool import close_all_pools
+    from model.database import Database
+
+    db = Database()
+    if not db.connect():
+        print("Không kết nối được cơ sở dữ liệu")
+        return 1
+    try:
+        importer = BulkImporter(db, args.batch)
+        run = getattr(importer, f"import_{args.kind}")
+        result = run(args.file, args.rejects or os.path.splitext(args.file)[0] + ".rejects.csv")
+    except ImportFileError as e:
+        print(e)
+        return 2
+    finally:
+        db.disconnect()
+        close_all_pools()
+    rate = result['imported'] / result['seconds'] * 60 if result['seconds'] else 0
+    print(f"Đã nhập {result['imported']} dòng, loại {result['rejected']} dòng "
+          f"trong {result['seconds']:.1f}s ({rate:,.0f} dòng/phút)")
+    if result['rejects_path']:
+        print(f"Các dòng bị loại: {result['rejects_path']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
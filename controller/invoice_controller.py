@@ -1,51 +1,83 @@
 from model.database import Database
 from model.invoice import Invoice
+from controller.task_runner import SyncRunner
 
 
 class InvoiceController:
     """Controller layer to connect View and Model for Invoices"""
     
-    def __init__(self, view):
+    def __init__(self, view, runner=None):
         self.view = view
+        # Model calls run on the runner's worker threads; results come back on the Tk thread
+        self.runner = runner or SyncRunner()
         self.db = Database()
         self.invoice_model = Invoice(self.db)
         
-        # Connect to database
-        if not self.db.connect():
-            self.view.show_message("Lỗi kết nối", 
+        # Connect to database off the Tk thread; loads submitted meanwhile attach to the pool themselves
+        self.runner.submit(self.db.connect, on_done=self._on_connected, on_error=lambda e: self._on_connected(False))
+
+    def _on_connected(self, connected):
+        if not connected:
+            self.view.show_message("Lỗi kết nối",
                                   "Không thể kết nối đến cơ sở dữ liệu. Vui lòng kiểm tra cấu hình.",
                                   "error")
+        else:
+            # First run back-fills the totals and builds the search index from existing rows
+            self.runner.submit(self.invoice_model.totals.ensure_table)
+            self.runner.submit(self.invoice_model.search_index.ensure_table)
     
     def create_invoice(self, ma_hoa_don, ten_khach_hang, ma_nv, giam_gia, items):
-        """Create a new invoice"""
-        try:
-            return self.invoice_model.create_invoice(
-                ma_hoa_don,
-                ten_khach_hang,
-                ma_nv,
-                giam_gia,
-                items
-            )
-        except Exception as e:
-            return False, f"Không thể tạo hóa đơn: {str(e)}"
+        """Create a new invoice; the result goes to view.on_invoice_created"""
+        self.runner.submit(
+            self.invoice_model.create_invoice,
+            ma_hoa_don,
+            ten_khach_hang,
+            ma_nv,
+            giam_gia,
+            items,
+            on_done=lambda result: self.view.on_invoice_created(*result),
+            on_error=lambda e: self.view.on_invoice_created(False, f"Không thể tạo hóa đơn: {str(e)}")
+        )
     
     def load_all_invoices(self):
-        """Load all invoices"""
+        """Load the newest page of invoices; the view fetches older pages on scroll"""
         try:
-            invoices = self.invoice_model.get_all_invoices()
-            self.view.display_invoices(invoices)
+            self.view.display_invoice_pages()
         except Exception as e:
             self.view.show_message("Lỗi", f"Không thể tải danh sách hóa đơn: {str(e)}", "error")
     
+    def get_invoice_page(self, limit, after=None, before=None):
+        """Get one keyset page of invoices"""
+        try:
+            return self.invoice_model.get_invoices_page(limit, after=after, before=before)
+        except Exception as e:
+            print(f"Error getting invoice page: {str(e)}")
+            return []
+    
+    def load_invoice_page(self, callback, limit, after=None, before=None):
+        """Fetch one keyset page in the background and pass the rows to callback"""
+        self.runner.submit(self.get_invoice_page, limit, after=after, before=before, on_done=callback)
+    
     def search_invoices(self, search_term):
         """Search invoices"""
-        try:
-            invoices = self.invoice_model.search_invoices(search_term)
+        def done(invoices):
             self.view.display_invoices(invoices)
             if not invoices:
                 self.view.show_message("Thông báo", "Không tìm thấy hóa đơn nào", "info")
+
+        self.runner.submit(
+            self.invoice_model.search_invoices, search_term,
+            on_done=done,
+            on_error=lambda e: self.view.show_message("Lỗi", f"Không thể tìm kiếm hóa đơn: {str(e)}", "error")
+        )
+    
+    def find_invoices(self, search_term):
+        """Search invoices without touching the view (safe off the Tk thread)"""
+        try:
+            return self.invoice_model.search_invoices(search_term)
         except Exception as e:
-            self.view.show_message("Lỗi", f"Không thể tìm kiếm hóa đơn: {str(e)}", "error")
+            print(f"Error searching invoices: {str(e)}")
+            return []
     
     def get_all_medicines(self):
         """Get all medicines for invoice creation"""
@@ -55,6 +87,10 @@ class InvoiceController:
             print(f"Error getting medicines: {str(e)}")
             return []
     
+    def load_medicines(self):
+        """Load medicines in the background and fill the view's combobox"""
+        self.runner.submit(self.get_all_medicines, on_done=self.view.set_medicines)
+    
     def close(self):
         """Close database connection"""
         self.db.disconnect()
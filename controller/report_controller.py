@@ -1,207 +1,266 @@
 import csv
 import datetime
-try:
-    import openpyxl
-    from openpyxl.styles import Font, Alignment
-except ImportError:
-    openpyxl = None
+import itertools
 
 from model.report import ReportModel
+from controller.task_runner import SyncRunner
 
 class ReportController:
-    def __init__(self, view, backend="sqlite", mysql_config=None):
+    def __init__(self, view, backend="sqlite", mysql_config=None, db_path="database.db", runner=None):
         self.view = view
-        self.model = ReportModel(backend=backend, mysql_config=mysql_config)
+        self.model = ReportModel(db_path=db_path, backend=backend, mysql_config=mysql_config)
+        # Queries run on the runner's worker threads; rendering happens on the Tk thread
+        self.runner = runner or SyncRunner()
         self.current_position_filter = None
         self.current_month_year = None
 
+    def _show_error(self, e):
+        self.view.show_message("Lỗi", str(e), "error")
+
     def load_positions(self):
-        try:
-            positions = self.model.get_positions()
-        except RuntimeError as e:
-            self.view.show_message("Lỗi", str(e), "error")
-            positions = []
-        if not positions:
-            self.view.show_message("Thông báo", "Không lấy được danh sách chức vụ.", "warning")
-        self.view.set_positions(positions)
+        def done(positions):
+            if not positions:
+                self.view.show_message("Thông báo", "Không lấy được danh sách chức vụ.", "warning")
+            self.view.set_positions(positions)
+
+        def failed(e):
+            self._show_error(e)
+            done([])
+
+        self.runner.submit(self.model.get_positions, on_done=done, on_error=failed)
 
     def load_seniority(self, position=None):
         self.current_position_filter = position
-        try:
-            rows = self.model.get_seniority(position)
-        except RuntimeError as e:
-            self.view.show_message("Lỗi", str(e), "error")
-            rows = []
-        if not rows:
-            self.view.show_message("Thông báo", "Không có dữ liệu thâm niên.", "warning")
-        self.view.render_seniority(rows)
+
+        def done(rows):
+            if not rows:
+                self.view.show_message("Thông báo", "Không có dữ liệu thâm niên.", "warning")
+            self.view.render_seniority(rows)
+
+        def failed(e):
+            self._show_error(e)
+            done([])
+
+        self.runner.submit(self.model.get_seniority, position, on_done=done, on_error=failed)
+
+    def _fetch_revenue(self, month, year):
+        """Runs on a worker thread: rows, total and detail count when the rows are empty"""
+        rows = self.model.get_revenue_by_month(month, year, include_archive=True)
+        count = self.model.revenue_exists(month, year, include_archive=True) if not rows else 0
+        return rows, self.model.sum_revenue(rows), count
 
     def load_revenue(self, month_year):
         self.current_month_year = month_year
         try:
             month, year = month_year.split("/")
-            rows = self.model.get_revenue_by_month(month, year)
+        except ValueError:
+            self.view.show_message("Lỗi", "Định dạng tháng/năm không hợp lệ (MM/yyyy).", "error")
+            self.view.render_revenue([], 0)
+            return
+
+        def done(result):
+            rows, total, count = result
             if not rows:
-                count = self.model.revenue_exists(month, year)
                 if count > 0:
                     self.view.show_message("Lỗi", "Có dữ liệu chi tiết nhưng nhóm doanh thu trả về rỗng (kiểm tra tên cột hoặc truy vấn).", "error")
                 else:
                     self.view.show_message("Thông báo", "Không có dữ liệu doanh thu tháng đã chọn.", "warning")
-            total = self.model.sum_revenue(rows)
             self.view.render_revenue(rows, total)
-        except RuntimeError as e:
-            self.view.show_message("Lỗi", str(e), "error")
-            self.view.render_revenue([], 0)
-        except ValueError:
-            self.view.show_message("Lỗi", "Định dạng tháng/năm không hợp lệ (MM/yyyy).", "error")
+
+        def failed(e):
+            if isinstance(e, ValueError):
+                self.view.show_message("Lỗi", "Định dạng tháng/năm không hợp lệ (MM/yyyy).", "error")
+            else:
+                self._show_error(e)
             self.view.render_revenue([], 0)
 
-    def export_seniority(self, rows):
-        self._export_generic(
-            rows,
+        self.runner.submit(self._fetch_revenue, month, year, on_done=done, on_error=failed)
+
+    # Mapping khóa -> tiêu đề hiển thị tiếng Việt (có dấu, khoảng trắng)
+    SENIORITY_HEADER_MAP = {
+        "ma_nv": "Mã nhân viên",
+        "ho_va_ten": "Họ và tên",
+        "chuc_vu": "Chức vụ",
+        "ngay_vao_lam": "Ngày vào làm",
+        "tham_nien": "Thâm niên",
+        "nhom_tham_nien": "Nhóm thâm niên"
+    }
+    REVENUE_HEADER_MAP = {
+        "ma_thuoc": "Mã thuốc",
+        "ten_thuoc": "Tên thuốc",
+        "so_luong_ban": "Số lượng bán",
+        "don_gia": "Đơn giá",
+        "tong_doanh_thu": "Tổng doanh thu"
+    }
+    MASTHEAD_LINES = [
+        "Nhà thuốc The Blue",
+        "Mã số thuế: 012345",
+        "Địa chỉ: Số 10, Trần Phú, Hà Đông, Hà Nội",
+        "Điện thoại: 0987654321",
+        "Tài khoản Ngân hàng: 0382117403 - MBBank"
+    ]
+    TITLE_MAP = {
+        "seniority": "BÁO CÁO THÂM NIÊN NHÂN VIÊN",
+        "revenue": "BÁO CÁO DOANH THU THEO THÁNG"
+    }
+    NUMBERING = "Mẫu số: TTTTT0101    Số: 0000"
+
+    def export_seniority(self):
+        position = self.current_position_filter
+        self._export(
+            lambda: self.model.iter_seniority(position),
             base_name="bao_cao_tham_nien",
-            report_type="seniority"
+            report_type="seniority",
+            filter_info=f"Chức vụ lọc: {position if position else '(Tất cả)'}"
         )
 
-    def export_revenue(self, rows):
-        self._export_generic(
-            rows,
+    def export_revenue(self):
+        month_year = self.current_month_year
+        try:
+            month, year = month_year.split("/")
+        except (AttributeError, ValueError):
+            self.view.show_message("Thông báo", "Không có dữ liệu để xuất.", "info")
+            return
+        self._export(
+            lambda: self.model.iter_revenue(month, year, include_archive=True),
             base_name="bao_cao_doanh_thu",
-            report_type="revenue"
+            report_type="revenue",
+            filter_info=f"Tháng/Năm: {month_year}"
         )
 
-    def _export_generic(self, rows, base_name, report_type):
-        if not rows:
-            self.view.show_message("Thông báo", "Không có dữ liệu để xuất.", "info")
-            return
+    def _export(self, open_batches, base_name, report_type, filter_info):
+        """Stream the report to a file on a worker thread, showing the row count as it goes"""
+        def progress(count):
+            self.runner.report(self.view.show_export_progress, count)
+
+        def work():
+            batches = open_batches()
+            try:
+                return self._export_generic(batches, base_name, report_type, filter_info, progress)
+            finally:
+                # Hands the connection back even when writing the file failed midway
+                batches.close()
+
+        def done(result):
+            self.view.show_export_progress(None)
+            if result is None:
+                self.view.show_message("Thông báo", "Không có dữ liệu để xuất.", "info")
+            elif result.endswith(".csv"):
+                self.view.show_message("Xuất file", f"Đã xuất (CSV): {result}", "info")
+            else:
+                self.view.show_message("Xuất file", f"Đã xuất: {result}", "info")
+
+        def failed(e):
+            self.view.show_export_progress(None)
+            self._show_error(e)
+
+        self.runner.submit(work, on_done=done, on_error=failed)
+
+    def _export_generic(self, batches, base_name, report_type, filter_info, progress=None):
+        """Write batches of rows straight to disk; returns the file name, or None if there were no rows"""
+        first = next(batches, [])
+        if not first:
+            return None
 
-        # Mapping khóa -> tiêu đề hiển thị tiếng Việt (có dấu, khoảng trắng)
-        SENIORITY_HEADER_MAP = {
-            "ma_nv": "Mã nhân viên",
-            "ho_va_ten": "Họ và tên",
-            "chuc_vu": "Chức vụ",
-            "ngay_vao_lam": "Ngày vào làm",
-            "tham_nien": "Thâm niên",
-            "nhom_tham_nien": "Nhóm thâm niên"
-        }
-        REVENUE_HEADER_MAP = {
-            "ma_thuoc": "Mã thuốc",
-            "ten_thuoc": "Tên thuốc",
-            "so_luong_ban": "Số lượng bán",
-            "don_gia": "Đơn giá",
-            "tong_doanh_thu": "Tổng doanh thu"
-        }
-
-        header_map = SENIORITY_HEADER_MAP if report_type == "seniority" else REVENUE_HEADER_MAP
+        header_map = self.SENIORITY_HEADER_MAP if report_type == "seniority" else self.REVENUE_HEADER_MAP
         # Thứ tự cột theo mapping, chỉ giữ các khóa thực sự có trong dữ liệu
-        data_keys = [k for k in header_map.keys() if k in rows[0].keys()]
+        data_keys = [k for k in header_map.keys() if k in first[0].keys()]
         display_headers = [header_map[k] for k in data_keys]
 
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename_xlsx = f"{base_name}_{timestamp}.xlsx"
-        filename_csv = f"{base_name}_{timestamp}.csv"
+        try:
+            # Imported on first export (on the worker thread): openpyxl takes ~0.1 s to load
+            import openpyxl
+            from openpyxl.cell import WriteOnlyCell
+            from openpyxl.styles import Font, Alignment
+            from openpyxl.utils import get_column_letter
+            from openpyxl.worksheet.cell_range import CellRange
+        except ImportError:
+            openpyxl = None
 
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
         if not openpyxl:
-            with open(filename_csv, "w", newline="", encoding="utf-8") as f:
+            filename = f"{base_name}_{timestamp}.csv"
+            with open(filename, "w", newline="", encoding="utf-8") as f:
                 writer = csv.writer(f)
                 writer.writerow([" - BÁO CÁO", base_name, timestamp])
                 writer.writerow(display_headers)
-                for r in rows:
-                    writer.writerow([r.get(k, "") for k in data_keys])
-            self.view.show_message("Xuất file", f"Đã xuất (CSV): {filename_csv}", "info")
-            return
+                count = 0
+                for batch in itertools.chain([first], batches):
+                    writer.writerows([r.get(k, "") for k in data_keys] for r in batch)
+                    count += len(batch)
+                    if progress:
+                        progress(count)
+            return filename
+
+        filename = f"{base_name}_{timestamp}.xlsx"
+        # Write-only: rows go to a temp file as they are appended instead of living in memory
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet()
 
-        wb = openpyxl.Workbook()
-        ws = wb.active
-
-        masthead_lines = [
-            "Nhà thuốc The Blue",
-            "Mã số thuế: 012345",
-            "Địa chỉ: Số 10, Trần Phú, Hà Đông, Hà Nội",
-            "Điện thoại: 0987654321",
-            "Tài khoản Ngân hàng: 0382117403 - MBBank"
-        ]
-        title_map = {
-            "seniority": "BÁO CÁO THÂM NIÊN NHÂN VIÊN",
-            "revenue": "BÁO CÁO DOANH THU THEO THÁNG"
-        }
-        title = title_map.get(report_type, "BÁO CÁO")
-        numbering = "Mẫu số: TTTTT0101    Số: 0000"
+        def styled(value, **style):
+            cell = WriteOnlyCell(ws, value=value)
+            for name, val in style.items():
+                setattr(cell, name, val)
+            return cell
+
+        # Write-only sheets emit widths before the rows, so size columns from the headers
+        # and the first batch (the widest values of a revenue report come first)
+        for c, k in enumerate(data_keys, start=1):
+            max_len = max([len(display_headers[c-1])] + [len(str(row.get(k, ""))) for row in first])
+            if report_type == "revenue" and k == "tong_doanh_thu":
+                # Chừa chỗ cho dòng tổng cộng
+                max_len += 4
+            ws.column_dimensions[get_column_letter(c)].width = max_len + 2
 
         col_count = len(display_headers)
-        r = 1
-        ws.merge_cells(start_row=r, start_column=1, end_row=r, end_column=col_count//2 or 1)
-        ws.merge_cells(start_row=r, start_column=(col_count//2 or 1) + 1, end_row=r, end_column=col_count)
-        ws.cell(row=r, column=1).value = masthead_lines[0]
-        ws.cell(row=r, column=1).font = Font(bold=True)
-        ws.cell(row=r, column=(col_count//2 or 1) + 1).value = title
-        ws.cell(row=r, column=(col_count//2 or 1) + 1).font = Font(bold=True, size=14)
-        ws.cell(row=r, column=(col_count//2 or 1) + 1).alignment = Alignment(horizontal="center")
-        r += 1
-
-        for line in masthead_lines[1:]:
-            ws.merge_cells(start_row=r, start_column=1, end_row=r, end_column=col_count//2 or 1)
-            ws.cell(row=r, column=1).value = line
-            r += 1
-
-        ws.merge_cells(start_row=r, start_column=1, end_row=r, end_column=col_count)
-        ws.cell(row=r, column=1).value = numbering
-        ws.cell(row=r, column=1).alignment = Alignment(horizontal="right")
-        r += 1
-
-        filter_info = ""
-        if report_type == "seniority":
-            filter_info = f"Chức vụ lọc: {self.current_position_filter if self.current_position_filter else '(Tất cả)'}"
-        elif report_type == "revenue":
-            filter_info = f"Tháng/Năm: {self.current_month_year}"
-        ws.merge_cells(start_row=r, start_column=1, end_row=r, end_column=col_count)
-        ws.cell(row=r, column=1).value = filter_info
-        r += 1
-
-        ws.merge_cells(start_row=r, start_column=1, end_row=r, end_column=col_count)
-        ws.cell(row=r, column=1).value = f"Thời gian xuất: {datetime.datetime.now().strftime('%d/%m/%Y %H:%M:%S')}"
-        r += 2
-
-        for c, h in enumerate(display_headers, start=1):
-            cell = ws.cell(row=r, column=c, value=h)
-            cell.font = Font(bold=True)
-            cell.alignment = Alignment(horizontal="center")
-        r += 1
-
-        for row in rows:
-            for c, k in enumerate(data_keys, start=1):
-                ws.cell(row=r, column=c, value=row.get(k, ""))
-            r += 1
+        half = col_count // 2 or 1
+        # Merged ranges must be registered before the first row is written
+        merges = [(1, 1, half), (1, half + 1, col_count)]
+        merges += [(r, 1, half) for r in range(2, len(self.MASTHEAD_LINES) + 1)]
+        r = len(self.MASTHEAD_LINES) + 1
+        merges += [(r, 1, col_count), (r + 1, 1, col_count), (r + 2, 1, col_count)]
+        for row_no, first_col, last_col in merges:
+            ws.merged_cells.add(CellRange(min_row=row_no, min_col=first_col, max_row=row_no, max_col=last_col))
+
+        title = self.TITLE_MAP.get(report_type, "BÁO CÁO")
+        head = [None] * col_count
+        head[0] = styled(self.MASTHEAD_LINES[0], font=Font(bold=True))
+        head[half] = styled(title, font=Font(bold=True, size=14), alignment=Alignment(horizontal="center"))
+        ws.append(head)
+        for line in self.MASTHEAD_LINES[1:]:
+            ws.append([line])
+        ws.append([styled(self.NUMBERING, alignment=Alignment(horizontal="right"))])
+        ws.append([filter_info])
+        ws.append([f"Thời gian xuất: {datetime.datetime.now().strftime('%d/%m/%Y %H:%M:%S')}"])
+        ws.append([])
+        ws.append([styled(h, font=Font(bold=True), alignment=Alignment(horizontal="center"))
+                   for h in display_headers])
+
+        total_sum = 0
+        count = 0
+        for batch in itertools.chain([first], batches):
+            for row in batch:
+                ws.append([row.get(k, "") for k in data_keys])
+                total_sum += row.get("tong_doanh_thu", 0)
+            count += len(batch)
+            if progress:
+                progress(count)
+
         # Thêm dòng tổng cho báo cáo doanh thu
         if report_type == "revenue":
             try:
-                idx_total = data_keys.index("tong_doanh_thu") + 1
-                idx_label = data_keys.index("don_gia") + 1
+                idx_total = data_keys.index("tong_doanh_thu")
+                idx_label = data_keys.index("don_gia")
             except ValueError:
-                idx_total = len(data_keys)
-                idx_label = max(1, idx_total - 1)
-            total_sum = sum(row.get("tong_doanh_thu", 0) for row in rows)
-            ws.cell(row=r, column=idx_label, value="Tổng cộng").font = Font(bold=True)
-            ws.cell(row=r, column=idx_total, value=total_sum).font = Font(bold=True)
-            ws.cell(row=r, column=idx_label).alignment = Alignment(horizontal="center")
-            ws.cell(row=r, column=idx_total).alignment = Alignment(horizontal="center")
-            r += 1
-
-        for c, h in enumerate(display_headers, start=1):
-            max_len = len(h)
-            for row in rows:
-                val = str(row.get(data_keys[c-1], ""))
-                if len(val) > max_len:
-                    max_len = len(val)
-            # Nếu là dòng tổng cộng, cập nhật độ dài nếu cần
-            if report_type == "revenue" and h == "Tổng doanh thu":
-                tlen = len(str(total_sum))
-                if tlen > max_len:
-                    max_len = tlen
-            ws.column_dimensions[openpyxl.utils.get_column_letter(c)].width = max_len + 2
-
-        wb.save(filename_xlsx)
-        self.view.show_message("Xuất file", f"Đã xuất: {filename_xlsx}", "info")
+                idx_total = len(data_keys) - 1
+                idx_label = max(0, idx_total - 1)
+            total_row = [None] * col_count
+            total_row[idx_label] = styled("Tổng cộng", font=Font(bold=True), alignment=Alignment(horizontal="center"))
+            total_row[idx_total] = styled(total_sum, font=Font(bold=True), alignment=Alignment(horizontal="center"))
+            ws.append(total_row)
+
+        wb.save(filename)
+        return filename
 
     def close(self):
         pass
@@ -1,100 +1,129 @@
 from model.database import Database
 from model.staff import Staff
+from controller.task_runner import SyncRunner
 
 
 class StaffController:
     """Controller layer to connect View and Model"""
-    
-    def __init__(self, view):
+
+    def __init__(self, view, runner=None):
         self.view = view
+        # Model calls run on the runner's worker threads; results come back on the Tk thread
+        self.runner = runner or SyncRunner()
         self.db = Database()
         self.staff_model = Staff(self.db)
-        
-        # Connect to database
-        if not self.db.connect():
-            self.view.show_message("Lỗi kết nối", 
+
+        # Connect to database off the Tk thread; loads submitted meanwhile attach to the pool themselves
+        self.runner.submit(self.db.connect, on_done=self._on_connected, on_error=lambda e: self._on_connected(False))
+
+    def _on_connected(self, connected):
+        if not connected:
+            self.view.show_message("Lỗi kết nối",
                                   "Không thể kết nối đến cơ sở dữ liệu. Vui lòng kiểm tra cấu hình.",
                                   "error")
-    
+        else:
+            # First run builds the search index from existing rows
+            self.runner.submit(self.staff_model.search_index.ensure_table)
+
     def create_staff(self, data):
         """Create a new staff"""
-        try:
-            success, message = self.staff_model.create_staff(
-                data['ma_nv'],
-                data['ho_va_ten'],
-                data['sdt'],
-                data['chuc_vu'],
-                data['ngay_vao_lam'],
-                data['ma_quan_ly']
-            )
-            
+        def done(result):
+            success, message = result
             if success:
                 self.view.show_message("Thành công", "Tạo nhân viên thành công!", "info")
                 self.view.clear_form()
                 self.view.loadData()
             else:
                 self.view.show_message("Lỗi", message, "error")
-        except Exception as e:
-            self.view.show_message("Lỗi", f"Không thể tạo nhân viên: {str(e)}", "error")
-    
+
+        self.runner.submit(
+            self.staff_model.create_staff,
+            data['ma_nv'],
+            data['ho_va_ten'],
+            data['sdt'],
+            data['chuc_vu'],
+            data['ngay_vao_lam'],
+            data['ma_quan_ly'],
+            on_done=done,
+            on_error=lambda e: self.view.show_message("Lỗi", f"Không thể tạo nhân viên: {str(e)}", "error")
+        )
+
     def get_all_positions(self):
         """Get all available positions from BAC_LUONG"""
         return self.staff_model.get_all_positions()
-    
+
+    def load_positions(self):
+        """Load positions in the background and fill the view's combobox"""
+        self.runner.submit(self.get_all_positions, on_done=self.view.set_positions,
+                           on_error=lambda e: self.view.set_positions([]))
+
     def update_staff(self, ma_nv, data):
         """Update a staff"""
-        try:
-            result = self.staff_model.update_staff(
-                ma_nv,
-                data['ho_va_ten'],
-                data['sdt'],
-                data['chuc_vu'],
-                data['ngay_vao_lam'],
-                data['ma_quan_ly']
-            )
-            
+        def done(result):
             if result:
                 self.view.show_message("Thành công", "Cập nhật nhân viên thành công!", "info")
                 self.view.clear_form()
                 self.view.loadData()
             else:
                 self.view.show_message("Lỗi", "Không thể cập nhật nhân viên", "error")
-        except Exception as e:
-            self.view.show_message("Lỗi", f"Không thể cập nhật nhân viên: {str(e)}", "error")
-    
+
+        self.runner.submit(
+            self.staff_model.update_staff,
+            ma_nv,
+            data['ho_va_ten'],
+            data['sdt'],
+            data['chuc_vu'],
+            data['ngay_vao_lam'],
+            data['ma_quan_ly'],
+            on_done=done,
+            on_error=lambda e: self.view.show_message("Lỗi", f"Không thể cập nhật nhân viên: {str(e)}", "error")
+        )
+
     def delete_staff(self, ma_nv):
         """Delete a staff"""
-        try:
-            result = self.staff_model.delete_staff(ma_nv)
-            
+        def done(result):
             if result:
                 self.view.show_message("Thành công", "Xóa nhân viên thành công!", "info")
                 self.view.clear_form()
                 self.view.loadData()
             else:
                 self.view.show_message("Lỗi", "Không thể xóa nhân viên. Vui lòng kiểm tra.", "error")
-        except Exception as e:
-            self.view.show_message("Lỗi", f"Không thể xóa nhân viên: {str(e)}", "error")
-    
+
+        self.runner.submit(
+            self.staff_model.delete_staff, ma_nv,
+            on_done=done,
+            on_error=lambda e: self.view.show_message("Lỗi", f"Không thể xóa nhân viên: {str(e)}", "error")
+        )
+
     def load_all_staff(self):
         """Load all staff"""
-        try:
-            staff_list = self.staff_model.get_all_staff()
-            self.view.display_staff(staff_list)
-        except Exception as e:
-            self.view.show_message("Lỗi", f"Không thể tải danh sách nhân viên: {str(e)}", "error")
-    
+        self.runner.submit(
+            self.staff_model.get_all_staff,
+            on_done=self.view.display_staff,
+            on_error=lambda e: self.view.show_message("Lỗi", f"Không thể tải danh sách nhân viên: {str(e)}", "error")
+        )
+
     def search_staff(self, search_term):
         """Search staff"""
+        if not search_term:
+            self.load_all_staff()
+            return
+        self.runner.submit(
+            self.staff_model.search_staff, search_term,
+            on_done=self.view.display_staff,
+            on_error=lambda e: self.view.show_message("Lỗi", f"Không thể tìm kiếm nhân viên: {str(e)}", "error")
+        )
+
+    def find_staff(self, search_term):
+        """Search staff without touching the view (safe off the Tk thread)"""
         try:
             if search_term:
-                staff_list = self.staff_model.search_staff(search_term)
-                self.view.display_staff(staff_list)
-            else:
-                self.load_all_staff()
+                return self.staff_model.search_staff(search_term)
+            return self.staff_model.get_all_staff()
         except Exception as e:
-            self.view.show_message("Lỗi", f"Không thể tìm kiếm nhân viên: {str(e)}", "error")
-    
+            print(f"Error searching staff: {str(e)}")
+            return []
+
     def get_all_positions(self):
         """Get all positions from BAC_LUONG table"""
         try:
@@ -103,7 +132,7 @@ class StaffController:
         except Exception as e:
             print(f"Error getting positions: {str(e)}")
             return []
-    
+
     def close(self):
         """Close database connection"""
         self.db.disconnect()
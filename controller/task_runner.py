@@ -0,0 +1,138 @@
+import queue
+import threading
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+
+class TaskRunner:
+    """Runs model calls on a thread pool and hands results back on the Tk thread.
+
+    `scheduler` is anything with after()/after_cancel() (the Tk root, or a fake in
+    headless tests). Callbacks always run on the scheduler's thread. cancel_all()
+    cancels queued tasks and drops the results of running ones.
+    """
+    POLL_MS = 20
+
+    def __init__(self, scheduler, max_workers=4, on_busy=None):
+        self.scheduler = scheduler
+        self.on_busy = on_busy
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db-task")
+        self._done = queue.Queue()
+        self._reports = queue.Queue()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._futures = set()
+        self._poll_id = None
+
+    def submit(self, fn, *args, on_done=None, on_error=None, **kwargs):
+        """Run fn(*args, **kwargs) in the background; returns its Future"""
+        with self._lock:
+            generation = self._generation
+            future = self._executor.submit(fn, *args, **kwargs)
+            self._futures.add(future)
+            busy_started = len(self._futures) == 1
+        future.add_done_callback(lambda f: self._done.put((generation, f, on_done, on_error)))
+        if busy_started and self.on_busy:
+            self.on_busy(True)
+        if self._poll_id is None:
+            self._poll_id = self.scheduler.after(self.POLL_MS, self._poll)
+        return future
+
+    def report(self, fn, *args):
+        """Call fn(*args) on the scheduler's thread; tasks use it for progress updates"""
+        with self._lock:
+            generation = self._generation
+        self._reports.put((generation, fn, args))
+
+    def cancel_all(self):
+        """Cancel queued tasks and ignore results of the ones already running"""
+        with self._lock:
+            self._generation += 1
+            futures = list(self._futures)
+        for future in futures:
+            future.cancel()
+
+    @property
+    def busy(self):
+        with self._lock:
+            return bool(self._futures)
+
+    def shutdown(self):
+        self.cancel_all()
+        if self._poll_id is not None:
+            self.scheduler.after_cancel(self._poll_id)
+            self._poll_id = None
+        self._executor.shutdown(wait=False)
+
+    def _poll(self):
+        self._poll_id = None
+        finished = []
+        while True:
+            try:
+                finished.append(self._done.get_nowait())
+            except queue.Empty:
+                break
+        # Taken after the results: every report of a finished task is already queued
+        while True:
+            try:
+                generation, fn, args = self._reports.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                current = generation == self._generation
+            if current:
+                fn(*args)
+        for generation, future, on_done, on_error in finished:
+            with self._lock:
+                self._futures.discard(future)
+                idle = not self._futures
+                current = generation == self._generation
+            if current:
+                self._deliver(future, on_done, on_error)
+            if idle and self.on_busy:
+                self.on_busy(False)
+        with self._lock:
+            pending = bool(self._futures)
+        # A callback that submitted more work has already scheduled the next poll
+        if pending and self._poll_id is None:
+            self._poll_id = self.scheduler.after(self.POLL_MS, self._poll)
+
+    @staticmethod
+    def _deliver(future, on_done, on_error):
+        try:
+            result = future.result()
+        except CancelledError:
+            return
+        except Exception as e:
+            if on_error:
+                on_error(e)
+            else:
+                print(f"Error in background task: {e}")
+            return
+        if on_done:
+            on_done(result)
+
+
+class SyncRunner:
+    """Same interface as TaskRunner but runs inline (scripts, benchmarks, no Tk)"""
+    busy = False
+
+    def submit(self, fn, *args, on_done=None, on_error=None, **kwargs):
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if on_error:
+                on_error(e)
+                return None
+            raise
+        if on_done:
+            on_done(result)
+        return result
+
+    def report(self, fn, *args):
+        fn(*args)
+
+    def cancel_all(self):
+        pass
+
+    def shutdown(self):
+        pass
@@ -1,40 +1,100 @@
 import tkinter as tk
 from tkinter import ttk
-from view.staff_view import StaffView
-from controller.staff_controller import StaffController
-from view.invoice_view import InvoiceView
-from controller.invoice_controller import InvoiceController
-from view.report_view import ReportView
-from controller.report_controller import ReportController
-from config.db_config import load_db_config
+from view.tab_manager import TabManager
+from controller.task_runner import TaskRunner
+from config.db_config import load_db_config, load_backend_config
+
+# Views, controllers and the database drivers are imported when a tab is first built,
+# after the window is on screen: mysql.connector, openpyxl and dotenv are slow to load
 
 
 class MainApplication:
     """Main application with menu to switch between forms"""
+    SYNC_POLL_MS = 2000
     
     def __init__(self, root):
         self.root = root
         self.root.title("Hệ thống Quản lý - Management System")
         # Set window to full screen
-        self.root.state('zoomed')  # For Windows
-        # Alternative: self.root.attributes('-fullscreen', True)
+        try:
+            self.root.state('zoomed')  # For Windows
+        except tk.TclError:
+            # X11 has no 'zoomed' state
+            self.root.attributes('-zoomed', True)
         
         # Font scale for zoom functionality
         self.font_scale = 1.0
         
-        # Current active view and controller
-        self.current_view = None
-        self.current_controller = None
+        # Database calls run in the background; results come back through root.after()
+        self.runner = TaskRunner(self.root, on_busy=self.set_busy)
         
         # Setup menu
         self.setup_menu()
         
+        # Status bar shown while background queries are running
+        status_frame = ttk.Frame(self.root)
+        status_frame.pack(side=tk.BOTTOM, fill=tk.X)
+        self.status_var = tk.StringVar(value="")
+        self.status_bar = ttk.Label(status_frame, textvariable=self.status_var, anchor=tk.W, padding=(8, 2))
+        self.status_bar.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        
+        # Invoices kept in the offline journal until the database is back
+        self.sync_var = tk.StringVar(value="")
+        ttk.Label(status_frame, textvariable=self.sync_var, anchor=tk.E, padding=(8, 2)).pack(side=tk.RIGHT)
+        self.replayer = None
+        self.replayed = 0
+        
         # Main container for views
         self.main_container = ttk.Frame(self.root)
         self.main_container.pack(fill=tk.BOTH, expand=True)
         
-        # Show staff view by default
-        self.show_staff_view()
+        # Each view is built on first use and kept alive while other tabs are shown
+        self.tabs = TabManager(self.main_container)
+        self.tabs.register("staff", self.build_staff_view, tables=("NHAN_VIEN",))
+        self.tabs.register("invoice", self.build_invoice_view, tables=("HOA_DON", "THUOC"))
+        self.tabs.register("report", self.build_report_view, tables=("NHAN_VIEN", "HOA_DON", "THUOC"))
+        
+        # Build the first tab only once the empty window has been drawn
+        self.root.bind('<Map>', self.on_first_map, add='+')
+    
+    def on_first_map(self, event):
+        """Start loading once the main window is mapped"""
+        if event.widget is not self.root:
+            return
+        self.root.unbind('<Map>')
+        # Idle callbacks run in order: the widgets' redraws were queued when they were mapped
+        self.root.after_idle(self.start)
+    
+    def start(self):
+        """Show the staff view by default and start the background work"""
+        if self.tabs.current is None:
+            self.show_staff_view()
+        self.provision_indexes()
+        self.start_replayer()
+    
+    def start_replayer(self):
+        """Flush invoices sold while the database was unreachable, and show the backlog"""
+        from model.database import Database
+        from model.invoice import Invoice
+        from model.invoice_journal import InvoiceReplayer
+        
+        self.replayer = InvoiceReplayer(Invoice(Database())).start()
+        self.update_sync_status()
+    
+    def update_sync_status(self):
+        """Status bar text for the offline journal; polled because the replayer runs on its own thread"""
+        status = self.replayer.status()
+        parts = []
+        if status['waiting']:
+            state = "đang đồng bộ" if status['online'] else "mất kết nối"
+            parts.append(f"{status['waiting']} hóa đơn chờ đồng bộ ({state})")
+        if status['failed']:
+            parts.append(f"{status['failed']} hóa đơn đồng bộ lỗi")
+        self.sync_var.set(", ".join(parts))
+        if self.replayer.written != self.replayed:
+            self.replayed = self.replayer.written
+            self.tabs.refresh_if_stale()
+        self.root.after(self.SYNC_POLL_MS, self.update_sync_status)
     
     def setup_menu(self):
         """Setup the menu bar"""
@@ -64,91 +124,99 @@ class MainApplication:
         self.root.bind('<Control-minus>', lambda e: self.zoom_out())
         self.root.bind('<Control-0>', lambda e: self.zoom_reset())
     
-    def clear_main_container(self):
-        """Clear all widgets from main container"""
-        for widget in self.main_container.winfo_children():
-            widget.destroy()
+    def set_busy(self, busy):
+        """Busy indicator for background database work"""
+        self.status_var.set("Đang tải dữ liệu..." if busy else "")
+        self.root.config(cursor="watch" if busy else "")
     
-    def show_staff_view(self):
-        """Show staff management view"""
-        # Close current controller if exists
-        if self.current_controller:
-            self.current_controller.close()
-        
-        # Clear container
-        self.clear_main_container()
-        
-        # Create new frame for staff view
-        staff_frame = ttk.Frame(self.main_container)
-        staff_frame.pack(fill=tk.BOTH, expand=True)
+    @property
+    def current_view(self):
+        return self.tabs.current.view if self.tabs.current else None
+    
+    @property
+    def current_controller(self):
+        return self.tabs.current.controller if self.tabs.current else None
+    
+    def build_staff_view(self, frame):
+        """Create the staff view and controller and start loading"""
+        from view.staff_view import StaffView
+        from controller.staff_controller import StaffController
         
-        # Create view and controller
-        view = StaffView(staff_frame, None, font_scale=self.font_scale)
-        controller = StaffController(view)
+        view = StaffView(frame, None, font_scale=self.font_scale)
+        controller = StaffController(view, runner=self.runner)
         view.controller = controller
         
-        # Update positions combobox now that controller is set
-        view.update_positions()
-        
-        # Store references
-        self.current_view = view
-        self.current_controller = controller
+        # Load positions combobox now that controller is set
+        controller.load_positions()
         
         # Load data
         view.loadData()
-        
-        # Update window title
-        self.root.title("Hệ thống Quản lý - Nhân viên")
+        return view, controller
     
-    def show_invoice_view(self):
-        """Show invoice management view"""
-        # Close current controller if exists
-        if self.current_controller:
-            self.current_controller.close()
-        
-        # Clear container
-        self.clear_main_container()
-        
-        # Create new frame for invoice view
-        invoice_frame = ttk.Frame(self.main_container)
-        invoice_frame.pack(fill=tk.BOTH, expand=True)
+    def build_invoice_view(self, frame):
+        """Create the invoice view and controller and start loading"""
+        from view.invoice_view import InvoiceView
+        from controller.invoice_controller import InvoiceController
         
-        # Create view and controller
-        view = InvoiceView(invoice_frame, None, font_scale=self.font_scale)
-        controller = InvoiceController(view)
+        view = InvoiceView(frame, None, font_scale=self.font_scale)
+        controller = InvoiceController(view, runner=self.runner)
         view.controller = controller
         
         # Populate combobox after controller is set
         view.populate_medicine_combobox()
         
-        # Store references
-        self.current_view = view
-        self.current_controller = controller
-        
         # Load data
         view.loadData()
-        
-        # Update window title
-        self.root.title("Hệ thống Quản lý - Hóa đơn")
+        return view, controller
     
-    def show_report_view(self):
-        """Show report management view"""
-        if self.current_controller:
-            self.current_controller.close()
-        self.clear_main_container()
-        report_frame = ttk.Frame(self.main_container)
-        report_frame.pack(fill=tk.BOTH, expand=True)
-        view = ReportView(report_frame, None, font_scale=self.font_scale)
+    def build_report_view(self, frame):
+        """Create the report view and controller and start loading"""
+        from view.report_view import ReportView
+        from controller.report_controller import ReportController
+        
+        view = ReportView(frame, None, font_scale=self.font_scale)
         mysql_config = load_db_config()
-        controller = ReportController(view, backend="mysql", mysql_config=mysql_config)
+        backend_config = load_backend_config()
+        controller = ReportController(view, backend=backend_config["backend"], mysql_config=mysql_config,
+                                      db_path=backend_config["sqlite_path"], runner=self.runner)
         view.controller = controller
-        self.current_view = view
-        self.current_controller = controller
         controller.load_positions()
         controller.load_seniority()
         controller.load_revenue(view.revenue_frame.month_year_cb.get())
+        return view, controller
+    
+    def show_staff_view(self):
+        """Show staff management view"""
+        self.tabs.show("staff")
+        self.root.title("Hệ thống Quản lý - Nhân viên")
+    
+    def show_invoice_view(self):
+        """Show invoice management view"""
+        self.tabs.show("invoice")
+        self.root.title("Hệ thống Quản lý - Hóa đơn")
+    
+    def show_report_view(self):
+        """Show report management view"""
+        self.tabs.show("report")
         self.root.title("Hệ thống Quản lý - Báo cáo")
     
+    def create_report_model(self):
+        """Report model for the configured backend"""
+        from model.report import ReportModel
+        
+        backend_config = load_backend_config()
+        return ReportModel(db_path=backend_config["sqlite_path"], backend=backend_config["backend"],
+                           mysql_config=load_db_config())
+    
+    def provision_indexes(self):
+        """Create missing indexes used by date-range reports"""
+        def done(created):
+            if created:
+                print(f"Created indexes: {', '.join(created)}")
+        
+        self.runner.submit(lambda: self.create_report_model().ensure_indexes(), on_done=done,
+                           on_error=lambda e: print(f"Error provisioning indexes: {e}"))
+    
     def zoom_in(self):
         """Increase font size"""
         if self.font_scale < 2.0:  # Max 200%
@@ -167,19 +235,12 @@ class MainApplication:
         self.update_font_scale()
     
     def update_font_scale(self):
-        """Update font scale and reload current view"""
+        """Update font scale of every view in place, without reloading data"""
         # Update menu label
-        percent = int(self.font_scale * 100)
-        
-        # Reload current view to apply new font size
-        if hasattr(self.current_view, '__class__'):
-            view_class = self.current_view.__class__.__name__
-            if 'StaffView' in view_class:
-                self.show_staff_view()
-            elif 'InvoiceView' in view_class:
-                self.show_invoice_view()
-            elif 'ReportView' in view_class:
-                self.show_report_view()
+        percent = int(round(self.font_scale * 100))
+        self.font_scale_label.entryconfig('end', label=f"Cỡ chữ hiện tại: {percent}%")
+        
+        self.tabs.set_font_scale(self.font_scale)
     
     def get_scaled_font_size(self, base_size):
         """Get scaled font size based on current scale"""
@@ -187,8 +248,12 @@ class MainApplication:
     
     def quit_application(self):
         """Quit the application"""
-        if self.current_controller:
-            self.current_controller.close()
+        if self.replayer is not None:
+            self.replayer.stop()
+        self.tabs.close_all()
+        self.runner.shutdown()
+        from model.connection_pool import close_all_pools
+        close_all_pools()
         self.root.destroy()
 
 
@@ -0,0 +1,456 @@
+import functools
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+
+from config.db_config import load_pool_config
+
+try:
+    import mysql.connector
+    from mysql.connector import errors as mysql_errors
+except ImportError:
+    mysql = None
+    mysql_errors = None
+
+# Errors raised by either backend; models catch this tuple instead of mysql's Error only
+DB_ERRORS = (sqlite3.Error,) + ((mysql_errors.Error,) if mysql_errors else ())
+
+# CR_SERVER_GONE_ERROR, CR_SERVER_LOST, CR_SERVER_LOST_EXTENDED
+_DISCONNECT_ERRNOS = {2006, 2013, 2055}
+# CR_CONNECTION_ERROR, CR_UNKNOWN_HOST, CR_CONN_HOST_ERROR
+_UNREACHABLE_ERRNOS = {2002, 2003, 2005}
+# ER_NEED_REPREPARE: a table behind a prepared statement changed since it was prepared
+_REPREPARE_ERRNO = 1615
+
+
+class PoolExhaustedError(RuntimeError):
+    """Raised when no connection becomes free before the checkout timeout"""
+
+
+def is_disconnect_error(error):
+    """Return True if the error means the server connection is gone"""
+    if getattr(error, "errno", None) in _DISCONNECT_ERRNOS:
+        return True
+    if isinstance(error, sqlite3.ProgrammingError):
+        return "closed" in str(error).lower()
+    return False
+
+
+def is_unavailable_error(error):
+    """Return True if the database cannot be reached at all (server down, file gone)"""
+    if is_disconnect_error(error) or getattr(error, "errno", None) in _UNREACHABLE_ERRNOS:
+        return True
+    return isinstance(error, sqlite3.OperationalError) and "unable to open" in str(error).lower()
+
+
+def is_stale_statement_error(error):
+    """Return True if a prepared statement must be prepared again before it can run"""
+    return getattr(error, "errno", None) == _REPREPARE_ERRNO
+
+
+@functools.lru_cache(maxsize=512)
+def _sqlite_sql(query):
+    return query.replace("%s", "?")
+
+
+# Files ATTACHed to every connection of a SQLite database: {database path: {alias: file}}
+_sqlite_attachments = {}
+
+
+def attach_sqlite(path, alias, file):
+    """ATTACH `file` as `alias` on every connection to the SQLite database at `path`.
+
+    Open connections pick it up at their next checkout.
+    """
+    _sqlite_attachments[path] = dict(_sqlite_attachments.get(path, {}), **{alias: file})
+
+
+def _close_cursor(cursor):
+    try:
+        cursor.close()
+    except Exception:
+        pass
+
+
+class SQLiteCursor:
+    """Cursor adapter translating mysql.connector's %s placeholders for sqlite3"""
+    def __init__(self, cursor, dictionary=False):
+        self._cursor = cursor
+        self._dictionary = dictionary
+
+    def _rows(self, rows):
+        if not self._dictionary or not rows:
+            return rows
+        names = [d[0] for d in self._cursor.description]
+        return [dict(zip(names, row)) for row in rows]
+
+    def execute(self, query, params=None):
+        self._cursor.execute(_sqlite_sql(query), params or ())
+        return self
+
+    def executemany(self, query, seq_params):
+        self._cursor.executemany(_sqlite_sql(query), seq_params)
+        return self
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        return row if row is None else self._rows([row])[0]
+
+    def fetchmany(self, size=1):
+        return self._rows(self._cursor.fetchmany(size))
+
+    def fetchall(self):
+        return self._rows(self._cursor.fetchall())
+
+    def __iter__(self):
+        while True:
+            rows = self.fetchmany(500)
+            if not rows:
+                return
+            yield from rows
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """SQLite stand-in exposing the subset of the mysql.connector API used by the models"""
+    def __init__(self, path):
+        self.path = path
+        self._open()
+
+    def _open(self):
+        # Autocommit mode: transactions are opened explicitly by start_transaction()
+        self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA foreign_keys = ON")
+        self._file_id = self._stat()
+        self._attached = {}
+        self._attach()
+
+    def _attach(self):
+        # Outside any transaction: only called on open and on checkout
+        for alias, file in _sqlite_attachments.get(self.path, {}).items():
+            if self._attached.get(alias) != file:
+                self._conn.execute(f"ATTACH DATABASE ? AS {alias}", (file,))
+                self._attached[alias] = file
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+            return st.st_dev, st.st_ino
+        except OSError:
+            return None
+
+    def cursor(self, dictionary=False, prepared=False, buffered=None):
+        # sqlite3 keeps compiled statements per connection keyed by SQL text, so a reused
+        # cursor already skips parsing; prepared needs nothing more here
+        return SQLiteCursor(self._conn.cursor(), dictionary)
+
+    @property
+    def connection_id(self):
+        """Changes when the connection is reopened, like MySQL's session id"""
+        return id(self._conn)
+
+    def execute(self, query, params=()):
+        """Native sqlite3 execute, used by the ReportModel SQLite queries"""
+        return self._conn.execute(query, params)
+
+    def start_transaction(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+
+    @property
+    def in_transaction(self):
+        return self._conn.in_transaction
+
+    def commit(self):
+        if self._conn.in_transaction:
+            self._conn.commit()
+
+    def rollback(self):
+        if self._conn.in_transaction:
+            self._conn.rollback()
+
+    def is_connected(self):
+        # A file moved away or replaced counts as a server that went down
+        if self._stat() != self._file_id:
+            return False
+        try:
+            self._conn.execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        if self.is_connected():
+            self._attach()
+            return
+        if not reconnect:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        self._open()
+
+    def close(self):
+        self._conn.close()
+
+
+class PooledConnection:
+    """Connection checked out from a ConnectionPool; close() hands it back"""
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+
+    def __getattr__(self, name):
+        if self._raw is None:
+            raise RuntimeError("Connection already returned to the pool")
+        return getattr(self._raw, name)
+
+    def statement(self, query, dictionary=False):
+        """Prepared cursor cached for a statement this connection runs often, or None"""
+        cache = self._pool.statements(self._raw)
+        return cache.get(self._raw, query, dictionary) if cache is not None else None
+
+    def forget_statement(self, query, dictionary=False):
+        cache = self._pool.statements(self._raw)
+        if cache is not None:
+            cache.forget(query, dictionary)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and is_disconnect_error(exc):
+            self.discard()
+        else:
+            self.close()
+        return False
+
+    def close(self):
+        """Return the connection to the pool"""
+        if self._raw is not None:
+            raw, self._raw = self._raw, None
+            self._pool.release(raw)
+
+    def discard(self):
+        """Drop a broken connection instead of returning it to the pool"""
+        if self._raw is not None:
+            raw, self._raw = self._raw, None
+            self._pool.discard(raw)
+
+
+class StatementCache:
+    """Prepared cursors of one connection keyed by SQL text, least recently used evicted first.
+
+    A statement is prepared the second time it runs on the connection: preparing costs
+    an extra round trip on MySQL, which one-off statements (IN lists of varying length,
+    DDL) would never win back, and they must not push the hot ones out.
+    """
+    def __init__(self, size):
+        self.size = size
+        self._cursors = OrderedDict()  # (query, dictionary) -> prepared cursor
+        self._seen = OrderedDict()  # statements that ran once, not prepared yet
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, raw, query, dictionary=False):
+        """The prepared cursor for query, or None to run it on a plain cursor this time"""
+        key = (query, dictionary)
+        cursor = self._cursors.get(key)
+        if cursor is not None:
+            self._cursors.move_to_end(key)
+            self.hits += 1
+            return cursor
+        self.misses += 1
+        if self._seen.pop(key, None) is None:
+            self._seen[key] = True
+            if len(self._seen) > self.size * 4:
+                self._seen.popitem(last=False)
+            return None
+        cursor = raw.cursor(prepared=True, dictionary=dictionary)
+        self._cursors[key] = cursor
+        if len(self._cursors) > self.size:
+            _close_cursor(self._cursors.popitem(last=False)[1])
+        return cursor
+
+    def forget(self, query, dictionary=False):
+        cursor = self._cursors.pop((query, dictionary), None)
+        if cursor is not None:
+            _close_cursor(cursor)
+
+    def clear(self):
+        for cursor in self._cursors.values():
+            _close_cursor(cursor)
+        self._cursors.clear()
+        self._seen.clear()
+
+
+class ConnectionPool:
+    """Thread-safe pool with ping on checkout and idle eviction"""
+    def __init__(self, connect, size=5, idle_timeout=300.0, checkout_timeout=10.0, statement_cache=64):
+        self._connect = connect
+        self.size = max(1, size)
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        # Prepared statements per open connection (0 disables them); a connection is used by one thread at a time
+        self.statement_cache = statement_cache
+        self._statements = {}
+        self._idle = deque()  # (raw, released_at); newest on the right
+        self._created = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout=None):
+        """Check out a live connection, opening one if the pool is not full"""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+                self._evict_idle()
+                if self._idle:
+                    raw = self._idle.pop()[0]
+                    break
+                if self._created < self.size:
+                    self._created += 1
+                    raw = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    raise PoolExhaustedError(f"Hết kết nối trong pool (tối đa {self.size}).")
+        try:
+            if raw is not None and not self._ping(raw):
+                self._close_quietly(raw)
+                raw = None
+            if raw is None:
+                raw = self._connect()
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            raise
+        return PooledConnection(self, raw)
+
+    def release(self, raw):
+        """Reset a connection and put it back for reuse"""
+        try:
+            if getattr(raw, "in_transaction", False):
+                raw.rollback()
+        except DB_ERRORS:
+            self.discard(raw)
+            return
+        with self._cond:
+            if self._closed:
+                self._close_quietly(raw)
+                self._created -= 1
+            else:
+                self._idle.append((raw, time.monotonic()))
+            self._cond.notify()
+
+    def discard(self, raw):
+        """Close a connection and free its slot"""
+        self._close_quietly(raw)
+        with self._cond:
+            self._created -= 1
+            self._cond.notify()
+
+    def close(self):
+        """Close every idle connection; checked-out ones close on release"""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                self._close_quietly(self._idle.pop()[0])
+                self._created -= 1
+            self._cond.notify_all()
+
+    def statements(self, raw):
+        """Statement cache of a connection, or None when disabled"""
+        if not self.statement_cache:
+            return None
+        cache = self._statements.get(id(raw))
+        if cache is None:
+            cache = self._statements[id(raw)] = StatementCache(self.statement_cache)
+        return cache
+
+    def _drop_statements(self, raw):
+        cache = self._statements.pop(id(raw), None)
+        if cache is not None:
+            cache.clear()
+
+    def stats(self):
+        with self._cond:
+            caches = list(self._statements.values())
+            return {"size": self.size, "open": self._created, "idle": len(self._idle),
+                    "statement_hits": sum(c.hits for c in caches),
+                    "statement_misses": sum(c.misses for c in caches)}
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            self._close_quietly(self._idle.popleft()[0])
+            self._created -= 1
+
+    def _ping(self, raw):
+        session = getattr(raw, "connection_id", None)
+        try:
+            # mysql.connector reconnects in place when the server has gone away
+            raw.ping(reconnect=True, attempts=1, delay=0)
+        except Exception:
+            return False
+        if getattr(raw, "connection_id", None) != session:
+            # Statements prepared on the old session are gone with it
+            self._drop_statements(raw)
+        return True
+
+    def _close_quietly(self, raw):
+        self._drop_statements(raw)
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(backend="mysql", mysql_config=None, sqlite_path="database.db"):
+    """Return the process-wide pool for a backend/config, creating it on first use"""
+    if backend == "mysql":
+        if mysql is None:
+            raise RuntimeError("Chưa cài đặt mysql-connector-python.")
+        config = dict(mysql_config or {})
+        if config.get("port") is not None:
+            config["port"] = int(config["port"])
+        key = ("mysql",) + tuple(sorted(config.items()))
+        connect = lambda: mysql.connector.connect(**config)
+    else:
+        key = ("sqlite", sqlite_path)
+        connect = lambda: SQLiteConnection(sqlite_path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(connect, **load_pool_config())
+            _pools[key] = pool
+        return pool
+
+
+def close_all_pools():
+    """Close every pool; called on application exit"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
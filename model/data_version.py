@@ -0,0 +1,32 @@
+"""Process-wide change counters, bumped by the models after each committed write.
+
+A view remembers the versions of the tables it shows when it loads them and reloads
+only after they moved, so showing a kept-alive tab again costs no query. Writes made
+by other processes are not counted; TabManager also reloads data older than a max age.
+The time of the last bump tells the replica router how recent this process's own writes are.
+"""
+import threading
+import time
+
+_lock = threading.Lock()
+_versions = {}
+_last_write = None
+
+
+def bump(*tables):
+    global _last_write
+    with _lock:
+        for table in tables:
+            _versions[table] = _versions.get(table, 0) + 1
+        _last_write = time.monotonic()
+
+
+def current(*tables):
+    """Versions of `tables`, comparable with a later call"""
+    with _lock:
+        return tuple(_versions.get(table, 0) for table in tables)
+
+
+def last_write():
+    """time.monotonic() of the last bump in this process, or None"""
+    return _last_write
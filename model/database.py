@@ -1,72 +1,256 @@
-import mysql.connector
-from mysql.connector import Error
 import os
+import threading
+from contextlib import contextmanager
 from dotenv import load_dotenv
 
+from config.db_config import load_backend_config
+from model.connection_pool import (DB_ERRORS, PoolExhaustedError, get_pool, is_disconnect_error,
+                                   is_stale_statement_error, is_unavailable_error)
+from model.query_stats import track
+
 load_dotenv()
 
+Error = DB_ERRORS
+
 
 class Database:
-    """Database connection manager"""
+    """Database access through the process-wide connection pool"""
     def __init__(self):
         self.host = os.getenv('DB_HOST')
         self.port = os.getenv('DB_PORT')
         self.user = os.getenv('DB_USER')
         self.password = os.getenv('DB_PASSWORD')
         self.database = os.getenv('DB_NAME')
-        self.connection = None
-    
+        # DB_BACKEND=sqlite runs the models against a local SQLite stand-in
+        backend_config = load_backend_config()
+        self.backend = backend_config['backend']
+        self.sqlite_path = backend_config['sqlite_path']
+        self.pool = None
+        # Pinned connection and transaction flag are per thread
+        self._local = threading.local()
+
+    @property
+    def connection(self):
+        """Connection pinned by the current thread, if any"""
+        return getattr(self._local, 'connection', None)
+
+    @connection.setter
+    def connection(self, conn):
+        self._local.connection = conn
+
+    @property
+    def in_transaction(self):
+        return getattr(self._local, 'in_transaction', False)
+
+    def get_mysql_config(self):
+        """Connection arguments for mysql.connector"""
+        return {
+            'host': self.host,
+            'port': self.port,
+            'user': self.user,
+            'password': self.password,
+            'database': self.database
+        }
+
     def connect(self):
-        """Establish database connection"""
+        """Attach to the shared pool and check that a connection can be made"""
         try:
-            self.connection = mysql.connector.connect(
-                host=self.host,
-                port=self.port,
-                user=self.user,
-                password=self.password,
-                database=self.database
-            )
-            if self.connection.is_connected():
-                print("Successfully connected to MySQL database")
-                return True
-        except Error as e:
-            print(f"Error connecting to MySQL: {e}")
+            conn = self._acquire()
+            conn.close()
+            print(f"Successfully connected to {self.backend} database")
+            return True
+        except (RuntimeError,) + Error as e:
+            print(f"Error connecting to database: {e}")
             return False
-    
+
+    def _acquire(self):
+        # Work submitted before connect() has run attaches to the pool by itself
+        if self.pool is None:
+            self.pool = get_pool(self.backend, self.get_mysql_config(), self.sqlite_path)
+        return self.pool.acquire()
+
+    def is_available(self):
+        """False when the database cannot be reached at all; a busy pool still counts as up"""
+        try:
+            self._acquire().close()
+            return True
+        except PoolExhaustedError:
+            return True
+        except Error as e:
+            return not is_unavailable_error(e)
+
     def disconnect(self):
-        """Close database connection"""
-        if self.connection and self.connection.is_connected():
+        """Give back any pinned connection; pooled connections stay open for reuse"""
+        if self.connection is not None:
             self.connection.close()
-            print("MySQL connection closed")
-    
+            self.connection = None
+
     def get_connection(self):
-        """Get the current connection"""
+        """Pin a pooled connection to this Database until disconnect()"""
+        if self.connection is None:
+            self.connection = self._acquire()
         return self.connection
-    
+
+    @contextmanager
+    def pinned(self):
+        """Run every query in the block on one connection, without opening a transaction"""
+        if self.connection is not None:
+            yield self.connection
+            return
+        conn = self._acquire()
+        self.connection = conn
+        try:
+            yield conn
+        finally:
+            self.connection = None
+            conn.close()
+
+    @contextmanager
+    def transaction(self):
+        """Run every query in the block on one connection and commit them together"""
+        if self.in_transaction:
+            # Nested block joins the outer transaction
+            yield self.connection
+            return
+        pinned = self.connection
+        conn = pinned or self._acquire()
+        self.connection = conn
+        self._local.in_transaction = True
+        try:
+            conn.start_transaction()
+            yield conn
+            conn.commit()
+        except BaseException:
+            try:
+                conn.rollback()
+            except Error:
+                conn.discard()
+            raise
+        finally:
+            self._local.in_transaction = False
+            self.connection = pinned
+            if pinned is None:
+                conn.close()
+
+    def _run(self, work, retry=False):
+        """Run work(conn) on the pinned connection or on one checked out from the pool"""
+        if self.connection is not None:
+            return work(self.connection)
+        conn = self._acquire()
+        try:
+            result = work(conn)
+        except Error as e:
+            if is_disconnect_error(e):
+                conn.discard()
+                if retry:
+                    return self._run(work)
+            else:
+                conn.close()
+            raise
+        conn.close()
+        return result
+
+    @staticmethod
+    def _execute(conn, query, params, dictionary=False):
+        """Run query on the connection's prepared cursor once it is hot, else on a fresh cursor"""
+        cursor = conn.statement(query, dictionary) if params else None
+        if cursor is not None:
+            try:
+                cursor.execute(query, params)
+                return cursor
+            except Error as e:
+                if not is_stale_statement_error(e):
+                    raise
+                # A table changed under the statement: drop it and run this call as plain text
+                conn.forget_statement(query, dictionary)
+        cursor = conn.cursor(dictionary=dictionary)
+        if params:
+            cursor.execute(query, params)
+        else:
+            cursor.execute(query)
+        return cursor
+
     def execute_query(self, query, params=None):
         """Execute a query (INSERT, UPDATE, DELETE)"""
+        def work(conn):
+            with track(query) as stat:
+                cursor = self._execute(conn, query, params)
+                stat.affected = cursor.rowcount
+            if not self.in_transaction:
+                conn.commit()
+            return cursor
         try:
-            cursor = self.connection.cursor()
-            if params:
-                cursor.execute(query, params)
-            else:
-                cursor.execute(query)
-            self.connection.commit()
+            return self._run(work)
+        except Error as e:
+            print(f"Error executing query: {e}")
+            return None
+
+    def execute_many(self, query, seq_params):
+        """Execute one statement for many parameter rows (multi-row INSERT on MySQL)"""
+        def work(conn):
+            # mysql.connector folds a plain cursor's executemany into one multi-row INSERT;
+            # a prepared one would send the rows one by one, so only SQLite reuses the cursor
+            cursor = conn.statement(query) if self.backend == "sqlite" else None
+            cursor = cursor or conn.cursor()
+            with track(query) as stat:
+                cursor.executemany(query, seq_params)
+                stat.affected = cursor.rowcount
+            if not self.in_transaction:
+                conn.commit()
             return cursor
+        try:
+            return self._run(work)
         except Error as e:
             print(f"Error executing query: {e}")
             return None
-    
-    def fetch_query(self, query, params=None):
-        """Fetch data from database (SELECT)"""
+
+    def _fetch_replica(self, work):
+        """work(conn) on the read replica; None when it must run on the primary instead"""
+        if self.connection is not None:
+            return None
+        from model.replica import ReplicaRouter
+        router = ReplicaRouter.get()
+        pool = router.read_pool(self.backend, own_writes=True)
+        if pool is None:
+            return None
         try:
-            cursor = self.connection.cursor(dictionary=True)
-            if params:
-                cursor.execute(query, params)
+            conn = pool.acquire(timeout=1)
+        except (RuntimeError,) + Error as e:
+            router.mark_failed(e)
+            return None
+        try:
+            result = work(conn)
+        except Error as e:
+            if is_disconnect_error(e):
+                conn.discard()
             else:
-                cursor.execute(query)
-            result = cursor.fetchall()
-            return result
+                conn.close()
+            if is_unavailable_error(e):
+                router.mark_failed(e)
+            print(f"Error fetching from replica, using primary: {e}")
+            return None
+        conn.close()
+        return result
+
+    def fetch_query(self, query, params=None, replica=False):
+        """Fetch data from database (SELECT).
+
+        replica=True lets the read replica answer (search) unless this process wrote more
+        recently than its lag; lookups by key keep the default and always see the primary.
+        """
+        def work(conn):
+            with track(query) as stat:
+                cursor = self._execute(conn, query, params, dictionary=True)
+                rows = cursor.fetchall()
+                stat.rows = len(rows)
+            return rows
+        if replica:
+            rows = self._fetch_replica(work)
+            if rows is not None:
+                return rows
+        try:
+            # Reads are safe to replay once on a fresh connection
+            return self._run(work, retry=True)
         except Error as e:
             print(f"Error fetching data: {e}")
             return []
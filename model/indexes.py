@@ -0,0 +1,106 @@
+"""Index provisioning for the date-range report, invoice list and medicine price queries.
+
+Usage: python -m model.indexes [--check MM/yyyy]
+  --check exits with status 1 if the monthly revenue plan falls back to a full scan
+  of HOA_DON or HOA_DON_THUOC.
+"""
+import sys
+
+
+def required_indexes(date_col="ngay_gio", id_col="ma_hoa_don", detail_fk="ma_hoa_don"):
+    """(table, index name, columns) the report and list queries need"""
+    return [
+        # Range filter on the date plus keyset paging on (date, id)
+        ("HOA_DON", "idx_hoa_don_ngay_gio", (date_col, id_col)),
+        ("HOA_DON_THUOC", "idx_hoa_don_thuoc_hd_thuoc", (detail_fk, "ma_thuoc")),
+        # Latest invoice line per medicine (price and unit for the medicine catalog)
+        ("HOA_DON_THUOC", "idx_hoa_don_thuoc_thuoc_hd", ("ma_thuoc", detail_fk)),
+    ]
+
+
+def _fetch(conn, backend, sql, params=()):
+    if backend == "mysql":
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        return cur.fetchall()
+    return conn.execute(sql, params).fetchall()
+
+
+def _execute(conn, backend, sql):
+    if backend == "mysql":
+        conn.cursor().execute(sql)
+    else:
+        conn.execute(sql)
+    conn.commit()
+
+
+def existing_indexes(conn, backend, table):
+    """Column tuples of every index on a table, including the primary key"""
+    indexes = {}
+    if backend == "mysql":
+        rows = _fetch(conn, backend, """
+            SELECT INDEX_NAME, COLUMN_NAME FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = %s
+            ORDER BY INDEX_NAME, SEQ_IN_INDEX
+        """, (table,))
+        for name, column in rows:
+            indexes.setdefault(name, []).append(column)
+    else:
+        for row in _fetch(conn, backend, f"PRAGMA index_list({table})"):
+            name = row[1]
+            indexes[name] = [info[2] for info in _fetch(conn, backend, f"PRAGMA index_info({name})")]
+    return [tuple(c.lower() for c in cols) for cols in indexes.values()]
+
+
+def ensure_indexes(conn, backend, date_col="ngay_gio", id_col="ma_hoa_don", detail_fk="ma_hoa_don"):
+    """Create missing indexes; an existing index with the same leading columns counts as present"""
+    created = []
+    for table, name, columns in required_indexes(date_col, id_col, detail_fk):
+        wanted = tuple(c.lower() for c in columns)
+        if any(cols[:len(wanted)] == wanted for cols in existing_indexes(conn, backend, table)):
+            continue
+        _execute(conn, backend, f"CREATE INDEX {name} ON {table} ({', '.join(columns)})")
+        created.append(name)
+    return created
+
+
+def explain(conn, backend, sql, params, aliases):
+    """Query plan rows and whether any table in `aliases` is fully scanned"""
+    if backend == "mysql":
+        cur = conn.cursor(dictionary=True)
+        cur.execute("EXPLAIN " + sql, params)
+        plan = cur.fetchall()
+        full_scan = any(r.get("table") in aliases and r.get("type") == "ALL" for r in plan)
+    else:
+        plan = [r[3] for r in conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()]
+        full_scan = any(detail.split()[:2] in (["SCAN", a] for a in aliases) for detail in plan)
+    return {"full_scan": full_scan, "plan": plan}
+
+
+def main(argv=None):
+    from datetime import datetime
+    from config.db_config import load_backend_config, load_db_config
+    from model.report import ReportModel
+
+    argv = sys.argv[1:] if argv is None else argv
+    backend_config = load_backend_config()
+    model = ReportModel(db_path=backend_config["sqlite_path"], backend=backend_config["backend"],
+                        mysql_config=load_db_config())
+    created = model.ensure_indexes()
+    print(f"Đã tạo index: {', '.join(created)}" if created else "Index đã đầy đủ")
+    if "--check" in argv:
+        idx = argv.index("--check")
+        month_year = argv[idx + 1] if len(argv) > idx + 1 else datetime.now().strftime("%m/%Y")
+        month, year = month_year.split("/")
+        result = model.explain_revenue(month, year)
+        for row in result["plan"]:
+            print(row)
+        if result["full_scan"]:
+            print("Truy vấn doanh thu đang quét toàn bộ bảng hóa đơn")
+            return 1
+        print("Truy vấn doanh thu dùng index")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,141 +1,418 @@
+from model import data_version
 from model.database import Database
+from model.invoice_totals import InvoiceTotals
+from model.revenue_rollup import RevenueRollup
+from model.search_index import SearchIndex, INVOICE
+from model.medicine_catalog import MedicineCatalog
+from model.invoice_journal import InvoiceJournal
+from model.invoice_archive import InvoiceArchive
 from datetime import datetime
 
 
 class Invoice:
     def __init__(self, db: Database):
         self.db = db
+        self.totals = InvoiceTotals(db)
+        self.rollup = RevenueRollup()
+        self.search_index = SearchIndex(db)
+        self.catalog = MedicineCatalog.for_db(db)
+        self.journal = InvoiceJournal.for_path()
+        self.archive = InvoiceArchive(db)
     
     def create_invoice(self, ma_hoa_don, ten_khach_hang, ma_nv, giam_gia, items):
+        invoice = {
+            'ma_hoa_don': ma_hoa_don,
+            'ten_khach_hang': ten_khach_hang,
+            'ngay_gio': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'ma_nv': ma_nv,
+            'giam_gia': giam_gia,
+            'items': items
+        }
+        # While older invoices wait for the primary, new ones queue behind them to keep sale order
+        waiting = self.journal.counts()[0]
+        if waiting:
+            return self._queue(invoice, waiting)
         try:
-            ngay_gio = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            self.totals.ensure_table()
+            self.search_index.ensure_table()
             
-            # Insert into HOA_DON table
-            query_hoa_don = """
-            INSERT INTO HOA_DON (ma_hoa_don, ten_khach_hang, ngay_gio, ma_nv)
-            VALUES (%s, %s, %s, %s)
-            """
-            params_hoa_don = (ma_hoa_don, ten_khach_hang, ngay_gio, ma_nv)
-            cursor_hoa_don = self.db.execute_query(query_hoa_don, params_hoa_don)
-            
-            if not cursor_hoa_don:
-                return False, "Không thể tạo hóa đơn"
-            
-            # Insert invoice items (giam_gia applies to whole invoice)
-            query_chi_tiet = """
-            INSERT INTO HOA_DON_THUOC (ma_hoa_don, ma_thuoc, don_vi_tinh, so_luong, giam_gia, gia_ban)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            """
-            
-            for item in items:
-                params_chi_tiet = (
-                    ma_hoa_don,
-                    item['ma_thuoc'],
-                    item['don_vi_tinh'],
-                    item['so_luong'],
-                    giam_gia,
-                    item['don_gia']
-                )
-                cursor_chi_tiet = self.db.execute_query(query_chi_tiet, params_chi_tiet)
-                if not cursor_chi_tiet:
-                    return False, f"Không thể thêm thuốc {item['ten_thuoc']} vào hóa đơn"
+            # Stock, header and lines are committed together, or not at all
+            with self.db.transaction():
+                self._write_batch([invoice])
             
+            self.catalog.record_sale(items)
+            data_version.bump("HOA_DON", "THUOC")
             return True, "Tạo hóa đơn thành công"
         except Exception as e:
+            if not self.db.is_available():
+                return self._queue(invoice)
+            if isinstance(e, RuntimeError):
+                return False, str(e)
             return False, f"Lỗi khi tạo hóa đơn: {str(e)}"
     
+    def _queue(self, invoice, waiting=0):
+        """Keep the invoice in the local journal until the primary database is back (or the backlog is written)"""
+        try:
+            self._check_catalog_stock(invoice['items'])
+            self.journal.enqueue(invoice)
+        except RuntimeError as e:
+            return False, str(e)
+        except Exception as e:
+            return False, f"Không thể lưu hóa đơn vào hàng chờ: {str(e)}"
+        self.catalog.record_sale(invoice['items'])
+        if waiting:
+            return True, (f"Hóa đơn đã lưu vào hàng chờ, sau {waiting} hóa đơn đang chờ đồng bộ, "
+                          "và sẽ được ghi theo đúng thứ tự bán")
+        return True, "Mất kết nối cơ sở dữ liệu: hóa đơn đã lưu vào hàng chờ và sẽ được đồng bộ sau"
+
+    def _check_catalog_stock(self, items):
+        """Same check as _reserve_stock, against the catalog: a queued sale must not exceed the stock on hand"""
+        for line, ma_thuoc, so_luong in self._quantities_by_medicine(items):
+            medicine = self.catalog.get(ma_thuoc)
+            if medicine is None:
+                raise RuntimeError(f"Dòng {line}: thuốc {ma_thuoc} không tồn tại")
+            stock = medicine['so_luong_ton_kho'] or 0
+            if stock < so_luong:
+                raise RuntimeError(
+                    f"Dòng {line}: không đủ tồn kho cho {medicine['ten_thuoc']} ({ma_thuoc}), "
+                    f"còn {stock}, cần {so_luong}")
+    
+    def _write_batch(self, invoices):
+        """Stock, headers, lines, totals and index entries of new invoices (inside one transaction)"""
+        # Take the stock first so row locks on THUOC are acquired in one fixed order
+        self._reserve_stock([item for invoice in invoices for item in invoice['items']])
+        self._insert_invoices(invoices)
+        
+        # Invoices queued before a month ended may land in one that is already rolled up
+        months = {inv['ngay_gio'][:7] for inv in invoices}
+        for month in sorted(months):
+            year, month = int(month[:4]), int(month[5:7])
+            if self.rollup.is_closed(year, month):
+                self._refresh_rollup_month(datetime(year, month, 1))
+    
+    def _insert_invoices(self, invoices):
+        """Headers, lines, totals and index entries of new invoices"""
+        # Insert into HOA_DON table
+        query_hoa_don = """
+        INSERT INTO HOA_DON (ma_hoa_don, ten_khach_hang, ngay_gio, ma_nv)
+        VALUES (%s, %s, %s, %s)
+        """
+        params_hoa_don = [(inv['ma_hoa_don'], inv['ten_khach_hang'], inv['ngay_gio'], inv['ma_nv'])
+                          for inv in invoices]
+        if not self.db.execute_many(query_hoa_don, params_hoa_don):
+            raise RuntimeError("Không thể tạo hóa đơn")
+        
+        # Insert all invoice items in one batch (giam_gia applies to whole invoice)
+        query_chi_tiet = """
+        INSERT INTO HOA_DON_THUOC (ma_hoa_don, ma_thuoc, don_vi_tinh, so_luong, giam_gia, gia_ban)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        """
+        params_chi_tiet = [
+            (inv['ma_hoa_don'], item['ma_thuoc'], item['don_vi_tinh'], item['so_luong'], inv['giam_gia'],
+             item['don_gia'])
+            for inv in invoices for item in inv['items']
+        ]
+        if not self.db.execute_many(query_chi_tiet, params_chi_tiet):
+            raise RuntimeError("Không thể thêm thuốc vào hóa đơn")
+        
+        ids = [inv['ma_hoa_don'] for inv in invoices]
+        if not (self.totals.add(ids[0]) if len(ids) == 1 else self.totals.add_many(ids)):
+            raise RuntimeError("Không thể lưu tổng tiền hóa đơn")
+        
+        entries = [(inv['ma_hoa_don'], inv['ten_khach_hang'], inv['ma_nv']) for inv in invoices]
+        if not (self.search_index.add_invoice(*entries[0]) if len(entries) == 1
+                else self.search_index.add_many(INVOICE, entries)):
+            raise RuntimeError("Không thể cập nhật chỉ mục tìm kiếm")
+    
+    def import_invoices(self, invoices):
+        """Insert historical invoices (dicts as in the journal) inside the caller's transaction.
+        
+        Stock is left alone: it already reflects these sales. Rolled-up months are
+        rebuilt once at the end with refresh_rollup_months().
+        """
+        self._insert_invoices(invoices)
+    
+    def refresh_rollup_months(self, months):
+        """Rebuild the rolled-up months among (year, month) pairs after an import"""
+        with self.db.transaction():
+            for year, month in sorted(months):
+                self._refresh_rollup_month(datetime(year, month, 1))
+        self.catalog.invalidate()
+    
+    def import_medicines(self, rows):
+        """Insert validated (ma_thuoc, ten_thuoc, hang_sx, so_luong_ton_kho) rows inside the caller's transaction"""
+        query = "INSERT INTO THUOC (ma_thuoc, ten_thuoc, hang_sx, so_luong_ton_kho) VALUES (%s, %s, %s, %s)"
+        if not self.db.execute_many(query, rows):
+            raise RuntimeError("Không thể thêm thuốc")
+        self.catalog.invalidate()
+    
+    def replay(self, invoices):
+        """Write invoices from the journal: returns (written or already present ids, {id: error}, reachable).
+        
+        The whole batch goes in one transaction; if the primary rejects it, the invoices are
+        retried one by one so a single bad invoice cannot hold back the others.
+        """
+        applied, failures = [], {}
+        if not self.db.is_available():
+            return applied, failures, False
+        # The application may have started while the primary was down and never created these
+        self.totals.ensure_table()
+        self.search_index.ensure_table()
+        ids = [inv['ma_hoa_don'] for inv in invoices]
+        placeholders = ", ".join(["%s"] * len(ids))
+        existing = {row['ma_hoa_don']: row for row in self.db.fetch_query(
+            f"SELECT ma_hoa_don, ngay_gio, ma_nv FROM HOA_DON WHERE ma_hoa_don IN ({placeholders})", tuple(ids))}
+        
+        fresh = []
+        for inv in invoices:
+            row = existing.get(inv['ma_hoa_don'])
+            if row is None:
+                fresh.append(inv)
+            elif str(row['ngay_gio'])[:19] == inv['ngay_gio'] and row['ma_nv'] == inv['ma_nv']:
+                # Written by an earlier flush that stopped before clearing the journal
+                applied.append(inv['ma_hoa_don'])
+            else:
+                failures[inv['ma_hoa_don']] = "Mã hóa đơn đã được dùng cho một hóa đơn khác"
+        
+        reachable = True
+        groups = [fresh] if fresh else []
+        while groups:
+            group = groups.pop(0)
+            try:
+                with self.db.transaction():
+                    self._write_batch(group)
+            except Exception as e:
+                if not self.db.is_available():
+                    reachable = False
+                    break
+                if len(group) > 1:
+                    groups[:0] = [[inv] for inv in group]
+                else:
+                    failures[group[0]['ma_hoa_don']] = str(e)
+                continue
+            applied.extend(inv['ma_hoa_don'] for inv in group)
+        
+        if applied:
+            # Stock changed behind the catalog's back
+            self.catalog.invalidate()
+            data_version.bump("HOA_DON", "THUOC")
+        return applied, failures, reachable
+    
     def get_all_invoices(self):
+        self.totals.ensure_table()
         query = """
         SELECT 
             h.ma_hoa_don,
             h.ten_khach_hang,
             h.ngay_gio,
             h.ma_nv,
-            COALESCE(SUM(ht.so_luong * ht.gia_ban), 0) as tong_tien_hang,
-            COALESCE(SUM(ht.so_luong * ht.gia_ban * ht.giam_gia / 100), 0) as tong_giam_gia,
-            COALESCE(SUM(ht.so_luong * ht.gia_ban * (1 - ht.giam_gia / 100)), 0) as thanh_tien
+            COALESCE(t.tong_tien_hang, 0) as tong_tien_hang,
+            COALESCE(t.tong_giam_gia, 0) as tong_giam_gia,
+            COALESCE(t.thanh_tien, 0) as thanh_tien
         FROM HOA_DON h
-        LEFT JOIN HOA_DON_THUOC ht 
-            ON h.ma_hoa_don = ht.ma_hoa_don
-        GROUP BY 
+        LEFT JOIN HOA_DON_TONG t 
+            ON h.ma_hoa_don = t.ma_hoa_don
+        ORDER BY h.ngay_gio DESC;
+        """
+        return self.db.fetch_query(query)
+    
+    def get_invoices_page(self, limit=100, after=None, before=None):
+        """Keyset page of invoices, newest first, ordered by (ngay_gio, ma_hoa_don).
+        after/before is the (ngay_gio, ma_hoa_don) key of the row the page continues from.
+        """
+        self.totals.ensure_table()
+        where = ""
+        params = []
+        order = "DESC"
+        if after:
+            where = "WHERE ngay_gio < %s OR (ngay_gio = %s AND ma_hoa_don < %s)"
+            params = [after[0], after[0], after[1]]
+        elif before:
+            where = "WHERE ngay_gio > %s OR (ngay_gio = %s AND ma_hoa_don > %s)"
+            params = [before[0], before[0], before[1]]
+            order = "ASC"
+        params.append(int(limit))
+        query = f"""
+        SELECT 
             h.ma_hoa_don,
             h.ten_khach_hang,
             h.ngay_gio,
-            h.ma_nv
-        ORDER BY h.ngay_gio DESC;
+            h.ma_nv,
+            COALESCE(t.tong_tien_hang, 0) as tong_tien_hang,
+            COALESCE(t.tong_giam_gia, 0) as tong_giam_gia,
+            COALESCE(t.thanh_tien, 0) as thanh_tien
+        FROM (
+            SELECT ma_hoa_don, ten_khach_hang, ngay_gio, ma_nv
+            FROM HOA_DON
+            {where}
+            ORDER BY ngay_gio {order}, ma_hoa_don {order}
+            LIMIT %s
+        ) h
+        LEFT JOIN HOA_DON_TONG t 
+            ON h.ma_hoa_don = t.ma_hoa_don
+        ORDER BY h.ngay_gio DESC, h.ma_hoa_don DESC
         """
-        return self.db.fetch_query(query)
+        return self.db.fetch_query(query, tuple(params))
     
-    def get_invoice_by_id(self, ma_hoa_don):
-        query = """
+    DETAIL_SQL = """
         SELECT h.ma_hoa_don, h.ten_khach_hang, h.ngay_gio, h.ma_nv,
                ht.ma_thuoc, t.ten_thuoc, ht.don_vi_tinh, ht.so_luong, ht.gia_ban as don_gia, ht.giam_gia,
                (ht.so_luong * ht.gia_ban - ht.giam_gia) as item_thanh_tien
-        FROM HOA_DON h
-        LEFT JOIN HOA_DON_THUOC ht ON h.ma_hoa_don = ht.ma_hoa_don
+        FROM {header} h
+        LEFT JOIN {lines} ht ON h.ma_hoa_don = ht.ma_hoa_don
         LEFT JOIN THUOC t ON ht.ma_thuoc = t.ma_thuoc
         WHERE h.ma_hoa_don = %s
         """
+    
+    def get_invoice_by_id(self, ma_hoa_don, include_archive=False):
+        """Header and lines of one invoice; include_archive also looks in the archive tables"""
         params = (ma_hoa_don,)
-        return self.db.fetch_query(query, params)
+        rows = self.db.fetch_query(self.DETAIL_SQL.format(header="HOA_DON", lines="HOA_DON_THUOC"), params)
+        if rows or not include_archive:
+            return rows
+        tables = self.archive.archived_tables()
+        if not tables:
+            return rows
+        return self.db.fetch_query(
+            self.DETAIL_SQL.format(header=tables["HOA_DON"], lines=tables["HOA_DON_THUOC"]), params)
     
     def delete_invoice(self, ma_hoa_don):
         try:
-            # Delete invoice details first (foreign key constraint)
-            query_chi_tiet = "DELETE FROM HOA_DON_THUOC WHERE ma_hoa_don = %s"
-            self.db.execute_query(query_chi_tiet, (ma_hoa_don,))
-            
-            # Delete invoice
-            query_hoa_don = "DELETE FROM HOA_DON WHERE ma_hoa_don = %s"
-            cursor = self.db.execute_query(query_hoa_don, (ma_hoa_don,))
+            self.totals.ensure_table()
+            self.search_index.ensure_table()
+            with self.db.transaction():
+                # Sold quantities go back to stock
+                self._release_stock(ma_hoa_don)
+                
+                # Delete invoice details and totals first (foreign key constraint)
+                query_chi_tiet = "DELETE FROM HOA_DON_THUOC WHERE ma_hoa_don = %s"
+                if not self.db.execute_query(query_chi_tiet, (ma_hoa_don,)):
+                    raise RuntimeError("Không thể xóa hóa đơn")
+                if not self.totals.remove(ma_hoa_don):
+                    raise RuntimeError("Không thể xóa hóa đơn")
+                if not self.search_index.remove(INVOICE, ma_hoa_don):
+                    raise RuntimeError("Không thể xóa hóa đơn")
+                
+                # Delete invoice
+                header = self.db.fetch_query("SELECT ngay_gio FROM HOA_DON WHERE ma_hoa_don = %s", (ma_hoa_don,))
+                query_hoa_don = "DELETE FROM HOA_DON WHERE ma_hoa_don = %s"
+                if not self.db.execute_query(query_hoa_don, (ma_hoa_don,)):
+                    raise RuntimeError("Không thể xóa hóa đơn")
+                
+                # A closed month that is already rolled up must drop this invoice too
+                if header:
+                    self._refresh_rollup_month(header[0]['ngay_gio'])
             
-            return cursor is not None, "Xóa hóa đơn thành công" if cursor else "Không thể xóa hóa đơn"
+            # The deleted lines may have been the latest price of a medicine
+            self.catalog.invalidate()
+            data_version.bump("HOA_DON", "THUOC")
+            return True, "Xóa hóa đơn thành công"
+        except RuntimeError as e:
+            return False, str(e)
         except Exception as e:
             return False, f"Lỗi khi xóa hóa đơn: {str(e)}"
     
+    @staticmethod
+    def _quantities_by_medicine(items):
+        """(line number, ma_thuoc, total quantity) sorted by ma_thuoc"""
+        totals = {}
+        for line, item in enumerate(items, start=1):
+            first_line, so_luong = totals.get(item['ma_thuoc'], (line, 0))
+            totals[item['ma_thuoc']] = (first_line, so_luong + int(item['so_luong']))
+        return [(line, ma_thuoc, so_luong) for ma_thuoc, (line, so_luong) in sorted(totals.items())]
+    
+    def _reserve_stock(self, items):
+        """Decrement THUOC.so_luong_ton_kho for every line, in ma_thuoc order (inside the invoice transaction).
+        
+        The conditional UPDATE locks the row and checks stock in one statement, so two
+        counters selling the same medicine can never take it below zero, and the fixed
+        order means two invoices can never wait on each other's rows.
+        """
+        query = """
+        UPDATE THUOC SET so_luong_ton_kho = so_luong_ton_kho - %s
+        WHERE ma_thuoc = %s AND so_luong_ton_kho >= %s
+        """
+        for line, ma_thuoc, so_luong in self._quantities_by_medicine(items):
+            cursor = self.db.execute_query(query, (so_luong, ma_thuoc, so_luong))
+            if cursor is None:
+                raise RuntimeError(f"Không thể cập nhật tồn kho (dòng {line}, thuốc {ma_thuoc})")
+            if cursor.rowcount == 1:
+                continue
+            stock = self.db.fetch_query(
+                "SELECT ten_thuoc, so_luong_ton_kho FROM THUOC WHERE ma_thuoc = %s", (ma_thuoc,))
+            if not stock:
+                raise RuntimeError(f"Dòng {line}: thuốc {ma_thuoc} không tồn tại")
+            raise RuntimeError(
+                f"Dòng {line}: không đủ tồn kho cho {stock[0]['ten_thuoc']} ({ma_thuoc}), "
+                f"còn {stock[0]['so_luong_ton_kho']}, cần {so_luong}")
+    
+    def _release_stock(self, ma_hoa_don):
+        """Give the quantities of an invoice back to stock, in ma_thuoc order"""
+        lines = self.db.fetch_query(
+            "SELECT ma_thuoc, so_luong FROM HOA_DON_THUOC WHERE ma_hoa_don = %s", (ma_hoa_don,))
+        query = "UPDATE THUOC SET so_luong_ton_kho = so_luong_ton_kho + %s WHERE ma_thuoc = %s"
+        for _, ma_thuoc, so_luong in self._quantities_by_medicine(lines):
+            if not self.db.execute_query(query, (so_luong, ma_thuoc)):
+                raise RuntimeError("Không thể hoàn lại tồn kho")
+    
+    def _refresh_rollup_month(self, ngay_gio):
+        if isinstance(ngay_gio, str):
+            ngay_gio = datetime.strptime(ngay_gio[:10], '%Y-%m-%d')
+        conn = self.db.connection
+        if self.rollup.is_rolled_up(conn, ngay_gio.year, ngay_gio.month):
+            # An archived month keeps most of its rows in the archive tables
+            self.rollup.rebuild_month(conn, ngay_gio.year, ngay_gio.month,
+                                      self.archive.detail_tables(ngay_gio.year, ngay_gio.month))
+    
     def search_invoices(self, search_term):
+        """Invoices matching search_term in id, customer name or staff id, ignoring diacritics"""
+        keys = self.search_index.search(INVOICE, search_term)
+        if keys is None:
+            return self._search_invoices_like(search_term)
+        if not keys:
+            return []
+        self.totals.ensure_table()
         query = """
         SELECT 
             h.ma_hoa_don,
             h.ten_khach_hang,
             h.ngay_gio,
             h.ma_nv,
-            COALESCE(SUM(ht.so_luong * ht.gia_ban), 0) as tong_tien_hang,
-            COALESCE(SUM(ht.so_luong * ht.gia_ban * ht.giam_gia / 100), 0) as tong_giam_gia,
-            COALESCE(SUM(ht.so_luong * ht.gia_ban * (1 - ht.giam_gia / 100)), 0) as thanh_tien
+            COALESCE(t.tong_tien_hang, 0) as tong_tien_hang,
+            COALESCE(t.tong_giam_gia, 0) as tong_giam_gia,
+            COALESCE(t.thanh_tien, 0) as thanh_tien
         FROM HOA_DON h
-        LEFT JOIN HOA_DON_THUOC ht 
-            ON h.ma_hoa_don = ht.ma_hoa_don
-        WHERE h.ma_hoa_don LIKE %s 
-           OR h.ten_khach_hang LIKE %s
-           OR h.ma_nv LIKE %s
-        GROUP BY 
+        LEFT JOIN HOA_DON_TONG t 
+            ON h.ma_hoa_don = t.ma_hoa_don
+        WHERE h.ma_hoa_don IN ({placeholders})
+        """
+        return self.search_index.fetch_ranked(query, keys, 'ma_hoa_don')
+    
+    def _search_invoices_like(self, search_term):
+        """Unindexed fallback used when the search index cannot be created"""
+        self.totals.ensure_table()
+        query = """
+        SELECT 
             h.ma_hoa_don,
             h.ten_khach_hang,
             h.ngay_gio,
-            h.ma_nv
+            h.ma_nv,
+            COALESCE(t.tong_tien_hang, 0) as tong_tien_hang,
+            COALESCE(t.tong_giam_gia, 0) as tong_giam_gia,
+            COALESCE(t.thanh_tien, 0) as thanh_tien
+        FROM HOA_DON h
+        LEFT JOIN HOA_DON_TONG t 
+            ON h.ma_hoa_don = t.ma_hoa_don
+        WHERE h.ma_hoa_don LIKE %s 
+           OR h.ten_khach_hang LIKE %s
+           OR h.ma_nv LIKE %s
         ORDER BY h.ngay_gio DESC
         """
         search_pattern = f"%{search_term}%"
-        return self.db.fetch_query(query, (search_pattern, search_pattern, search_pattern))
+        return self.db.fetch_query(query, (search_pattern, search_pattern, search_pattern), replica=True)
     
     def get_all_medicines(self):
         """Get all medicines for invoice creation, including don_vi_tinh and gia_ban
-        Get the most recent price and unit for each medicine
+        Get the most recent price and unit for each medicine (served from the shared catalog cache)
         """
-        query = """
-        SELECT t.ma_thuoc, t.ten_thuoc, t.hang_sx, t.so_luong_ton_kho,
-               ht.gia_ban, ht.don_vi_tinh
-        FROM THUOC t
-        LEFT JOIN (
-            SELECT ma_thuoc, gia_ban, don_vi_tinh
-            FROM HOA_DON_THUOC
-            WHERE (ma_thuoc, ma_hoa_don) IN (
-                SELECT ma_thuoc, MAX(ma_hoa_don) as ma_hoa_don
-                FROM HOA_DON_THUOC
-                GROUP BY ma_thuoc
-            )
-        ) ht ON t.ma_thuoc = ht.ma_thuoc
-        ORDER BY t.ten_thuoc
-        """
-        return self.db.fetch_query(query)
+        return self.catalog.get_all()
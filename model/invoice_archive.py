@@ -0,0 +1,262 @@
+"""Hot/cold tiers for invoices: closed years move out of HOA_DON into archive tables.
+
+HOA_DON, HOA_DON_THUOC and HOA_DON_TONG keep the current year and the last keep_years
+closed ones (the hot tier), so the everyday list, search and report queries only ever
+read those. Older invoices live in HOA_DON_LUU, HOA_DON_THUOC_LUU and HOA_DON_TONG_LUU:
+in the same database on MySQL, in a separate file (DB_ARCHIVE_PATH) attached as luu_tru
+on SQLite. LUU_TRU_MOC holds the cut: every invoice dated before it belongs to the archive.
+
+run() moves invoices in batches, one transaction each. A batch copies only invoices whose
+header is not in the archive yet, then deletes them from the hot tables, so a run that
+stopped half way (or crashed between the two files on SQLite) is finished by running it
+again. Closed months are rolled up into DOANH_THU_THANG before their rows leave, so the
+monthly report keeps reading them from the rollup; callers that need the detail rows ask
+with include_archive=True and read both tiers through UNION ALL.
+
+Usage: python -m model.invoice_archive status
+       python -m model.invoice_archive run [--through YEAR] [--batch N]
+"""
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+from config.db_config import load_archive_config
+from model import data_version
+from model.connection_pool import DB_ERRORS, attach_sqlite
+from model.database import Database
+from model.invoice_totals import InvoiceTotals
+from model.revenue_rollup import RevenueRollup
+from model.search_index import INVOICE, SearchIndex
+
+ALIAS = "luu_tru"
+TABLES = ("HOA_DON", "HOA_DON_THUOC", "HOA_DON_TONG")
+MARK_SQL = "CREATE TABLE IF NOT EXISTS LUU_TRU_MOC (id INT NOT NULL PRIMARY KEY, luu_den DATE NOT NULL)"
+# SQLite copies the columns only (CREATE TABLE ... AS); MySQL's CREATE TABLE ... LIKE keeps the keys
+SQLITE_INDEXES_SQL = [
+    f"CREATE UNIQUE INDEX IF NOT EXISTS {ALIAS}.HOA_DON_LUU_MA ON HOA_DON_LUU (ma_hoa_don)",
+    f"CREATE INDEX IF NOT EXISTS {ALIAS}.HOA_DON_LUU_NGAY ON HOA_DON_LUU (ngay_gio)",
+    f"CREATE INDEX IF NOT EXISTS {ALIAS}.HOA_DON_THUOC_LUU_MA ON HOA_DON_THUOC_LUU (ma_hoa_don)",
+    f"CREATE UNIQUE INDEX IF NOT EXISTS {ALIAS}.HOA_DON_TONG_LUU_MA ON HOA_DON_TONG_LUU (ma_hoa_don)",
+]
+
+
+def archive_tables(backend, sqlite_path=None, create=False):
+    """Archive table of each hot table, or None while there is no archive.
+
+    On SQLite this attaches the archive file to the database's pooled connections, from
+    their next checkout on; create=True makes the file if it is missing.
+    """
+    if backend == "mysql":
+        return {table: f"{table}_LUU" for table in TABLES}
+    path = load_archive_config()["path"]
+    if not create and not os.path.isfile(path):
+        return None
+    attach_sqlite(sqlite_path, ALIAS, path)
+    return {table: f"{ALIAS}.{table}_LUU" for table in TABLES}
+
+
+def _first_day(value):
+    if isinstance(value, str):
+        value = datetime.strptime(value[:10], "%Y-%m-%d")
+    return datetime(value.year, value.month, value.day)
+
+
+def read_cut(conn):
+    """First day still in the hot tier, read on a raw pooled connection; None if nothing was archived"""
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT luu_den FROM LUU_TRU_MOC WHERE id = 1")
+        row = cur.fetchone()
+    except DB_ERRORS:
+        return None
+    return _first_day(row[0]) if row and row[0] else None
+
+
+class InvoiceArchive:
+    """Moves closed years of invoices to the archive tables and reads them back on request"""
+    _marked = set()
+    _marked_lock = threading.Lock()
+
+    def __init__(self, db: Database, batch_size=None, keep_years=None):
+        self.db = db
+        config = load_archive_config()
+        self.batch_size = batch_size or config["batch_size"]
+        self.keep_years = config["keep_years"] if keep_years is None else keep_years
+        self.search_index = SearchIndex(db)
+        self.rollup = RevenueRollup()
+
+    def tables(self, create=False):
+        return archive_tables(self.db.backend, self.db.sqlite_path, create)
+
+    def _has_mark(self):
+        key = (self.db.backend, self.db.host, self.db.database, self.db.sqlite_path)
+        with self._marked_lock:
+            if key in self._marked:
+                return True
+            if self.db.backend == "mysql":
+                query = """
+                SELECT COUNT(*) as count FROM information_schema.tables
+                WHERE table_schema = DATABASE() AND table_name = 'LUU_TRU_MOC'
+                """
+            else:
+                query = "SELECT COUNT(*) as count FROM sqlite_master WHERE type = 'table' AND name = 'LUU_TRU_MOC'"
+            result = self.db.fetch_query(query)
+            if result and result[0]['count']:
+                self._marked.add(key)
+                return True
+            return False
+
+    def cut(self):
+        """First day still in the hot tier, or None when nothing was archived"""
+        if not self._has_mark():
+            return None
+        rows = self.db.fetch_query("SELECT luu_den FROM LUU_TRU_MOC WHERE id = 1")
+        return _first_day(rows[0]['luu_den']) if rows else None
+
+    def archived_tables(self):
+        """Archive tables once something was archived, else None (nothing to read there)"""
+        return self.tables() if self.cut() is not None else None
+
+    def detail_tables(self, year, month):
+        """(header, lines) archive tables when the month is before the cut, else None"""
+        cut = self.cut()
+        if cut is None or RevenueRollup.month_start(year, month) >= cut:
+            return None
+        tables = self.tables()
+        return (tables["HOA_DON"], tables["HOA_DON_THUOC"]) if tables else None
+
+    def archived_ids(self, ids):
+        """The ids among `ids` that belong to archived invoices"""
+        tables = self.archived_tables()
+        if not tables or not ids:
+            return []
+        placeholders = ", ".join(["%s"] * len(ids))
+        rows = self.db.fetch_query(
+            f"SELECT ma_hoa_don FROM {tables['HOA_DON']} WHERE ma_hoa_don IN ({placeholders})", tuple(ids))
+        return [row['ma_hoa_don'] for row in rows]
+
+    def ensure_tables(self):
+        """Create the archive tables (and the SQLite archive file) with the columns of the hot ones"""
+        InvoiceTotals(self.db).ensure_table()
+        tables = self.tables(create=True)
+        # Checked out after the file was attached, so this connection has it too
+        with self.db.pinned():
+            for hot, cold in tables.items():
+                if self.db.backend == "mysql":
+                    sql = f"CREATE TABLE IF NOT EXISTS {cold} LIKE {hot}"
+                else:
+                    sql = f"CREATE TABLE IF NOT EXISTS {cold} AS SELECT * FROM main.{hot} WHERE 0"
+                if not self.db.execute_query(sql):
+                    raise RuntimeError(f"Không thể tạo bảng lưu trữ {cold}")
+            for sql in (SQLITE_INDEXES_SQL if self.db.backend == "sqlite" else []) + [MARK_SQL]:
+                if not self.db.execute_query(sql):
+                    raise RuntimeError("Không thể tạo bảng lưu trữ")
+        return tables
+
+    def _set_cut(self, cut):
+        with self.db.transaction():
+            self.db.execute_query("DELETE FROM LUU_TRU_MOC WHERE id = 1")
+            if not self.db.execute_query("INSERT INTO LUU_TRU_MOC (id, luu_den) VALUES (1, %s)",
+                                         (cut.strftime("%Y-%m-%d"),)):
+                raise RuntimeError("Không thể ghi mốc lưu trữ")
+
+    def run(self, through_year=None, progress=None):
+        """Move the invoices of every year up to through_year into the archive; returns how many moved.
+
+        through_year defaults to the last year before the keep_years closed years kept hot.
+        progress(moved) is called after each batch.
+        """
+        now = datetime.now()
+        through_year = now.year - 1 - self.keep_years if through_year is None else int(through_year)
+        if through_year >= now.year:
+            raise ValueError(f"Năm {through_year} chưa kết thúc, không thể lưu trữ")
+        tables = self.ensure_tables()
+        self.search_index.ensure_table()
+        # Never moves back: invoices before an earlier, later cut stay archived
+        cut = max(datetime(through_year + 1, 1, 1), self.cut() or datetime.min)
+        with self.db.pinned() as conn:
+            # Closed months must be in the rollup before their detail rows leave
+            self.rollup.refresh(conn)
+        # Set first, so readers asking for archived data union both tiers while rows move
+        self._set_cut(cut)
+        moved = 0
+        while True:
+            count = self._move_batch(tables, cut)
+            if not count:
+                break
+            moved += count
+            if progress:
+                progress(moved)
+        if moved:
+            data_version.bump("HOA_DON")
+        return moved
+
+    def _move_batch(self, tables, cut):
+        header, lines, totals = (tables[table] for table in TABLES)
+        with self.db.transaction():
+            rows = self.db.fetch_query("""
+                SELECT ma_hoa_don FROM HOA_DON WHERE ngay_gio < %s
+                ORDER BY ngay_gio, ma_hoa_don LIMIT %s
+            """, (cut.strftime("%Y-%m-%d"), self.batch_size))
+            if not rows:
+                return 0
+            ids = tuple(row['ma_hoa_don'] for row in rows)
+            placeholders = ", ".join(["%s"] * len(ids))
+            # The header goes last: invoices a stopped run already copied are only deleted here
+            not_copied = (f"h.ma_hoa_don IN ({placeholders}) AND NOT EXISTS "
+                          f"(SELECT 1 FROM {header} a WHERE a.ma_hoa_don = h.ma_hoa_don)")
+            for hot, cold in (("HOA_DON_THUOC", lines), ("HOA_DON_TONG", totals), ("HOA_DON", header)):
+                if not self.db.execute_query(f"INSERT INTO {cold} SELECT h.* FROM {hot} h WHERE {not_copied}", ids):
+                    raise RuntimeError("Không thể chép hóa đơn sang kho lưu trữ")
+            if not self.search_index.remove_many(INVOICE, ids):
+                raise RuntimeError("Không thể cập nhật chỉ mục tìm kiếm")
+            for hot in ("HOA_DON_THUOC", "HOA_DON_TONG", "HOA_DON"):
+                if not self.db.execute_query(f"DELETE FROM {hot} WHERE ma_hoa_don IN ({placeholders})", ids):
+                    raise RuntimeError("Không thể xóa hóa đơn đã lưu trữ")
+        return len(ids)
+
+    def status(self):
+        """Cut and row counts of both tiers"""
+        tables = self.archived_tables()
+        counts = {}
+        for table in TABLES:
+            hot = self.db.fetch_query(f"SELECT COUNT(*) as count FROM {table}")
+            cold = self.db.fetch_query(f"SELECT COUNT(*) as count FROM {tables[table]}") if tables else []
+            counts[table] = (hot[0]['count'] if hot else 0, cold[0]['count'] if cold else 0)
+        return {"cut": self.cut(), "counts": counts}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else "status"
+    options = dict(zip(argv[1::2], argv[2::2]))
+    if command not in ("status", "run") or set(options) - {"--through", "--batch"}:
+        print("Usage: python -m model.invoice_archive status | run [--through YEAR] [--batch N]")
+        return 2
+    db = Database()
+    if not db.connect():
+        return 1
+    archive = InvoiceArchive(db, batch_size=int(options.get("--batch", 0)) or None)
+    if command == "run":
+        start = time.perf_counter()
+        try:
+            moved = archive.run(options.get("--through"),
+                                progress=lambda moved: print(f"\r  đã chuyển {moved} hóa đơn", end="", flush=True))
+        except ValueError as e:
+            print(e)
+            return 2
+        print(f"\nĐã chuyển {moved} hóa đơn sang kho lưu trữ trong {time.perf_counter() - start:.1f}s")
+    status = archive.status()
+    if status["cut"]:
+        print(f"Hóa đơn trước {status['cut'].strftime('%d/%m/%Y')} nằm trong kho lưu trữ")
+    else:
+        print("Chưa lưu trữ hóa đơn nào")
+    for table, (hot, cold) in status["counts"].items():
+        print(f"  {table:<14} đang dùng {hot:>10}   lưu trữ {cold:>10}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
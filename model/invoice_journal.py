@@ -0,0 +1,226 @@
+"""Local write-behind journal for invoices sold while the primary database is unreachable.
+
+Invoice.create_invoice appends to HOA_DON_CHO in a local SQLite file (WAL, synchronous
+FULL, so an acknowledged invoice survives a crash) instead of failing, and InvoiceReplayer
+flushes the journal to the primary in batches once it answers again. Replay is keyed by
+ma_hoa_don: an invoice already present with the same header is only dropped from the
+journal, so a flush interrupted after its commit can safely run again.
+
+Usage: python -m model.invoice_journal status|retry
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from config.db_config import load_journal_config
+
+
+class InvoiceJournal:
+    """Durable queue of invoices waiting for the primary database, in sale order"""
+    TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS HOA_DON_CHO (
+        thu_tu INTEGER PRIMARY KEY AUTOINCREMENT,
+        ma_hoa_don TEXT NOT NULL UNIQUE,
+        du_lieu TEXT NOT NULL,
+        tao_luc TEXT NOT NULL,
+        so_lan_thu INTEGER NOT NULL DEFAULT 0,
+        loi TEXT
+    )
+    """
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def for_path(cls, path=None):
+        """The shared journal stored at `path` (DB_JOURNAL_PATH by default)"""
+        path = os.path.abspath(path or load_journal_config()["path"])
+        with cls._instances_lock:
+            if path not in cls._instances:
+                cls._instances[path] = cls(path)
+            return cls._instances[path]
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self, create=True):
+        """The journal connection; None while the file does not exist and create is False"""
+        if self._conn is None:
+            if not create and not os.path.exists(self.path):
+                return None
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode = WAL")
+            # FULL syncs the WAL on every commit: NORMAL may lose the last invoices on power loss
+            conn.execute("PRAGMA synchronous = FULL")
+            conn.execute(self.TABLE_SQL)
+            self._conn = conn
+        return self._conn
+
+    def enqueue(self, invoice):
+        """Append one invoice (dict with ma_hoa_don, ten_khach_hang, ngay_gio, ma_nv, giam_gia, items)"""
+        with self._lock:
+            try:
+                self._connect().execute(
+                    "INSERT INTO HOA_DON_CHO (ma_hoa_don, du_lieu, tao_luc) VALUES (?, ?, ?)",
+                    (invoice['ma_hoa_don'], json.dumps(invoice, ensure_ascii=False, default=str),
+                     time.strftime('%Y-%m-%d %H:%M:%S')))
+            except sqlite3.IntegrityError:
+                raise RuntimeError(f"Hóa đơn {invoice['ma_hoa_don']} đã có trong hàng chờ đồng bộ")
+
+    def pending(self, limit):
+        """Oldest invoices not yet written, without the failed ones"""
+        with self._lock:
+            conn = self._connect(create=False)
+            if conn is None:
+                return []
+            rows = conn.execute("SELECT du_lieu FROM HOA_DON_CHO WHERE loi IS NULL ORDER BY thu_tu LIMIT ?",
+                                (int(limit),)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def remove(self, ids):
+        """Drop invoices that reached the primary"""
+        if not ids:
+            return
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("DELETE FROM HOA_DON_CHO WHERE ma_hoa_don = ?", [(ma,) for ma in ids])
+            conn.execute("COMMIT")
+
+    def mark_failed(self, failures):
+        """Park invoices the primary rejected ({ma_hoa_don: error}) until retry_failed()"""
+        if not failures:
+            return
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("UPDATE HOA_DON_CHO SET loi = ?, so_lan_thu = so_lan_thu + 1 WHERE ma_hoa_don = ?",
+                             [(error, ma) for ma, error in failures.items()])
+            conn.execute("COMMIT")
+
+    def retry_failed(self):
+        """Queue the parked invoices again; returns how many"""
+        with self._lock:
+            conn = self._connect(create=False)
+            if conn is None:
+                return 0
+            return conn.execute("UPDATE HOA_DON_CHO SET loi = NULL WHERE loi IS NOT NULL").rowcount
+
+    def failed(self):
+        """Parked invoices with their error, oldest first"""
+        with self._lock:
+            conn = self._connect(create=False)
+            if conn is None:
+                return []
+            rows = conn.execute("SELECT ma_hoa_don, so_lan_thu, loi FROM HOA_DON_CHO "
+                                "WHERE loi IS NOT NULL ORDER BY thu_tu").fetchall()
+        return [{'ma_hoa_don': ma, 'so_lan_thu': tries, 'loi': error} for ma, tries, error in rows]
+
+    def counts(self):
+        """(waiting, failed)"""
+        with self._lock:
+            conn = self._connect(create=False)
+            if conn is None:
+                return 0, 0
+            waiting, failed = conn.execute(
+                "SELECT COUNT(*) - COUNT(loi), COUNT(loi) FROM HOA_DON_CHO").fetchone()
+        return waiting, failed
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class InvoiceReplayer:
+    """Background thread that flushes the journal whenever the primary database is reachable"""
+    def __init__(self, invoice_model, journal=None, batch_size=None, interval=None):
+        config = load_journal_config()
+        self.invoice_model = invoice_model
+        self.journal = journal or invoice_model.journal
+        self.batch_size = batch_size or config["batch_size"]
+        self.interval = config["retry_seconds"] if interval is None else interval
+        # Invoices written to the primary so far; lets the UI notice a flush without a callback
+        self.written = 0
+        self.online = None
+        self.last_error = None
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="invoice-replayer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        self._stopped = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def wake(self):
+        """Try a flush now instead of at the next interval"""
+        self._wake.set()
+
+    def status(self):
+        """Backlog and connection state for the status bar (reads only the local journal)"""
+        waiting, failed = self.journal.counts()
+        return {'waiting': waiting, 'failed': failed, 'online': self.online, 'last_error': self.last_error}
+
+    def _run(self):
+        while not self._stopped:
+            try:
+                self.flush()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Error replaying invoice journal: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def flush(self):
+        """Write the journal to the primary in batches; returns the number of invoices written"""
+        if not self.journal.counts()[0]:
+            return 0
+        written = 0
+        while not self._stopped:
+            batch = self.journal.pending(self.batch_size)
+            if not batch:
+                break
+            applied, failures, reachable = self.invoice_model.replay(batch)
+            self.online = reachable
+            self.journal.remove(applied)
+            self.journal.mark_failed(failures)
+            written += len(applied)
+            if not reachable or not (applied or failures):
+                break
+        self.written += written
+        return written
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else "status"
+    if command not in ("status", "retry"):
+        print("Usage: python -m model.invoice_journal status|retry")
+        return 2
+    journal = InvoiceJournal.for_path()
+    if command == "retry":
+        print(f"Đưa lại {journal.retry_failed()} hóa đơn lỗi vào hàng chờ")
+    waiting, failed = journal.counts()
+    print(f"{journal.path}: {waiting} hóa đơn chờ đồng bộ, {failed} hóa đơn lỗi")
+    for row in journal.failed():
+        print(f"  {row['ma_hoa_don']} (thử {row['so_lan_thu']} lần): {row['loi']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""Per-invoice totals kept in HOA_DON_TONG so invoice lists never re-aggregate HOA_DON_THUOC.
+
+Usage: python -m model.invoice_totals verify|rebuild
+"""
+import sys
+import threading
+
+from model.database import Database
+
+
+class InvoiceTotals:
+    """Materialized tong_tien_hang / tong_giam_gia / thanh_tien per invoice"""
+    TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS HOA_DON_TONG (
+        ma_hoa_don VARCHAR(50) NOT NULL PRIMARY KEY,
+        tong_tien_hang DECIMAL(18,2) NOT NULL DEFAULT 0,
+        tong_giam_gia DECIMAL(18,2) NOT NULL DEFAULT 0,
+        thanh_tien DECIMAL(18,2) NOT NULL DEFAULT 0,
+        FOREIGN KEY (ma_hoa_don) REFERENCES HOA_DON(ma_hoa_don)
+    )
+    """
+    # Same formulas the list queries used to compute with GROUP BY
+    SUMS_SQL = """
+        COALESCE(SUM(ht.so_luong * ht.gia_ban), 0),
+        COALESCE(SUM(ht.so_luong * ht.gia_ban * ht.giam_gia / 100.0), 0),
+        COALESCE(SUM(ht.so_luong * ht.gia_ban * (1 - ht.giam_gia / 100.0)), 0)
+    """
+
+    _ensured = set()
+    _ensure_lock = threading.Lock()
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    def _table_exists(self):
+        if self.db.backend == "mysql":
+            query = """
+            SELECT COUNT(*) as count FROM information_schema.tables
+            WHERE table_schema = DATABASE() AND table_name = 'HOA_DON_TONG'
+            """
+        else:
+            query = "SELECT COUNT(*) as count FROM sqlite_master WHERE type = 'table' AND name = 'HOA_DON_TONG'"
+        result = self.db.fetch_query(query)
+        return bool(result and result[0]['count'])
+
+    def ensure_table(self):
+        """Create HOA_DON_TONG once per process, back-filling it when it is new"""
+        key = (self.db.backend, self.db.host, self.db.database, self.db.sqlite_path)
+        with self._ensure_lock:
+            if key in self._ensured:
+                return True
+            existed = self._table_exists()
+            if not existed:
+                if not self.db.execute_query(self.TABLE_SQL):
+                    return False
+                self.rebuild()
+            self._ensured.add(key)
+            return True
+
+    def add(self, ma_hoa_don):
+        """Store the totals of one invoice from its detail rows (call inside the invoice transaction)"""
+        query = f"""
+        INSERT INTO HOA_DON_TONG (ma_hoa_don, tong_tien_hang, tong_giam_gia, thanh_tien)
+        SELECT %s, {self.SUMS_SQL}
+        FROM HOA_DON_THUOC ht
+        WHERE ht.ma_hoa_don = %s
+        """
+        return self.db.execute_query(query, (ma_hoa_don, ma_hoa_don))
+
+    def add_many(self, ids):
+        """Store the totals of several invoices in one statement (call inside their transaction)"""
+        placeholders = ", ".join(["%s"] * len(ids))
+        query = f"""
+        INSERT INTO HOA_DON_TONG (ma_hoa_don, tong_tien_hang, tong_giam_gia, thanh_tien)
+        SELECT h.ma_hoa_don, {self.SUMS_SQL}
+        FROM HOA_DON h
+        LEFT JOIN HOA_DON_THUOC ht ON h.ma_hoa_don = ht.ma_hoa_don
+        WHERE h.ma_hoa_don IN ({placeholders})
+        GROUP BY h.ma_hoa_don
+        """
+        return self.db.execute_query(query, tuple(ids))
+
+    def remove(self, ma_hoa_don):
+        return self.db.execute_query("DELETE FROM HOA_DON_TONG WHERE ma_hoa_don = %s", (ma_hoa_don,))
+
+    def rebuild(self):
+        """Recompute every row from HOA_DON_THUOC"""
+        query = f"""
+        INSERT INTO HOA_DON_TONG (ma_hoa_don, tong_tien_hang, tong_giam_gia, thanh_tien)
+        SELECT h.ma_hoa_don, {self.SUMS_SQL}
+        FROM HOA_DON h
+        LEFT JOIN HOA_DON_THUOC ht ON h.ma_hoa_don = ht.ma_hoa_don
+        GROUP BY h.ma_hoa_don
+        """
+        with self.db.transaction():
+            if not self.db.execute_query("DELETE FROM HOA_DON_TONG"):
+                raise RuntimeError("Không thể xóa bảng tổng hóa đơn")
+            cursor = self.db.execute_query(query)
+            if not cursor:
+                raise RuntimeError("Không thể tính lại bảng tổng hóa đơn")
+        return cursor.rowcount
+
+    def verify(self):
+        """Invoices whose stored totals are missing or differ from their detail rows"""
+        query = """
+        SELECT h.ma_hoa_don,
+               t.thanh_tien as thanh_tien_luu,
+               COALESCE(d.thanh_tien, 0) as thanh_tien_thuc
+        FROM HOA_DON h
+        LEFT JOIN (
+            SELECT ht.ma_hoa_don,
+                   COALESCE(SUM(ht.so_luong * ht.gia_ban), 0) as tong_tien_hang,
+                   COALESCE(SUM(ht.so_luong * ht.gia_ban * ht.giam_gia / 100.0), 0) as tong_giam_gia,
+                   COALESCE(SUM(ht.so_luong * ht.gia_ban * (1 - ht.giam_gia / 100.0)), 0) as thanh_tien
+            FROM HOA_DON_THUOC ht
+            GROUP BY ht.ma_hoa_don
+        ) d ON d.ma_hoa_don = h.ma_hoa_don
+        LEFT JOIN HOA_DON_TONG t ON t.ma_hoa_don = h.ma_hoa_don
+        WHERE t.ma_hoa_don IS NULL
+           OR ABS(t.tong_tien_hang - COALESCE(d.tong_tien_hang, 0)) > 0.01
+           OR ABS(t.tong_giam_gia - COALESCE(d.tong_giam_gia, 0)) > 0.01
+           OR ABS(t.thanh_tien - COALESCE(d.thanh_tien, 0)) > 0.01
+        ORDER BY h.ma_hoa_don
+        """
+        return self.db.fetch_query(query)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else "verify"
+    if command not in ("verify", "rebuild"):
+        print("Usage: python -m model.invoice_totals verify|rebuild")
+        return 2
+    db = Database()
+    if not db.connect():
+        return 1
+    totals = InvoiceTotals(db)
+    totals.ensure_table()
+    if command == "rebuild":
+        print(f"Đã tính lại tổng cho {totals.rebuild()} hóa đơn")
+        return 0
+    mismatches = totals.verify()
+    for row in mismatches:
+        print(f"{row['ma_hoa_don']}: lưu={row['thanh_tien_luu']} thực tế={row['thanh_tien_thuc']}")
+    print(f"{len(mismatches)} hóa đơn lệch tổng")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
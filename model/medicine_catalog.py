@@ -0,0 +1,89 @@
+import threading
+import time
+
+from model.database import Database
+
+
+class MedicineCatalog:
+    """Process-wide cache of THUOC with the latest selling price and unit of each medicine.
+
+    Loaded once per database and reloaded after TTL seconds; create_invoice pushes the
+    lines it writes with record_sale(), so the invoice form normally opens without a query.
+    """
+    TTL = 300
+
+    # Latest HOA_DON_THUOC line per medicine, found through idx_hoa_don_thuoc_thuoc_hd
+    LOAD_SQL = """
+    SELECT t.ma_thuoc, t.ten_thuoc, t.hang_sx, t.so_luong_ton_kho,
+           ht.gia_ban, ht.don_vi_tinh
+    FROM THUOC t
+    LEFT JOIN (
+        SELECT ma_thuoc, MAX(ma_hoa_don) as ma_hoa_don
+        FROM HOA_DON_THUOC
+        GROUP BY ma_thuoc
+    ) moi_nhat ON moi_nhat.ma_thuoc = t.ma_thuoc
+    LEFT JOIN HOA_DON_THUOC ht
+        ON ht.ma_thuoc = moi_nhat.ma_thuoc AND ht.ma_hoa_don = moi_nhat.ma_hoa_don
+    ORDER BY t.ten_thuoc
+    """
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def for_db(cls, db: Database):
+        """The shared catalog of the database `db` points at"""
+        key = (db.backend, db.host, db.database, db.sqlite_path)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(db)
+            return cls._instances[key]
+
+    def __init__(self, db: Database, ttl=None):
+        self.db = db
+        self.ttl = self.TTL if ttl is None else ttl
+        self._lock = threading.Lock()
+        self._by_id = {}
+        self._by_name = []
+        self._loaded_at = None
+
+    def _stale(self):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+
+    def _load(self):
+        rows = self.db.fetch_query(self.LOAD_SQL)
+        if not rows:
+            # A failed load is retried on next access; a failed reload keeps serving the previous catalog
+            return
+        self._by_id = {row['ma_thuoc']: row for row in rows}
+        self._by_name = sorted(rows, key=lambda row: row['ten_thuoc'] or '')
+        self._loaded_at = time.monotonic()
+
+    def get_all(self):
+        """Every medicine ordered by name (copies, safe to modify)"""
+        with self._lock:
+            if self._stale():
+                self._load()
+            return [dict(row) for row in self._by_name]
+
+    def get(self, ma_thuoc):
+        with self._lock:
+            if self._stale():
+                self._load()
+            row = self._by_id.get(ma_thuoc)
+            return dict(row) if row else None
+
+    def record_sale(self, items):
+        """Apply freshly written invoice lines: latest price and unit, stock taken out"""
+        with self._lock:
+            for item in items:
+                row = self._by_id.get(item['ma_thuoc'])
+                if row is not None:
+                    row['gia_ban'] = item['don_gia']
+                    row['don_vi_tinh'] = item['don_vi_tinh']
+                    row['so_luong_ton_kho'] = (row['so_luong_ton_kho'] or 0) - int(item['so_luong'])
+
+    def invalidate(self):
+        """Reload on next access (after deleting invoices or editing THUOC)"""
+        with self._lock:
+            self._loaded_at = None
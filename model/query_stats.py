@@ -0,0 +1,190 @@
+"""Per-statement timing for every query the models run.
+
+Database wraps each statement in track(); ReportModel and the rollup, which use pooled
+connections directly, do the same. Statements are grouped by their normalized SQL
+(literals and placeholder lists folded), each group keeping a rolling window of durations
+for p50/p95/p99. Statements slower than DB_SLOW_QUERY_MS go to a rotating log file.
+"""
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from functools import lru_cache
+from logging.handlers import RotatingFileHandler
+
+from config.db_config import load_query_log_config
+
+# Durations kept per statement for the percentiles
+WINDOW = 1024
+
+_SKIP_FILES = (os.path.join("model", "database.py"), os.path.join("model", "query_stats.py"), "contextlib.py")
+
+
+@lru_cache(maxsize=2048)
+def normalize_sql(sql):
+    """One shape per statement: literals and placeholders become ?, IN lists collapse"""
+    sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    sql = re.sub(r"\b\d+(?:\.\d+)?\b", "?", sql)
+    sql = sql.replace("%s", "?")
+    sql = re.sub(r"\(\s*\?(?:\s*,\s*\?)+\s*\)", "(...)", sql)
+    return re.sub(r"\s+", " ", sql).strip()
+
+
+def _caller():
+    """'Class.method' (or 'module.function') of the nearest frame outside the database layer"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if not filename.endswith(_SKIP_FILES):
+            owner = frame.f_locals.get('self')
+            name = frame.f_code.co_name
+            if owner is not None:
+                return f"{type(owner).__name__}.{name}"
+            return f"{frame.f_globals.get('__name__', '?')}.{name}"
+        frame = frame.f_back
+    return "?"
+
+
+class _Statement:
+    __slots__ = ("sql", "count", "errors", "total_ms", "max_ms", "rows", "affected", "samples", "callers")
+
+    def __init__(self, sql):
+        self.sql = sql
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.affected = 0
+        self.samples = deque(maxlen=WINDOW)
+        self.callers = Counter()
+
+
+def _percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class QueryStats:
+    """Process-wide statement histogram and slow-query log"""
+    def __init__(self, config=None):
+        self.config = config or load_query_log_config()
+        self._lock = threading.Lock()
+        self._statements = {}
+        self._slow_log = None
+
+    def _logger(self):
+        if self._slow_log is None:
+            logger = logging.getLogger("query_stats.slow")
+            logger.propagate = False
+            if not logger.handlers:
+                try:
+                    handler = RotatingFileHandler(self.config["log_path"], maxBytes=self.config["max_bytes"],
+                                                  backupCount=self.config["backups"], encoding="utf-8")
+                except OSError as e:
+                    print(f"Error opening slow query log: {e}")
+                    handler = logging.NullHandler()
+                handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+                logger.addHandler(handler)
+                logger.setLevel(logging.INFO)
+            self._slow_log = logger
+        return self._slow_log
+
+    def record(self, sql, elapsed_ms, rows=None, affected=None, caller=None, error=False):
+        key = normalize_sql(sql)
+        with self._lock:
+            stat = self._statements.get(key)
+            if stat is None:
+                stat = self._statements[key] = _Statement(key)
+            stat.count += 1
+            stat.errors += bool(error)
+            stat.total_ms += elapsed_ms
+            stat.max_ms = max(stat.max_ms, elapsed_ms)
+            stat.rows += rows or 0
+            stat.affected += max(affected or 0, 0)
+            stat.samples.append(elapsed_ms)
+            stat.callers[caller or "?"] += 1
+        if elapsed_ms >= self.config["slow_ms"]:
+            self._logger().info("%.1fms caller=%s rows=%s affected=%s%s sql=%s", elapsed_ms, caller,
+                                rows, affected, " error" if error else "", key)
+
+    def snapshot(self, top=None):
+        """Statements by total time spent, with count, percentiles, rows and callers"""
+        with self._lock:
+            stats = [(s.sql, s.count, s.errors, s.total_ms, s.max_ms, s.rows, s.affected,
+                      sorted(s.samples), s.callers.most_common(3)) for s in self._statements.values()]
+        result = [{
+            'sql': sql,
+            'count': count,
+            'errors': errors,
+            'total_ms': round(total_ms, 3),
+            'p50_ms': round(_percentile(samples, 0.50), 3),
+            'p95_ms': round(_percentile(samples, 0.95), 3),
+            'p99_ms': round(_percentile(samples, 0.99), 3),
+            'max_ms': round(max_ms, 3),
+            'rows': rows,
+            'affected': affected,
+            'callers': dict(callers),
+        } for sql, count, errors, total_ms, max_ms, rows, affected, samples, callers in stats]
+        result.sort(key=lambda s: s['total_ms'], reverse=True)
+        return result[:top] if top else result
+
+    def reset(self):
+        with self._lock:
+            self._statements.clear()
+
+
+class _Tracker:
+    __slots__ = ("rows", "affected")
+
+    def __init__(self):
+        self.rows = None
+        self.affected = None
+
+
+_stats = None
+_stats_lock = threading.Lock()
+
+
+def get_query_stats():
+    global _stats
+    with _stats_lock:
+        if _stats is None:
+            _stats = QueryStats()
+        return _stats
+
+
+@contextmanager
+def track(sql):
+    """Time the statement run inside the block; set .rows / .affected on the yielded tracker"""
+    tracker = _Tracker()
+    caller = _caller()
+    start = time.perf_counter()
+    error = False
+    try:
+        yield tracker
+    except BaseException:
+        error = True
+        raise
+    finally:
+        get_query_stats().record(sql, (time.perf_counter() - start) * 1000, tracker.rows, tracker.affected,
+                                 caller, error)
+
+
+def snapshot(top=None):
+    return get_query_stats().snapshot(top)
+
+
+def format_snapshot(top=20):
+    """Plain-text table of the most expensive statements"""
+    lines = [f"{'lần':>6} {'tổng ms':>10} {'p50':>8} {'p95':>8} {'p99':>8}  nơi gọi / câu lệnh"]
+    for s in snapshot(top):
+        callers = ", ".join(s['callers'])
+        lines.append(f"{s['count']:>6} {s['total_ms']:>10.1f} {s['p50_ms']:>8.2f} {s['p95_ms']:>8.2f} "
+                     f"{s['p99_ms']:>8.2f}  {callers}\n{'':>45}{s['sql'][:160]}")
+    return "\n".join(lines)
@@ -0,0 +1,198 @@
+"""Read/write routing: reports and searches read from a replica while it keeps up.
+
+DB_REPLICA_DSN names the replica (config.db_config.load_replica_config). At most every
+check_seconds the router measures how far it is behind the primary: Seconds_Behind_Source
+from SHOW REPLICA STATUS on MySQL, the age of the last copy on a SQLite stand-in (stamped
+in BAN_SAO_MOC by `python -m model.replica sync`). A replica that is down, has stopped
+replicating or is more than max_lag seconds behind sends reads back to the primary.
+Searches also stay on the primary after a write made by this process more recently than
+the replica's lag, so a user always finds what they just saved; reports accept up to
+max_lag of staleness. Writes never go to the replica.
+
+Usage: python -m model.replica status
+       python -m model.replica sync [--every SECONDS]   (SQLite stand-in only)
+"""
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from config.db_config import load_backend_config, load_replica_config
+from model import data_version
+from model.connection_pool import DB_ERRORS, get_pool
+
+MARK_TABLE_SQL = "CREATE TABLE IF NOT EXISTS BAN_SAO_MOC (id INTEGER PRIMARY KEY, sao_luc REAL NOT NULL)"
+
+
+class ReplicaRouter:
+    """Chooses the pool a read goes to: the replica when it is usable, else None (the primary)"""
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get(cls):
+        """The process-wide router, built from the environment on first use"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls(load_replica_config())
+            return cls._instance
+
+    @classmethod
+    def reset(cls):
+        """Forget the process-wide router, so the next get() reads the environment again"""
+        with cls._instance_lock:
+            cls._instance = None
+
+    def __init__(self, config):
+        self.config = config
+        self.max_lag = config["max_lag"] if config else 0
+        self.check_seconds = config["check_seconds"] if config else 0
+        # Seconds behind at the last check; None while down or not replicating
+        self.lag = None
+        self.error = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        return self.config["backend"] if self.config else None
+
+    def pool(self):
+        config = self.config
+        return get_pool(config["backend"], config["mysql"], config["sqlite_path"])
+
+    @property
+    def usable(self):
+        return self.lag is not None and self.lag <= self.max_lag
+
+    def read_pool(self, backend, own_writes=False):
+        """Replica pool if a read on `backend` may go there now, else None.
+
+        own_writes: the read must see this process's latest writes.
+        """
+        if self.config is None or self.config["backend"] != backend:
+            return None
+        self._check()
+        if not self.usable:
+            return None
+        if own_writes:
+            # What this process wrote within the lag may not be there yet
+            last = data_version.last_write()
+            if last is not None and time.monotonic() - last <= self.lag + 1:
+                return None
+        return self.pool()
+
+    def mark_failed(self, error):
+        """A read on the replica failed to connect: use the primary until the next check"""
+        with self._lock:
+            self._checked_at = time.monotonic()
+        self._set(None, error)
+
+    def _check(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.check_seconds:
+                return
+            # Other threads keep the previous answer while this one measures
+            self._checked_at = now
+        lag, error = None, None
+        try:
+            if self.backend == "sqlite" and not os.path.isfile(self.config["sqlite_path"]):
+                # Connecting would create an empty file in its place
+                raise RuntimeError(f"Không tìm thấy {self.config['sqlite_path']}")
+            conn = self.pool().acquire(timeout=1)
+            try:
+                lag = self._measure(conn)
+            finally:
+                conn.close()
+        except (RuntimeError,) + DB_ERRORS as e:
+            error = e
+        self._set(lag, error)
+
+    def _measure(self, conn):
+        """Seconds the replica is behind the primary"""
+        cur = conn.cursor(dictionary=True)
+        if self.backend == "sqlite":
+            cur.execute("SELECT sao_luc FROM BAN_SAO_MOC WHERE id = 1")
+            row = cur.fetchone()
+            if row is None:
+                raise RuntimeError("Bản sao chưa được đồng bộ lần nào")
+            return max(time.time() - row['sao_luc'], 0.0)
+        try:
+            cur.execute("SHOW REPLICA STATUS")
+        except DB_ERRORS:
+            # Before MySQL 8.0.22
+            cur = conn.cursor(dictionary=True)
+            cur.execute("SHOW SLAVE STATUS")
+        channels = cur.fetchall()
+        # A server that is not a replica is taken as kept current by other means
+        lags = [row.get('Seconds_Behind_Source', row.get('Seconds_Behind_Master')) for row in channels]
+        if None in lags:
+            raise RuntimeError("Bản sao đã dừng sao chép")
+        return float(max(lags, default=0))
+
+    def _set(self, lag, error):
+        was_usable = self.usable
+        self.lag, self.error = lag, error
+        if was_usable and not self.usable:
+            reason = error or f"trễ {lag:.0f} giây"
+            print(f"Bản sao đọc không dùng được ({reason}), đọc từ máy chủ chính")
+        elif self.usable and not was_usable:
+            print(f"Bản sao đọc hoạt động (trễ {lag:.0f} giây)")
+
+    def status(self):
+        if self.config is None:
+            return {"configured": False}
+        self._check()
+        return {"configured": True, "backend": self.backend, "usable": self.usable, "lag": self.lag,
+                "max_lag": self.max_lag, "error": str(self.error) if self.error else None}
+
+
+def sync(primary_path, replica_path):
+    """Copy the primary SQLite file onto the stand-in replica and stamp when it was taken"""
+    taken = time.time()
+    source = sqlite3.connect(primary_path)
+    target = sqlite3.connect(replica_path, timeout=30)
+    try:
+        source.backup(target)
+        target.execute(MARK_TABLE_SQL)
+        target.execute("INSERT OR REPLACE INTO BAN_SAO_MOC (id, sao_luc) VALUES (1, ?)", (taken,))
+        target.commit()
+    finally:
+        target.close()
+        source.close()
+    return taken
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else "status"
+    if command not in ("status", "sync") or (argv[1:] and argv[1:2] != ["--every"]):
+        print("Usage: python -m model.replica status | sync [--every SECONDS]")
+        return 2
+    router = ReplicaRouter.get()
+    if router.config is None:
+        print("Chưa cấu hình bản sao đọc (DB_REPLICA_DSN)")
+        return 1
+    if command == "sync":
+        primary = load_backend_config()
+        if router.backend != "sqlite" or primary["backend"] != "sqlite":
+            print("Chỉ đồng bộ được bản sao SQLite; MySQL tự sao chép từ máy chủ chính")
+            return 1
+        every = float(argv[2]) if len(argv) > 2 else None
+        while True:
+            sync(primary["sqlite_path"], router.config["sqlite_path"])
+            print(f"Đã đồng bộ {primary['sqlite_path']} -> {router.config['sqlite_path']}")
+            if every is None:
+                break
+            time.sleep(every)
+    status = router.status()
+    lag = "không rõ" if status["lag"] is None else f"{status['lag']:.1f} giây"
+    state = "dùng được" if status["usable"] else f"không dùng ({status['error'] or 'trễ quá'})"
+    print(f"Bản sao {status['backend']}: trễ {lag} (tối đa {status['max_lag']:g}), {state}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,13 @@
 import sqlite3
-from datetime import datetime
+from datetime import date, datetime
+from model.connection_pool import DB_ERRORS, get_pool
+from model.indexes import ensure_indexes, explain
+from model.invoice_archive import archive_tables, read_cut
+from model.revenue_rollup import RevenueRollup
+from model.schema_registry import SchemaRegistry
+from model.query_stats import track
+from model.replica import ReplicaRouter
+from model.report_cache import ReportCache
 try:
     import mysql.connector
     from mysql.connector import errors as mysql_errors
@@ -7,17 +15,29 @@ except ImportError:
     mysql = None
 
 class ReportModel:
+    # (exclusive upper bound in months, label); the last group takes everything above
+    TENURE_GROUPS = [(12, "Dưới 1 năm"), (48, "1-3 năm"), (84, "4-6 năm"), (None, "Trên 6 năm")]
+
     def __init__(self, db_path="database.db", backend="sqlite", mysql_config=None):
         self.db_path = db_path
         self.backend = "mysql" if (backend == "mysql" and mysql and mysql_config) else "sqlite"
         self.mysql_config = mysql_config or {}
         self._invoice_id_col = None
         self._invoice_date_col = None
+        self._detail_invoice_fk = None
+        self._rollup = None
+        # Shared with every ReportModel on the same database, so a new model costs no introspection
+        database = (self.backend, self.mysql_config.get("host"), self.mysql_config.get("database"),
+                    None if self.backend == "mysql" else db_path)
+        self._schema = SchemaRegistry.for_database(*database)
+        # Also shared, so re-opening the report tab or clicking "Xem" again is served from memory
+        self.cache = ReportCache.for_database(*database)
 
     def _get_conn(self):
+        pool = get_pool(self.backend, self.mysql_config, self.db_path)
         if self.backend == "mysql":
             try:
-                return mysql.connector.connect(**self.mysql_config)
+                return pool.acquire()
             except mysql_errors.ProgrammingError as e:
                 raise RuntimeError(
                     f"Lỗi đăng nhập MySQL (1045): {e}. Kiểm tra user/password, hoặc tạo user riêng:\n"
@@ -28,242 +48,401 @@ class ReportModel:
                 raise RuntimeError(f"Lỗi kết nối MySQL: {e}")
             except mysql_errors.Error as e:
                 raise RuntimeError(f"Lỗi MySQL: {e}")
-        return sqlite3.connect(self.db_path)
+        return pool.acquire()
 
-    def _detect_invoice_schema(self, conn):
-        if self._invoice_id_col and self._invoice_date_col:
-            return
-        try:
-            if self.backend == "mysql":
-                cur = conn.cursor()
-                cur.execute("DESCRIBE HOA_DON")
-                cols = [r[0] for r in cur.fetchall()]
-            else:
-                cur = conn.execute("PRAGMA table_info(HOA_DON)")
-                cols = [r[1] for r in cur.fetchall()]
-        except Exception:
-            cols = []
-        # ID column
-        self._invoice_id_col = "ma_hd" if "ma_hd" in cols else ("ma_hoa_don" if "ma_hoa_don" in cols else None)
-        self._invoice_date_col = "ngay_lap" if "ngay_lap" in cols else ("ngay_gio" if "ngay_gio" in cols else None)
-        if not self._invoice_id_col or not self._invoice_date_col:
-            raise RuntimeError("Không xác định được schema bảng HOA_DON (cột mã hoặc ngày).")
+    def _read_conn(self):
+        """(connection, on_replica) for a report query: the read replica while it keeps up, else the primary"""
+        router = ReplicaRouter.get()
+        pool = router.read_pool(self.backend)
+        if pool is not None:
+            try:
+                return pool.acquire(timeout=1), True
+            except (RuntimeError,) + DB_ERRORS as e:
+                router.mark_failed(e)
+        return self._get_conn(), False
 
-    def _detect_detail_schema(self, conn):
-        if hasattr(self, "_detail_invoice_fk"):
-            return
-        try:
-            if self.backend == "mysql":
-                cur = conn.cursor()
-                cur.execute("DESCRIBE HOA_DON_THUOC")
-                cols = [r[0] for r in cur.fetchall()]
-            else:
-                cur = conn.execute("PRAGMA table_info(HOA_DON_THUOC)")
-                cols = [r[1] for r in cur.fetchall()]
-        except Exception:
-            cols = []
-        self._detail_invoice_fk = "ma_hd" if "ma_hd" in cols else ("ma_hoa_don" if "ma_hoa_don" in cols else None)
-        if not self._detail_invoice_fk:
+    def _revenue_conn(self, tables):
+        """_read_conn(), except that a SQLite archive file is attached on the primary only"""
+        if tables and self.backend == "sqlite":
+            return self._get_conn(), False
+        return self._read_conn()
+
+    def _archive_for(self, conn, tables, month, year):
+        """(header, lines) archive tables to read besides the hot ones when the month was archived"""
+        if not tables:
+            return None
+        cut = read_cut(conn)
+        if cut is None or RevenueRollup.month_start(year, month) >= cut:
+            return None
+        return tables["HOA_DON"], tables["HOA_DON_THUOC"]
+
+    def _detect_schema(self, conn):
+        """Resolve the HOA_DON / HOA_DON_THUOC column names through the shared schema registry"""
+        registry = self._schema
+        id_col = registry.resolve(conn, "HOA_DON", ("ma_hd", "ma_hoa_don"))
+        date_col = registry.resolve(conn, "HOA_DON", ("ngay_lap", "ngay_gio"))
+        if not id_col or not date_col:
+            raise RuntimeError("Không xác định được schema bảng HOA_DON (cột mã hoặc ngày).")
+        detail_fk = registry.resolve(conn, "HOA_DON_THUOC", ("ma_hd", "ma_hoa_don"))
+        if not detail_fk:
             raise RuntimeError("Không xác định được khóa ngoại hóa đơn trong HOA_DON_THUOC.")
+        if (id_col, date_col, detail_fk) != (self._invoice_id_col, self._invoice_date_col, self._detail_invoice_fk):
+            self._invoice_id_col, self._invoice_date_col, self._detail_invoice_fk = id_col, date_col, detail_fk
+            # The rollup builds its SQL from these names
+            self._rollup = None
+
+    def cache_stats(self):
+        """Hits, misses and entries of the report cache shared by this database"""
+        return self.cache.stats()
 
     def get_positions(self):
+        positions = self.cache.get("positions", (), ("NHAN_VIEN",), self._fetch_positions)
+        return [] if positions is None else positions
+
+    def _fetch_positions(self):
         q = "SELECT DISTINCT chuc_vu FROM NHAN_VIEN WHERE chuc_vu IS NOT NULL AND chuc_vu<>'' ORDER BY chuc_vu"
         if self.backend == "mysql":
-            conn = self._get_conn()
+            conn = self._read_conn()[0]
             try:
                 cur = conn.cursor()
-                cur.execute(q)
-                return [r[0] for r in cur.fetchall()]
+                with track(q) as stat:
+                    cur.execute(q)
+                    rows = cur.fetchall()
+                    stat.rows = len(rows)
+                return [r[0] for r in rows]
             except Exception:
-                return []
+                return None
             finally:
                 conn.close()
         else:
-            with self._get_conn() as conn:
+            with self._read_conn()[0] as conn:
                 try:
-                    return [r[0] for r in conn.execute(q).fetchall()]
+                    with track(q) as stat:
+                        rows = conn.execute(q).fetchall()
+                        stat.rows = len(rows)
+                    return [r[0] for r in rows]
                 except Exception:
-                    return []
+                    return None
 
     def get_seniority(self, position=None):
-        if self.backend == "mysql":
-            conn = self._get_conn()
-            try:
-                cur = conn.cursor(dictionary=True)
-                sql = """
-                    SELECT
-                        nv.ma_nv,
-                        nv.ho_va_ten,
-                        nv.chuc_vu,
-                        nv.ngay_vao_lam,
-                        CONCAT(
-                            TIMESTAMPDIFF(YEAR, nv.ngay_vao_lam, CURDATE()), ' năm ',
-                            MOD(TIMESTAMPDIFF(MONTH, nv.ngay_vao_lam, CURDATE()),12), ' tháng'
-                        ) AS tham_nien,
-                        CASE
-                            WHEN TIMESTAMPDIFF(YEAR, nv.ngay_vao_lam, CURDATE()) < 1 THEN 'Dưới 1 năm'
-                            WHEN TIMESTAMPDIFF(YEAR, nv.ngay_vao_lam, CURDATE()) BETWEEN 1 AND 3 THEN '1-3 năm'
-                            WHEN TIMESTAMPDIFF(YEAR, nv.ngay_vao_lam, CURDATE()) BETWEEN 4 AND 6 THEN '4-6 năm'
-                            ELSE 'Trên 6 năm'
-                        END AS nhom_tham_nien
-                    FROM NHAN_VIEN nv
-                """
-                params = []
-                if position:
-                    sql += " WHERE nv.chuc_vu = %s"
-                    params.append(position)
-                sql += " ORDER BY nv.ngay_vao_lam"
-                cur.execute(sql, tuple(params))
-                rows = cur.fetchall() or []
-                for r in rows:
-                    dt = str(r.get("ngay_vao_lam", ""))
-                    try:
-                        d = datetime.strptime(dt, "%Y-%m-%d")
-                        r["ngay_vao_lam"] = d.strftime("%d/%m/%Y")
-                    except ValueError:
-                        pass
-                return rows
-            except Exception:
-                return []
-            finally:
+        # Tenure counts up to today, so a new day is a new entry
+        rows = self.cache.get("seniority", (position, date.today()), ("NHAN_VIEN",),
+                              lambda: self._fetch_seniority(position))
+        return [] if rows is None else rows
+
+    def _fetch_seniority(self, position):
+        batches = self.iter_seniority(position)
+        try:
+            return [row for batch in batches for row in batch]
+        except Exception:
+            return None
+
+    def _stream(self, conn, sql, params, batch_size):
+        """Rows of sql in batches of batch_size; MySQL sends them unbuffered from the server"""
+        cur = conn.cursor()
+        with track(sql):
+            cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+
+    def _streaming(self, produce, tables=None):
+        """Run produce(conn, on_replica) on a pooled connection for as long as the consumer iterates"""
+        # Acquired here, not on first next(), so connection errors surface to the caller
+        conn, replica = self._revenue_conn(tables)
+        return self._consume(conn, replica, produce)
+
+    def _consume(self, conn, replica, produce):
+        finished = False
+        try:
+            yield from produce(conn, replica)
+            finished = True
+        finally:
+            # An abandoned MySQL stream still has unread rows; don't hand it back to the pool
+            if finished or self.backend != "mysql":
                 conn.close()
-        # SQLite path
-        base = "SELECT ma_nv, ho_va_ten, chuc_vu, ngay_vao_lam FROM NHAN_VIEN"
-        params = []
-        if position:
-            base += " WHERE chuc_vu = ?"
-            params.append(position)
-        base += " ORDER BY ngay_vao_lam"
-        rows = []
-        with self._get_conn() as conn:
-            try:
-                for ma_nv, ho_va_ten, chuc_vu, ngay_vao_lam in conn.execute(base, params):
-                    tenure_years, tenure_months = self._calc_tenure(ngay_vao_lam)
-                    group = self._tenure_group(tenure_years, tenure_months)
+            else:
+                conn.discard()
+
+    def _tenure_group_sql(self, months):
+        bounds = " ".join(f"WHEN {months} < {bound} THEN '{label}'" for bound, label in self.TENURE_GROUPS[:-1])
+        return f"CASE {bounds} ELSE '{self.TENURE_GROUPS[-1][1]}' END"
+
+    def _seniority_sql(self, position=None):
+        """Staff with tenure (whole months, day of month counted) and group computed by the database.
+
+        Columns: ma_nv, ho_va_ten, chuc_vu, ngay_vao_lam, tham_nien, nhom_tham_nien, ngay (sort key).
+        """
+        ph = self._placeholder()
+        where = f" WHERE nv.chuc_vu = {ph}" if position else ""
+        params = (position,) if position else ()
+        if self.backend == "mysql":
+            source = f"""(
+                SELECT nv.ma_nv, nv.ho_va_ten, nv.chuc_vu, nv.ngay_vao_lam, nv.ngay_vao_lam AS ngay,
+                       GREATEST(COALESCE(TIMESTAMPDIFF(MONTH, nv.ngay_vao_lam, CURDATE()), 0), 0) AS thang
+                FROM NHAN_VIEN nv{where}
+            ) s"""
+            prefix = ""
+            ngay_vao_lam = "s.ngay_vao_lam"
+            tham_nien = "CONCAT(s.thang DIV 12, ' năm ', s.thang MOD 12, ' tháng')"
+        else:
+            # ngay_vao_lam is TEXT, either yyyy-mm-dd or dd/mm/yyyy; julianday() rejects anything else
+            ngay = ("CASE WHEN substr(nv.ngay_vao_lam, 3, 1) = '/' "
+                    "THEN substr(nv.ngay_vao_lam, 7, 4) || '-' || substr(nv.ngay_vao_lam, 4, 2) || '-' "
+                    "|| substr(nv.ngay_vao_lam, 1, 2) "
+                    "ELSE substr(nv.ngay_vao_lam, 1, 10) END")
+            # Calendar months like TIMESTAMPDIFF(MONTH): one less while today's day is before the start day
+            today = datetime.now()
+            thang = (f"{today.year * 12 + today.month} "
+                     "- (CAST(substr(d.ngay, 1, 4) AS INTEGER) * 12 + CAST(substr(d.ngay, 6, 2) AS INTEGER)) "
+                     f"- ({today.day} < CAST(substr(d.ngay, 9, 2) AS INTEGER))")
+            # Materialized so each expression runs once per row instead of once per reference
+            materialized = "MATERIALIZED " if sqlite3.sqlite_version_info >= (3, 35) else ""
+            prefix = f"""
+                WITH d AS {materialized}(
+                    SELECT nv.ma_nv, nv.ho_va_ten, nv.chuc_vu, nv.ngay_vao_lam, {ngay} AS ngay
+                    FROM NHAN_VIEN nv{where}
+                ), s AS {materialized}(
+                    SELECT d.*, julianday(d.ngay) IS NOT NULL AS hop_le,
+                           CASE WHEN julianday(d.ngay) IS NULL THEN 0 ELSE MAX({thang}, 0) END AS thang
+                    FROM d
+                )
+            """
+            source = "s"
+            ngay_vao_lam = ("CASE WHEN s.hop_le THEN substr(s.ngay, 9, 2) || '/' || substr(s.ngay, 6, 2) || '/' "
+                            "|| substr(s.ngay, 1, 4) ELSE s.ngay_vao_lam END")
+            tham_nien = "(s.thang / 12) || ' năm ' || (s.thang % 12) || ' tháng'"
+        sql = f"""{prefix}
+            SELECT s.ma_nv, s.ho_va_ten, s.chuc_vu, {ngay_vao_lam} AS ngay_vao_lam,
+                   {tham_nien} AS tham_nien, {self._tenure_group_sql("s.thang")} AS nhom_tham_nien, s.ngay
+            FROM {source}
+        """
+        return sql, params
+
+    def iter_seniority(self, position=None, batch_size=1000):
+        """Seniority rows in batches, read with fetchmany so memory stays flat on any size"""
+        sql, params = self._seniority_sql(position)
+        sql += " ORDER BY s.ngay"
+
+        def produce(conn, replica):
+            for batch in self._stream(conn, sql, params, batch_size):
+                rows = []
+                for ma_nv, ho_va_ten, chuc_vu, ngay_vao_lam, tham_nien, nhom_tham_nien, _ in batch:
+                    if hasattr(ngay_vao_lam, "strftime"):
+                        ngay_vao_lam = ngay_vao_lam.strftime("%d/%m/%Y")
                     rows.append({
                         "ma_nv": ma_nv,
                         "ho_va_ten": ho_va_ten,
                         "chuc_vu": chuc_vu,
-                        "ngay_vao_lam": self._format_date(ngay_vao_lam),
-                        "tham_nien": f"{tenure_years} năm {tenure_months} tháng",
-                        "nhom_tham_nien": group
+                        "ngay_vao_lam": ngay_vao_lam,
+                        "tham_nien": tham_nien,
+                        "nhom_tham_nien": nhom_tham_nien
                     })
-            except Exception:
-                return []
-        return rows
+                yield rows
+        return self._streaming(produce)
+
+    def get_seniority_histogram(self, position=None):
+        """Staff count per tenure group, every group listed in TENURE_GROUPS order"""
+        sql, params = self._seniority_sql(position)
+        sql = f"SELECT t.nhom_tham_nien, COUNT(*) FROM ({sql}) t GROUP BY t.nhom_tham_nien"
+        with self._read_conn()[0] as conn:
+            cur = conn.cursor()
+            with track(sql) as stat:
+                cur.execute(sql, params)
+                counts = dict(cur.fetchall())
+                stat.rows = len(counts)
+        return [{"nhom_tham_nien": label, "so_nhan_vien": counts.get(label, 0)} for _, label in self.TENURE_GROUPS]
+
+    def _month_range(self, month, year):
+        """Half-open [first day, first day of next month) bounds for a sargable date filter"""
+        start = datetime(int(year), int(month), 1)
+        end = datetime(start.year + (start.month == 12), start.month % 12 + 1, 1)
+        return start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
+
+    def _placeholder(self):
+        return "%s" if self.backend == "mysql" else "?"
 
-    def _calc_tenure(self, date_str):
+    def _revenue_sql(self, archive=None):
+        """Revenue per medicine; with archive the date range is passed once per tier"""
+        ph = self._placeholder()
+        if archive:
+            return f"""
+        SELECT hdt.ma_thuoc,
+               t.ten_thuoc,
+               SUM(hdt.so_luong) AS so_luong_ban,
+               AVG(hdt.gia_ban) AS don_gia_tb,
+               SUM((hdt.so_luong * hdt.gia_ban) - COALESCE(hdt.giam_gia,0)) AS tong_doanh_thu
+        FROM ({self._get_rollup().lines_sql(archive, ph)}) hdt
+        JOIN THUOC t ON t.ma_thuoc = hdt.ma_thuoc
+        GROUP BY hdt.ma_thuoc, t.ten_thuoc
+        ORDER BY tong_doanh_thu DESC
+        """
+        return f"""
+        SELECT hdt.ma_thuoc,
+               t.ten_thuoc,
+               SUM(hdt.so_luong) AS so_luong_ban,
+               AVG(hdt.gia_ban) AS don_gia_tb,
+               SUM((hdt.so_luong * hdt.gia_ban) - COALESCE(hdt.giam_gia,0)) AS tong_doanh_thu
+        FROM HOA_DON hd
+        JOIN HOA_DON_THUOC hdt ON hd.{self._invoice_id_col} = hdt.{self._detail_invoice_fk}
+        JOIN THUOC t ON t.ma_thuoc = hdt.ma_thuoc
+        WHERE hd.{self._invoice_date_col} >= {ph} AND hd.{self._invoice_date_col} < {ph}
+        GROUP BY hdt.ma_thuoc, t.ten_thuoc
+        ORDER BY tong_doanh_thu DESC
+        """
+
+    def _revenue_count_sql(self, archive=None):
+        ph = self._placeholder()
+        if archive:
+            return f"SELECT COUNT(*) FROM ({self._get_rollup().lines_sql(archive, ph)}) hdt"
+        return (
+            f"SELECT COUNT(*) FROM HOA_DON hd JOIN HOA_DON_THUOC hdt ON hd.{self._invoice_id_col}=hdt.{self._detail_invoice_fk} "
+            f"WHERE hd.{self._invoice_date_col} >= {ph} AND hd.{self._invoice_date_col} < {ph}"
+        )
+
+    def _get_rollup(self):
+        if self._rollup is None:
+            self._rollup = RevenueRollup(self._invoice_id_col, self._invoice_date_col, self._detail_invoice_fk)
+        return self._rollup
+
+    def _revenue_from_rollup(self, conn, month, year, refresh=True):
+        """Closed months come from DOANH_THU_THANG; None means fall back to the live query.
+
+        A replica only reads what the primary rolled up (refresh=False): it takes no writes.
+        """
+        rollup = self._get_rollup()
         try:
-            start = datetime.strptime(date_str, "%Y-%m-%d")
-        except ValueError:
-            try:
-                start = datetime.strptime(date_str, "%d/%m/%Y")
-            except ValueError:
-                return 0, 0
-        now = datetime.now()
-        diff_months = (now.year - start.year) * 12 + (now.month - start.month)
-        years = diff_months // 12
-        months = diff_months % 12
-        return max(years, 0), max(months, 0)
-
-    def _tenure_group(self, years, months):
-        total_months = years * 12 + months
-        if total_months < 12:
-            return "Mới"
-        if total_months < 36:
-            return "Trung bình"
-        return "Lâu năm"
-
-    def _format_date(self, date_str):
-        for fmt in ("%Y-%m-%d", "%d/%m/%Y"):
-            try:
-                d = datetime.strptime(date_str, fmt)
-                return d.strftime("%d/%m/%Y")
-            except ValueError:
-                continue
-        return date_str
-
-    def get_revenue_by_month(self, month, year):
-        m = f"{int(month):02d}"
-        y = str(year)
-        data = []
+            if refresh:
+                rollup.refresh(conn)
+            elif not rollup.is_rolled_up(conn, year, month):
+                return None
+            rows = rollup.read(conn, year, month)
+        except Exception as e:
+            print(f"Error reading revenue rollup: {e}")
+            return None
+        return [self._revenue_row(row) for row in rows]
+
+    @staticmethod
+    def _revenue_row(row):
+        ma_thuoc, ten_thuoc, so_luong, don_gia_tb, tong_doanh_thu = row
+        return {
+            "ma_thuoc": ma_thuoc,
+            "ten_thuoc": ten_thuoc,
+            "so_luong_ban": so_luong,
+            "don_gia": round(don_gia_tb or 0, 2),
+            "tong_doanh_thu": round(tong_doanh_thu or 0, 2)
+        }
+
+    def refresh_rollup(self):
+        """Roll up closed months added since the last watermark"""
         with self._get_conn() as conn:
-            self._detect_invoice_schema(conn)
-            self._detect_detail_schema(conn)
-            id_col = self._invoice_id_col
-            detail_fk = self._detail_invoice_fk
-            date_col = self._invoice_date_col
+            self._detect_schema(conn)
+            return self._get_rollup().refresh(conn)
+
+    def get_revenue_by_month(self, month, year, include_archive=False):
+        """Revenue per medicine of one month; include_archive also reads archived invoices"""
+        return self.cache.get("revenue", (int(month), int(year), include_archive), ("HOA_DON", "THUOC"),
+                              lambda: self._fetch_revenue(month, year, include_archive))
+
+    def _fetch_revenue(self, month, year, include_archive):
+        date_range = self._month_range(month, year)
+        # Before checkout, so the connection has the SQLite archive attached
+        tables = archive_tables(self.backend, self.db_path) if include_archive else None
+        conn, replica = self._revenue_conn(tables)
+        with conn:
+            self._detect_schema(conn)
+            if self._get_rollup().is_closed(year, month):
+                rows = self._revenue_from_rollup(conn, month, year, refresh=not replica)
+                if rows is not None:
+                    return rows
+            # Current month (or rollup unavailable): compute live
+            archive = self._archive_for(conn, tables, month, year)
+            q = self._revenue_sql(archive)
+            date_range *= 2 if archive else 1
             if self.backend == "mysql":
-                q = f"""
-                SELECT hdt.ma_thuoc,
-                       t.ten_thuoc,
-                       SUM(hdt.so_luong) AS so_luong_ban,
-                       AVG(hdt.gia_ban) AS don_gia_tb,
-                       SUM((hdt.so_luong * hdt.gia_ban) - COALESCE(hdt.giam_gia,0)) AS tong_doanh_thu
-                FROM HOA_DON hd
-                JOIN HOA_DON_THUOC hdt ON hd.{id_col} = hdt.{detail_fk}
-                JOIN THUOC t ON t.ma_thuoc = hdt.ma_thuoc
-                WHERE MONTH(hd.{date_col}) = %s AND YEAR(hd.{date_col}) = %s
-                GROUP BY hdt.ma_thuoc, t.ten_thuoc
-                ORDER BY tong_doanh_thu DESC
-                """
                 try:
                     cur = conn.cursor()
-                    cur.execute(q, (int(month), int(year)))
-                    for ma_thuoc, ten_thuoc, so_luong, don_gia_tb, tong_doanh_thu in cur.fetchall():
-                        data.append({
-                            "ma_thuoc": ma_thuoc,
-                            "ten_thuoc": ten_thuoc,
-                            "so_luong_ban": so_luong,
-                            "don_gia": round(don_gia_tb or 0, 2),
-                            "tong_doanh_thu": round(tong_doanh_thu or 0, 2)
-                        })
+                    with track(q) as stat:
+                        cur.execute(q, date_range)
+                        fetched = cur.fetchall()
+                        stat.rows = len(fetched)
+                    data = [self._revenue_row(row) for row in fetched]
                 except Exception as e:
+                    # Possibly a renamed column: MySQL has no schema version to notice it by
+                    self._schema.invalidate()
                     raise RuntimeError(f"Lỗi truy vấn doanh thu: {e}")
                 return data
             # SQLite path
             try:
-                q = f"""
-                SELECT hdt.ma_thuoc,
-                       t.ten_thuoc,
-                       SUM(hdt.so_luong) AS so_luong_ban,
-                       AVG(hdt.gia_ban) AS don_gia_tb,
-                       SUM((hdt.so_luong * hdt.gia_ban) - COALESCE(hdt.giam_gia,0)) AS tong_doanh_thu
-                FROM HOA_DON hd
-                JOIN HOA_DON_THUOC hdt ON hd.{id_col} = hdt.{detail_fk}
-                JOIN THUOC t ON t.ma_thuoc = hdt.ma_thuoc
-                WHERE strftime('%m', hd.{date_col}) = ? AND strftime('%Y', hd.{date_col}) = ?
-                GROUP BY hdt.ma_thuoc, t.ten_thuoc
-                ORDER BY tong_doanh_thu DESC
-                """
-                for ma_thuoc, ten_thuoc, so_luong, don_gia_tb, tong_doanh_thu in conn.execute(q, (m, y)):
-                    data.append({
-                        "ma_thuoc": ma_thuoc,
-                        "ten_thuoc": ten_thuoc,
-                        "so_luong_ban": so_luong,
-                        "don_gia": round(don_gia_tb or 0, 2),
-                        "tong_doanh_thu": round(tong_doanh_thu or 0, 2)
-                    })
+                with track(q) as stat:
+                    fetched = conn.execute(q, date_range).fetchall()
+                    stat.rows = len(fetched)
+                data = [self._revenue_row(row) for row in fetched]
             except Exception as e:
                 raise RuntimeError(f"Lỗi truy vấn doanh thu (SQLite): {e}")
             return data
 
-    def revenue_exists(self, month, year):
-        with self._get_conn() as conn:
-            self._detect_invoice_schema(conn)
-            self._detect_detail_schema(conn)
-            id_col = self._invoice_id_col
-            detail_fk = self._detail_invoice_fk
-            date_col = self._invoice_date_col
-            if self.backend == "mysql":
-                q = f"SELECT COUNT(*) FROM HOA_DON hd JOIN HOA_DON_THUOC hdt ON hd.{id_col}=hdt.{detail_fk} WHERE MONTH(hd.{date_col})=%s AND YEAR(hd.{date_col})=%s"
-                cur = conn.cursor()
-                cur.execute(q, (int(month), int(year)))
-                return cur.fetchone()[0]
-            else:
-                q = f"SELECT COUNT(*) FROM HOA_DON hd JOIN HOA_DON_THUOC hdt ON hd.{id_col}=hdt.{detail_fk} WHERE strftime('%m', hd.{date_col})=? AND strftime('%Y', hd.{date_col})=?"
-                cur = conn.execute(q, (f"{int(month):02d}", str(year)))
+    def iter_revenue(self, month, year, batch_size=1000, include_archive=False):
+        """Monthly revenue rows in batches (rollup for closed months, live query otherwise)"""
+        date_range = self._month_range(month, year)
+        tables = archive_tables(self.backend, self.db_path) if include_archive else None
+
+        def produce(conn, replica):
+            self._detect_schema(conn)
+            rollup = self._get_rollup()
+            source = None
+            if rollup.is_closed(year, month):
+                try:
+                    if not replica:
+                        rollup.refresh(conn)
+                    if not replica or rollup.is_rolled_up(conn, year, month):
+                        source = (rollup.READ_SQL, (int(year), int(month)))
+                except Exception as e:
+                    print(f"Error reading revenue rollup: {e}")
+            if source is None:
+                archive = self._archive_for(conn, tables, month, year)
+                source = (self._revenue_sql(archive), date_range * (2 if archive else 1))
+            for batch in self._stream(conn, source[0], source[1], batch_size):
+                yield [self._revenue_row(row) for row in batch]
+        return self._streaming(produce, tables)
+
+    def revenue_exists(self, month, year, include_archive=False):
+        """Number of invoice lines in the month"""
+        return self.cache.get("revenue_exists", (int(month), int(year), include_archive), ("HOA_DON",),
+                              lambda: self._count_revenue(month, year, include_archive))
+
+    def _count_revenue(self, month, year, include_archive):
+        date_range = self._month_range(month, year)
+        tables = archive_tables(self.backend, self.db_path) if include_archive else None
+        with self._revenue_conn(tables)[0] as conn:
+            self._detect_schema(conn)
+            archive = self._archive_for(conn, tables, month, year)
+            q = self._revenue_count_sql(archive)
+            date_range *= 2 if archive else 1
+            with track(q) as stat:
+                if self.backend == "mysql":
+                    cur = conn.cursor()
+                    cur.execute(q, date_range)
+                else:
+                    cur = conn.execute(q, date_range)
+                stat.rows = 1
                 return cur.fetchone()[0]
 
+    def ensure_indexes(self):
+        """Create the date/detail indexes the revenue queries rely on, if missing"""
+        with self._get_conn() as conn:
+            self._detect_schema(conn)
+            return ensure_indexes(conn, self.backend, self._invoice_date_col, self._invoice_id_col,
+                                  self._detail_invoice_fk)
+
+    def explain_revenue(self, month, year):
+        """Plan of the monthly revenue query; full_scan is True if an invoice table is scanned"""
+        date_range = self._month_range(month, year)
+        with self._get_conn() as conn:
+            self._detect_schema(conn)
+            return explain(conn, self.backend, self._revenue_sql(), date_range, ("hd", "hdt"))
+
     def sum_revenue(self, rows):
         return sum(r.get("tong_doanh_thu", 0) for r in rows)
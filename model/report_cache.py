@@ -0,0 +1,81 @@
+"""Process-wide cache of report results, one per database.
+
+Entries are keyed by (report, parameters) and remember the model.data_version versions
+of the tables the report reads. Invoice, Staff, the bulk import and the archive bump
+those after each committed write, so an entry is served from memory until one of its
+tables changes, and run again after. Writes made by other processes are not counted:
+like TabManager, entries older than DB_REPORT_CACHE_SECONDS are run again as well.
+At most DB_REPORT_CACHE_SIZE entries are kept, the least recently used going first.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from config.db_config import load_report_cache_config
+from model import data_version
+
+
+class ReportCache:
+    """LRU of report results checked against the data versions of their tables"""
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def for_database(cls, backend, host=None, database=None, sqlite_path=None):
+        """The shared cache of one database"""
+        key = (backend, host, database, sqlite_path)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls()
+            return cls._instances[key]
+
+    def __init__(self, size=None, max_age=None):
+        config = load_report_cache_config()
+        self.size = config["size"] if size is None else size
+        self.max_age = config["max_age"] if max_age is None else max_age
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (report, params) -> (versions, stored_at, result)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, report, params, tables, load):
+        """Result of load(), from memory while `tables` have not changed since it ran.
+
+        A None result (the report failed) is not kept. Lists are copied on the way out, dict
+        rows included, so a caller editing its rows (say, formatting a number) leaves the
+        cached report as it was.
+        """
+        key = (report, params)
+        # Read before load(): a write landing while it runs leaves the entry stale, not wrong
+        versions = data_version.current(*tables)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == versions and now - entry[1] <= self.max_age:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._copy(entry[2])
+            self.misses += 1
+        result = load()
+        if result is not None and self.size > 0:
+            with self._lock:
+                self._entries[key] = (versions, now, result)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.size:
+                    self._entries.popitem(last=False)
+        return self._copy(result)
+
+    @staticmethod
+    def _copy(result):
+        if not isinstance(result, list):
+            return result
+        return [dict(row) if isinstance(row, dict) else row for row in result]
+
+    def invalidate(self):
+        """Forget every entry, e.g. after data changed outside this process"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"size": self.size, "entries": len(self._entries), "hits": self.hits, "misses": self.misses}
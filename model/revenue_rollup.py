@@ -0,0 +1,179 @@
+from datetime import datetime
+
+from model.query_stats import track
+
+
+class RevenueRollup:
+    """Per-medicine monthly revenue for closed months, kept in DOANH_THU_THANG.
+
+    DOANH_THU_THANG_MOC holds the watermark: every month before it is rolled up.
+    A month is always rebuilt whole from the detail rows, so refreshing twice is harmless.
+    Works on pooled connections of either backend (cursor() with %s placeholders).
+    """
+    TABLES_SQL = [
+        """
+        CREATE TABLE IF NOT EXISTS DOANH_THU_THANG (
+            nam INT NOT NULL,
+            thang INT NOT NULL,
+            ma_thuoc VARCHAR(50) NOT NULL,
+            so_luong_ban INT NOT NULL,
+            don_gia_tb DECIMAL(18,2) NOT NULL,
+            tong_doanh_thu DECIMAL(18,2) NOT NULL,
+            PRIMARY KEY (nam, thang, ma_thuoc)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS DOANH_THU_THANG_MOC (
+            id INT NOT NULL PRIMARY KEY,
+            tong_hop_den DATE NOT NULL
+        )
+        """,
+    ]
+
+    READ_SQL = """
+        SELECT r.ma_thuoc, t.ten_thuoc, r.so_luong_ban, r.don_gia_tb, r.tong_doanh_thu
+        FROM DOANH_THU_THANG r
+        JOIN THUOC t ON t.ma_thuoc = r.ma_thuoc
+        WHERE r.nam = %s AND r.thang = %s
+        ORDER BY r.tong_doanh_thu DESC
+    """
+
+    def __init__(self, id_col="ma_hoa_don", date_col="ngay_gio", detail_fk="ma_hoa_don"):
+        self.id_col = id_col
+        self.date_col = date_col
+        self.detail_fk = detail_fk
+        self._ready = False
+
+    @staticmethod
+    def month_start(year, month):
+        return datetime(int(year), int(month), 1)
+
+    @staticmethod
+    def next_month(start):
+        return datetime(start.year + (start.month == 12), start.month % 12 + 1, 1)
+
+    def is_closed(self, year, month, now=None):
+        """True for months that ended before the current one"""
+        now = now or datetime.now()
+        return self.month_start(year, month) < datetime(now.year, now.month, 1)
+
+    def ensure_tables(self, conn):
+        if self._ready:
+            return
+        cur = conn.cursor()
+        for sql in self.TABLES_SQL:
+            cur.execute(sql)
+        conn.commit()
+        self._ready = True
+
+    def watermark(self, conn):
+        """First day of the oldest month not rolled up yet, or None"""
+        cur = conn.cursor()
+        cur.execute("SELECT tong_hop_den FROM DOANH_THU_THANG_MOC WHERE id = 1")
+        row = cur.fetchone()
+        if not row or not row[0]:
+            return None
+        value = row[0]
+        if isinstance(value, str):
+            value = datetime.strptime(value[:10], "%Y-%m-%d")
+        return datetime(value.year, value.month, 1)
+
+    def _set_watermark(self, conn, start):
+        cur = conn.cursor()
+        cur.execute("DELETE FROM DOANH_THU_THANG_MOC WHERE id = 1")
+        cur.execute("INSERT INTO DOANH_THU_THANG_MOC (id, tong_hop_den) VALUES (1, %s)",
+                    (start.strftime("%Y-%m-%d"),))
+
+    def _first_invoice_month(self, conn):
+        cur = conn.cursor()
+        cur.execute(f"SELECT MIN({self.date_col}) FROM HOA_DON")
+        row = cur.fetchone()
+        if not row or not row[0]:
+            return None
+        value = row[0]
+        if isinstance(value, str):
+            value = datetime.strptime(value[:10], "%Y-%m-%d")
+        return datetime(value.year, value.month, 1)
+
+    def lines_sql(self, archive, placeholder="%s"):
+        """Detail rows (ma_thuoc, so_luong, gia_ban, giam_gia) of invoices dated in [start, end),
+        from HOA_DON_THUOC and the archive's (header, lines) tables; the range is passed once per table.
+        """
+        return " UNION ALL ".join(f"""
+            SELECT hdt.ma_thuoc, hdt.so_luong, hdt.gia_ban, hdt.giam_gia
+            FROM {header} hd
+            JOIN {lines} hdt ON hd.{self.id_col} = hdt.{self.detail_fk}
+            WHERE hd.{self.date_col} >= {placeholder} AND hd.{self.date_col} < {placeholder}
+        """ for header, lines in (("HOA_DON", "HOA_DON_THUOC"), tuple(archive)))
+
+    def rebuild_month(self, conn, year, month, archive=None):
+        """Replace the rollup rows of one month from HOA_DON_THUOC (caller commits).
+
+        archive: (header, lines) archive tables holding part of the month, read as well.
+        """
+        start = self.month_start(year, month)
+        end = self.next_month(start)
+        date_range = (start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d"))
+        cur = conn.cursor()
+        cur.execute("DELETE FROM DOANH_THU_THANG WHERE nam = %s AND thang = %s", (start.year, start.month))
+        if archive:
+            source = f"FROM ({self.lines_sql(archive)}) hdt"
+            date_range *= 2
+        else:
+            source = f"""FROM HOA_DON hd
+            JOIN HOA_DON_THUOC hdt ON hd.{self.id_col} = hdt.{self.detail_fk}
+            WHERE hd.{self.date_col} >= %s AND hd.{self.date_col} < %s"""
+        sql = f"""
+            INSERT INTO DOANH_THU_THANG (nam, thang, ma_thuoc, so_luong_ban, don_gia_tb, tong_doanh_thu)
+            SELECT %s, %s, hdt.ma_thuoc,
+                   SUM(hdt.so_luong),
+                   AVG(hdt.gia_ban),
+                   SUM((hdt.so_luong * hdt.gia_ban) - COALESCE(hdt.giam_gia,0))
+            {source}
+            GROUP BY hdt.ma_thuoc
+        """
+        with track(sql) as stat:
+            cur.execute(sql, (start.year, start.month) + date_range)
+            stat.affected = cur.rowcount
+
+    def refresh(self, conn, now=None):
+        """Roll up every closed month after the watermark; returns the months processed"""
+        self.ensure_tables(conn)
+        now = now or datetime.now()
+        current = datetime(now.year, now.month, 1)
+        start = self.watermark(conn) or self._first_invoice_month(conn)
+        if start is None:
+            return []
+        done = []
+        while start < current:
+            if conn.in_transaction:
+                conn.commit()
+            conn.start_transaction()
+            try:
+                self.rebuild_month(conn, start.year, start.month)
+                self._set_watermark(conn, self.next_month(start))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            done.append((start.year, start.month))
+            start = self.next_month(start)
+        return done
+
+    def is_rolled_up(self, conn, year, month):
+        """True if the month already has rollup rows that must track later changes"""
+        try:
+            mark = self.watermark(conn)
+        except Exception:
+            return False
+        return mark is not None and self.month_start(year, month) < mark
+
+    def read(self, conn, year, month):
+        """Rows of a rolled-up month, in the same shape as the live revenue query"""
+        sql = self.READ_SQL
+        cur = conn.cursor()
+        with track(sql) as stat:
+            cur.execute(sql, (int(year), int(month)))
+            rows = cur.fetchall()
+            stat.rows = len(rows)
+        return rows
@@ -0,0 +1,77 @@
+import threading
+
+from model.query_stats import track
+
+
+class SchemaRegistry:
+    """Process-wide cache of table columns, one per database.
+
+    SQLite bumps PRAGMA schema_version on every DDL statement, so each lookup compares
+    it (a header read, no table scan) and introspects again only when it moved. MySQL has
+    no such counter: columns are read once per process and invalidate() drops them.
+    """
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def for_database(cls, backend, host=None, database=None, sqlite_path=None):
+        """The shared registry of one database"""
+        key = (backend, host, database, sqlite_path)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(backend)
+            return cls._instances[key]
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._columns = {}
+        self._version = None
+
+    def _schema_version(self, conn):
+        if self.backend == "mysql":
+            return self._version
+        return conn.execute("PRAGMA schema_version").fetchone()[0]
+
+    def _introspect(self, conn, table):
+        if self.backend == "mysql":
+            sql = f"DESCRIBE {table}"
+            cur = conn.cursor()
+            with track(sql) as stat:
+                cur.execute(sql)
+                rows = cur.fetchall()
+                stat.rows = len(rows)
+            return [r[0] for r in rows]
+        sql = f"PRAGMA table_info({table})"
+        with track(sql) as stat:
+            rows = conn.execute(sql).fetchall()
+            stat.rows = len(rows)
+        return [r[1] for r in rows]
+
+    def columns(self, conn, table):
+        """Column names of `table`; [] if it does not exist or cannot be read"""
+        with self._lock:
+            try:
+                version = self._schema_version(conn)
+            except Exception:
+                version = None
+            if version != self._version:
+                self._columns.clear()
+                self._version = version
+            if table not in self._columns:
+                try:
+                    self._columns[table] = self._introspect(conn, table)
+                except Exception:
+                    # Not cached: the next lookup tries again
+                    return []
+            return list(self._columns[table])
+
+    def resolve(self, conn, table, candidates):
+        """First of `candidates` that is a column of `table`, or None"""
+        cols = self.columns(conn, table)
+        return next((name for name in candidates if name in cols), None)
+
+    def invalidate(self):
+        """Introspect again on next lookup (after ALTER TABLE on MySQL)"""
+        with self._lock:
+            self._columns.clear()
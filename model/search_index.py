@@ -0,0 +1,313 @@
+"""Diacritic-insensitive substring search for staff and invoices.
+
+Every searchable row has one entry in TIM_KIEM holding its fields folded to plain
+lowercase ASCII ("Nguyễn Văn Đức" -> "nguyen van duc"). Lookups go through a
+trigram index instead of scanning with LIKE '%x%': FTS5's trigram tokenizer on
+SQLite, and the TIM_KIEM_TRIGRAM side table (trigram -> entry) on MySQL.
+
+Usage: python -m model.search_index rebuild
+"""
+import re
+import sys
+import threading
+import unicodedata
+
+from model.database import Database
+
+STAFF = "NV"
+INVOICE = "HD"
+
+# Searchable columns per kind, first one is the key
+SOURCES = {
+    STAFF: ("NHAN_VIEN", ("ma_nv", "ho_va_ten", "chuc_vu", "sdt")),
+    INVOICE: ("HOA_DON", ("ma_hoa_don", "ten_khach_hang", "ma_nv")),
+}
+
+
+def normalize(text):
+    """Lowercase, strip Vietnamese diacritics and collapse whitespace"""
+    text = unicodedata.normalize("NFD", str(text or "")).replace("đ", "d").replace("Đ", "D")
+    text = "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def trigrams(text):
+    """Distinct trigrams of a normalized field; spaces become '_' so MySQL's PAD SPACE keys stay distinct"""
+    text = text.replace(" ", "_")
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SearchIndex:
+    """TIM_KIEM entries and their trigram index, kept in step with NHAN_VIEN and HOA_DON"""
+    # Fields are joined with this so a match never spans two columns
+    SEPARATOR = " | "
+    # Keys per IN list when fetching the matched rows or indexing a batch
+    FETCH_CHUNK = 500
+
+    MYSQL_TABLES_SQL = [
+        """
+        CREATE TABLE IF NOT EXISTS TIM_KIEM (
+            id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+            loai VARCHAR(10) NOT NULL,
+            ma VARCHAR(50) NOT NULL,
+            noi_dung VARCHAR(500) NOT NULL,
+            UNIQUE KEY uq_tim_kiem (loai, ma)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS TIM_KIEM_TRIGRAM (
+            gram VARCHAR(3) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL,
+            id INT NOT NULL,
+            PRIMARY KEY (gram, id),
+            KEY idx_tim_kiem_trigram_id (id)
+        )
+        """,
+    ]
+    SQLITE_TABLES_SQL = [
+        """
+        CREATE TABLE IF NOT EXISTS TIM_KIEM (
+            id INTEGER PRIMARY KEY,
+            loai VARCHAR(10) NOT NULL,
+            ma VARCHAR(50) NOT NULL,
+            noi_dung VARCHAR(500) NOT NULL,
+            UNIQUE (loai, ma)
+        )
+        """,
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS TIM_KIEM_FTS USING fts5(
+            noi_dung, content='TIM_KIEM', content_rowid='id', tokenize='trigram'
+        )
+        """,
+    ]
+
+    _ensured = set()
+    _ensure_lock = threading.Lock()
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    @property
+    def uses_fts(self):
+        return self.db.backend == "sqlite"
+
+    def _table_exists(self):
+        """Both index tables are there; a half-created index (the second CREATE failed) is created again"""
+        if self.db.backend == "mysql":
+            query = """
+            SELECT COUNT(*) as count FROM information_schema.tables
+            WHERE table_schema = DATABASE() AND table_name IN ('TIM_KIEM', 'TIM_KIEM_TRIGRAM')
+            """
+        else:
+            query = ("SELECT COUNT(*) as count FROM sqlite_master "
+                     "WHERE type = 'table' AND name IN ('TIM_KIEM', 'TIM_KIEM_FTS')")
+        result = self.db.fetch_query(query)
+        return bool(result and result[0]['count'] == 2)
+
+    def ensure_table(self):
+        """Create the index tables once per process, filling them when they are new.
+
+        Call it before opening a transaction: MySQL commits implicitly on DDL.
+        """
+        key = (self.db.backend, self.db.host, self.db.database, self.db.sqlite_path)
+        with self._ensure_lock:
+            if key in self._ensured:
+                return True
+            if not self._table_exists():
+                tables_sql = self.SQLITE_TABLES_SQL if self.uses_fts else self.MYSQL_TABLES_SQL
+                for sql in tables_sql:
+                    if not self.db.execute_query(sql):
+                        return False
+                self.rebuild()
+            self._ensured.add(key)
+            return True
+
+    def document(self, *fields):
+        return self.SEPARATOR.join(normalize(f) for f in fields if f is not None and str(f) != "")
+
+    def add(self, loai, ma, *fields):
+        """Index one row, replacing its previous entry (call inside the row's transaction)"""
+        return self.remove(loai, ma) and self._insert(loai, ma, *fields)
+
+    def _insert(self, loai, ma, *fields):
+        noi_dung = self.document(ma, *fields)
+        cursor = self.db.execute_query("INSERT INTO TIM_KIEM (loai, ma, noi_dung) VALUES (%s, %s, %s)",
+                                       (loai, ma, noi_dung))
+        if not cursor:
+            return False
+        entry_id = cursor.lastrowid
+        if self.uses_fts:
+            return bool(self.db.execute_query("INSERT INTO TIM_KIEM_FTS (rowid, noi_dung) VALUES (%s, %s)",
+                                              (entry_id, noi_dung)))
+        grams = self._grams(noi_dung)
+        if not grams:
+            return True
+        return bool(self.db.execute_many("INSERT INTO TIM_KIEM_TRIGRAM (gram, id) VALUES (%s, %s)",
+                                         [(gram, entry_id) for gram in grams]))
+
+    def _grams(self, noi_dung):
+        grams = set()
+        for part in noi_dung.split(self.SEPARATOR):
+            grams |= trigrams(part)
+        return grams
+
+    def add_many(self, loai, rows):
+        """Index rows that have no entry yet, a few statements for the lot (call inside their transaction).
+
+        rows are (ma, *fields) tuples, as passed to add().
+        """
+        if not rows:
+            return True
+        if not self.db.execute_many("INSERT INTO TIM_KIEM (loai, ma, noi_dung) VALUES (%s, %s, %s)",
+                                    [(loai, row[0], self.document(*row)) for row in rows]):
+            return False
+        placeholders = ", ".join(["%s"] * len(rows))
+        entries = self.db.fetch_query(
+            f"SELECT id, noi_dung FROM TIM_KIEM WHERE loai = %s AND ma IN ({placeholders})",
+            (loai,) + tuple(row[0] for row in rows))
+        if len(entries) != len(rows):
+            return False
+        if self.uses_fts:
+            return bool(self.db.execute_many("INSERT INTO TIM_KIEM_FTS (rowid, noi_dung) VALUES (%s, %s)",
+                                             [(e['id'], e['noi_dung']) for e in entries]))
+        params = [(gram, e['id']) for e in entries for gram in self._grams(e['noi_dung'])]
+        return not params or bool(self.db.execute_many(
+            "INSERT INTO TIM_KIEM_TRIGRAM (gram, id) VALUES (%s, %s)", params))
+
+    def remove(self, loai, ma):
+        """Drop the entry of one row if it has one"""
+        rows = self.db.fetch_query("SELECT id, noi_dung FROM TIM_KIEM WHERE loai = %s AND ma = %s", (loai, ma))
+        for row in rows:
+            if self.uses_fts:
+                # External-content FTS5 tables are told the old text to un-index it
+                ok = self.db.execute_query(
+                    "INSERT INTO TIM_KIEM_FTS (TIM_KIEM_FTS, rowid, noi_dung) VALUES ('delete', %s, %s)",
+                    (row['id'], row['noi_dung']))
+            else:
+                ok = self.db.execute_query("DELETE FROM TIM_KIEM_TRIGRAM WHERE id = %s", (row['id'],))
+            if not ok or not self.db.execute_query("DELETE FROM TIM_KIEM WHERE id = %s", (row['id'],)):
+                return False
+        return True
+
+    def remove_many(self, loai, keys):
+        """Drop the entries of many rows, a few statements for the lot (call inside their transaction)"""
+        if not keys:
+            return True
+        placeholders = ", ".join(["%s"] * len(keys))
+        entries = self.db.fetch_query(
+            f"SELECT id, noi_dung FROM TIM_KIEM WHERE loai = %s AND ma IN ({placeholders})",
+            (loai,) + tuple(keys))
+        if not entries:
+            return True
+        if self.uses_fts:
+            ok = self.db.execute_many(
+                "INSERT INTO TIM_KIEM_FTS (TIM_KIEM_FTS, rowid, noi_dung) VALUES ('delete', %s, %s)",
+                [(e['id'], e['noi_dung']) for e in entries])
+        else:
+            ok = self.db.execute_many("DELETE FROM TIM_KIEM_TRIGRAM WHERE id = %s", [(e['id'],) for e in entries])
+        placeholders = ", ".join(["%s"] * len(entries))
+        return bool(ok and self.db.execute_query(f"DELETE FROM TIM_KIEM WHERE id IN ({placeholders})",
+                                                  tuple(e['id'] for e in entries)))
+
+    def add_staff(self, ma_nv, ho_va_ten, chuc_vu, sdt):
+        return self.add(STAFF, ma_nv, ho_va_ten, chuc_vu, sdt)
+
+    def add_invoice(self, ma_hoa_don, ten_khach_hang, ma_nv):
+        return self.add(INVOICE, ma_hoa_don, ten_khach_hang, ma_nv)
+
+    def rebuild(self):
+        """Re-index every staff and invoice row"""
+        with self.db.transaction():
+            if self.uses_fts:
+                ok = self.db.execute_query("INSERT INTO TIM_KIEM_FTS (TIM_KIEM_FTS) VALUES ('delete-all')")
+            else:
+                ok = self.db.execute_query("DELETE FROM TIM_KIEM_TRIGRAM")
+            if not ok or not self.db.execute_query("DELETE FROM TIM_KIEM"):
+                raise RuntimeError("Không thể xóa chỉ mục tìm kiếm")
+            count = 0
+            for loai, (table, columns) in SOURCES.items():
+                rows = [tuple(row[c] for c in columns)
+                        for row in self.db.fetch_query(f"SELECT {', '.join(columns)} FROM {table}")]
+                # A few statements per batch instead of one round trip per row
+                for start in range(0, len(rows), self.FETCH_CHUNK):
+                    batch = rows[start:start + self.FETCH_CHUNK]
+                    if not self.add_many(loai, batch):
+                        raise RuntimeError(f"Không thể lập chỉ mục {table} từ {batch[0][0]}")
+                count += len(rows)
+        return count
+
+    @staticmethod
+    def _like_pattern(term):
+        return "%" + term.replace("!", "!!").replace("%", "!%").replace("_", "!_") + "%"
+
+    def search(self, loai, search_term, limit=None):
+        """Keys of the matching rows (every one unless limit is given), best first; None when the index is unavailable"""
+        term = normalize(search_term)
+        if not term:
+            return []
+        if not self.ensure_table():
+            return None
+        limit_sql, limit_params = (" LIMIT %s", (limit,)) if limit else ("", ())
+        if len(term) < 3:
+            # Too short for trigrams: scan the folded text, still diacritic-insensitive
+            rows = self.db.fetch_query(f"""
+                SELECT ma FROM TIM_KIEM
+                WHERE loai = %s AND noi_dung LIKE %s ESCAPE '!'
+                ORDER BY ma DESC{limit_sql}
+            """, (loai, self._like_pattern(term), *limit_params), replica=True)
+        elif self.uses_fts:
+            rows = self.db.fetch_query(f"""
+                SELECT k.ma FROM TIM_KIEM_FTS f
+                JOIN TIM_KIEM k ON k.id = f.rowid
+                WHERE TIM_KIEM_FTS MATCH %s AND k.loai = %s
+                ORDER BY f.rank{limit_sql}
+            """, ('"' + term.replace('"', '""') + '"', loai, *limit_params), replica=True)
+        else:
+            grams = sorted(trigrams(term))
+            placeholders = ", ".join(["%s"] * len(grams))
+            # Entries holding every trigram of the term, confirmed with LIKE on the short candidate list
+            rows = self.db.fetch_query(f"""
+                SELECT k.ma FROM TIM_KIEM_TRIGRAM g
+                JOIN TIM_KIEM k ON k.id = g.id
+                WHERE g.gram IN ({placeholders}) AND k.loai = %s
+                GROUP BY k.id, k.ma, k.noi_dung
+                HAVING COUNT(*) = %s AND k.noi_dung LIKE %s ESCAPE '!'
+                ORDER BY LENGTH(k.noi_dung), k.ma DESC{limit_sql}
+            """, (*grams, loai, len(grams), self._like_pattern(term), *limit_params), replica=True)
+        return [row['ma'] for row in rows]
+
+    def fetch_ranked(self, query, keys, key_column):
+        """Rows of query for every key, ordered like keys; query filters with IN ({placeholders}).
+
+        Keys go in chunks of FETCH_CHUNK so a short term matching most rows stays under
+        SQLite's limit on bound variables.
+        """
+        rows = []
+        for start in range(0, len(keys), self.FETCH_CHUNK):
+            chunk = tuple(keys[start:start + self.FETCH_CHUNK])
+            rows += self.db.fetch_query(query.format(placeholders=", ".join(["%s"] * len(chunk))), chunk,
+                                        replica=True)
+        return self.rank_rows(rows, keys, key_column)
+
+    @staticmethod
+    def rank_rows(rows, keys, key_column):
+        """Order fetched rows like the keys returned by search()"""
+        position = {key: i for i, key in enumerate(keys)}
+        return sorted(rows, key=lambda row: position.get(row[key_column], len(position)))
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv != ["rebuild"]:
+        print("Usage: python -m model.search_index rebuild")
+        return 2
+    db = Database()
+    if not db.connect():
+        return 1
+    index = SearchIndex(db)
+    index.ensure_table()
+    print(f"Đã lập chỉ mục {index.rebuild()} bản ghi")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
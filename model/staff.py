@@ -1,10 +1,13 @@
+from model import data_version
 from model.database import Database
+from model.search_index import SearchIndex, STAFF
 from datetime import datetime
 
 
 class Staff:
     def __init__(self, db: Database):
         self.db = db
+        self.search_index = SearchIndex(db)
     
     def _convert_date_format(self, date_str):
         try:
@@ -39,34 +42,56 @@ class Staff:
             if not ngay_vao_lam_formatted:
                 return False, "Định dạng ngày không hợp lệ. Vui lòng nhập theo định dạng DD/MM/YYYY."
             
-            # Insert into NHAN_VIEN table first
-            query_nv = """
-            INSERT INTO NHAN_VIEN (ma_nv, ho_va_ten, sdt, chuc_vu, ngay_vao_lam, ma_quan_ly)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            """
-            params_nv = (ma_nv, ho_va_ten, sdt, chuc_vu, ngay_vao_lam_formatted, ma_quan_ly if ma_quan_ly else None)
-            cursor_nv = self.db.execute_query(query_nv, params_nv)
-            
-            if not cursor_nv:
-                return False, "Không thể thêm nhân viên. Có thể mã nhân viên đã tồn tại."
-            
-            # Insert into LUONG table with default values (0 for so_gio_lam and thuong)
-            query_luong = """
-            INSERT INTO LUONG (ma_nv, so_gio_lam, thuong)
-            VALUES (%s, 0, 0)
-            """
-            params_luong = (ma_nv,)
-            cursor_luong = self.db.execute_query(query_luong, params_luong)
+            self.search_index.ensure_table()
+            # Staff row, salary row and search entry are committed together
+            with self.db.transaction():
+                # Insert into NHAN_VIEN table first
+                query_nv = """
+                INSERT INTO NHAN_VIEN (ma_nv, ho_va_ten, sdt, chuc_vu, ngay_vao_lam, ma_quan_ly)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                """
+                params_nv = (ma_nv, ho_va_ten, sdt, chuc_vu, ngay_vao_lam_formatted, ma_quan_ly if ma_quan_ly else None)
+                if not self.db.execute_query(query_nv, params_nv):
+                    raise RuntimeError("Không thể thêm nhân viên. Có thể mã nhân viên đã tồn tại.")
+                
+                # Insert into LUONG table with default values (0 for so_gio_lam and thuong)
+                query_luong = """
+                INSERT INTO LUONG (ma_nv, so_gio_lam, thuong)
+                VALUES (%s, 0, 0)
+                """
+                if not self.db.execute_query(query_luong, (ma_nv,)):
+                    raise RuntimeError("Không thể tạo bản ghi lương.")
+                
+                if not self.search_index.add_staff(ma_nv, ho_va_ten, chuc_vu, sdt):
+                    raise RuntimeError("Không thể cập nhật chỉ mục tìm kiếm.")
             
-            if cursor_luong:
-                return True, "Thành công"
-            else:
-                return False, "Không thể tạo bản ghi lương."
+            data_version.bump("NHAN_VIEN")
+            return True, "Thành công"
+        except RuntimeError as e:
+            return False, str(e)
         except Exception as e:
             error_msg = str(e)
             print(f"Error creating staff: {error_msg}")
             return False, f"Lỗi: {error_msg}"
     
+    def import_staff(self, rows):
+        """Insert validated staff rows (ma_nv, ho_va_ten, sdt, chuc_vu, ngay_vao_lam, ma_quan_ly) in bulk.
+        
+        Call inside a transaction; managers must come before the staff they manage.
+        """
+        query_nv = """
+        INSERT INTO NHAN_VIEN (ma_nv, ho_va_ten, sdt, chuc_vu, ngay_vao_lam, ma_quan_ly)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        """
+        if not self.db.execute_many(query_nv, rows):
+            raise RuntimeError("Không thể thêm nhân viên")
+        query_luong = "INSERT INTO LUONG (ma_nv, so_gio_lam, thuong) VALUES (%s, 0, 0)"
+        if not self.db.execute_many(query_luong, [(row[0],) for row in rows]):
+            raise RuntimeError("Không thể tạo bản ghi lương")
+        entries = [(ma_nv, ho_va_ten, chuc_vu, sdt) for ma_nv, ho_va_ten, sdt, chuc_vu, _, _ in rows]
+        if not self.search_index.add_many(STAFF, entries):
+            raise RuntimeError("Không thể cập nhật chỉ mục tìm kiếm")
+    
     def get_all_staff(self):
         query = """
         SELECT nv.ma_nv, nv.ho_va_ten, nv.chuc_vu, nv.sdt, nv.ngay_vao_lam, 
@@ -77,6 +102,22 @@ class Staff:
         return self.db.fetch_query(query)
     
     def search_staff(self, search_term):
+        """Staff matching search_term anywhere in id, name, position or phone, ignoring diacritics"""
+        keys = self.search_index.search(STAFF, search_term)
+        if keys is None:
+            return self._search_staff_like(search_term)
+        if not keys:
+            return []
+        query = """
+        SELECT nv.ma_nv, nv.ho_va_ten, nv.chuc_vu, nv.sdt, nv.ngay_vao_lam, 
+               nv.ma_quan_ly
+        FROM NHAN_VIEN nv
+        WHERE nv.ma_nv IN ({placeholders})
+        """
+        return self.search_index.fetch_ranked(query, keys, 'ma_nv')
+    
+    def _search_staff_like(self, search_term):
+        """Unindexed fallback used when the search index cannot be created"""
         query = """
         SELECT nv.ma_nv, nv.ho_va_ten, nv.chuc_vu, nv.sdt, nv.ngay_vao_lam, 
                nv.ma_quan_ly
@@ -86,7 +127,7 @@ class Staff:
         """
         search_pattern = f"%{search_term}%"
         params = (search_pattern, search_pattern, search_pattern, search_pattern)
-        return self.db.fetch_query(query, params)
+        return self.db.fetch_query(query, params, replica=True)
     
     def get_staff_by_id(self, ma_nv):
         query = """
@@ -111,9 +152,15 @@ class Staff:
             WHERE ma_nv=%s
             """
             params_nv = (ho_va_ten, sdt, chuc_vu, ngay_vao_lam_formatted, ma_quan_ly if ma_quan_ly else None, ma_nv)
-            cursor = self.db.execute_query(query_nv, params_nv)
+            self.search_index.ensure_table()
+            with self.db.transaction():
+                if not self.db.execute_query(query_nv, params_nv):
+                    raise RuntimeError("Không thể cập nhật nhân viên")
+                if not self.search_index.add_staff(ma_nv, ho_va_ten, chuc_vu, sdt):
+                    raise RuntimeError("Không thể cập nhật chỉ mục tìm kiếm")
             
-            return cursor is not None
+            data_version.bump("NHAN_VIEN")
+            return True
         except Exception as e:
             print(f"Error updating staff: {e}")
             return False
@@ -121,5 +168,15 @@ class Staff:
     def delete_staff(self, ma_nv):
         query = "DELETE FROM NHAN_VIEN WHERE ma_nv = %s"
         params = (ma_nv,)
-        cursor = self.db.execute_query(query, params)
-        return cursor is not None
+        self.search_index.ensure_table()
+        try:
+            with self.db.transaction():
+                if not self.db.execute_query(query, params):
+                    raise RuntimeError("Không thể xóa nhân viên")
+                if not self.search_index.remove(STAFF, ma_nv):
+                    raise RuntimeError("Không thể cập nhật chỉ mục tìm kiếm")
+            data_version.bump("NHAN_VIEN")
+            return True
+        except RuntimeError as e:
+            print(f"Error deleting staff: {e}")
+            return False
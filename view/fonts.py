@@ -0,0 +1,27 @@
+import tkinter as tk
+import tkinter.font as tkfont
+
+# Named fonts shared by every view: (size at 100%, weight)
+FONTS = {
+    "AppBase": (16, "normal"),
+    "AppBold": (16, "bold"),
+    "AppTree": (15, "normal"),
+    "AppHeading": (18, "bold"),
+    "AppTitle": (14, "bold"),
+}
+
+# Fonts created here; Tk deletes a named font once its Font object is collected
+_created = []
+
+
+def scale_fonts(widget, font_scale):
+    """Create the named fonts or resize them in place; every widget using one redraws"""
+    for name, (size, weight) in FONTS.items():
+        scaled = max(int(size * font_scale), 1)
+        try:
+            font = tkfont.nametofont(name, root=widget)
+        except tk.TclError:
+            _created.append(tkfont.Font(root=widget, name=name, family="Arial", size=scaled, weight=weight))
+            continue
+        if font.cget("size") != scaled:
+            font.configure(size=scaled)
@@ -1,6 +1,9 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 from datetime import datetime
+from view.paged_tree import PagedTreeview
+from view.fonts import scale_fonts
+from view.live_search import LiveSearch
 
 
 class InvoiceView:
@@ -84,33 +87,7 @@ class InvoiceView:
         self.controller = controller
         self.font_scale = font_scale
         
-        # Configure font styles with scaling
-        base_size = 16
-        heading_size = 18
-        tree_size = 15
-        
-        scaled_base = int(base_size * font_scale)
-        scaled_heading = int(heading_size * font_scale)
-        scaled_tree = int(tree_size * font_scale)
-        
-        self.default_font = ('Arial', scaled_base)
-        self.label_font = ('Arial', scaled_base)
-        self.button_font = ('Arial', scaled_base)
-        self.heading_font = ('Arial', scaled_heading, 'bold')
-        self.input_font = ('Arial', scaled_base)
-        
-        # Configure ttk styles
-        style = ttk.Style()
-        style.configure('TLabel', font=self.label_font)
-        style.configure('TLabelframe.Label', font=('Arial', scaled_base, 'bold'))
-        style.configure('TButton', font=self.button_font, padding=int(8 * font_scale))
-        style.configure('TEntry', font=self.input_font, padding=int(5 * font_scale))
-        style.configure('TCombobox', font=self.input_font, padding=int(5 * font_scale))
-        style.configure('Treeview', font=('Arial', scaled_tree), rowheight=int(20 * font_scale))
-        style.configure('Treeview.Heading', font=('Arial', scaled_base, 'bold'))
-        
-        # Configure option menu (dropdown) font
-        self.root.option_add('*TCombobox*Listbox.font', self.input_font)
+        self.apply_styles()
         
         # Configure root grid
         self.root.grid_rowconfigure(0, weight=1)
@@ -121,6 +98,30 @@ class InvoiceView:
         
         self.setup_ui()
     
+    def apply_styles(self):
+        """Size the shared named fonts and configure the ttk styles for this view"""
+        # Named fonts are resized in place: zooming redraws widgets without rebuilding them
+        scale_fonts(self.root, self.font_scale)
+        
+        self.default_font = 'AppBase'
+        self.label_font = 'AppBase'
+        self.button_font = 'AppBase'
+        self.heading_font = 'AppHeading'
+        self.input_font = 'AppBase'
+        
+        # Configure ttk styles
+        style = ttk.Style()
+        style.configure('TLabel', font=self.label_font)
+        style.configure('TLabelframe.Label', font='AppBold')
+        style.configure('TButton', font=self.button_font, padding=int(8 * self.font_scale))
+        style.configure('TEntry', font=self.input_font, padding=int(5 * self.font_scale))
+        style.configure('TCombobox', font=self.input_font, padding=int(5 * self.font_scale))
+        style.configure('Treeview', font='AppTree', rowheight=int(20 * self.font_scale))
+        style.configure('Treeview.Heading', font='AppBold')
+        
+        # Configure option menu (dropdown) font
+        self.root.option_add('*TCombobox*Listbox.font', self.input_font)
+    
     def setup_ui(self):
         """Setup the user interface"""
         # Main container
@@ -257,6 +258,10 @@ class InvoiceView:
         ttk.Label(search_frame, text="Tìm kiếm:").grid(row=0, column=0, sticky=tk.W, padx=(0, 5))
         
         self.search_var = tk.StringVar()
+        self.search_var.trace('w', self.on_search_change)
+        # Keystrokes are debounced and queried off the Tk thread
+        self.live_search = LiveSearch(self.root, lambda: self.controller.runner, self.find_invoices,
+                                      self.on_live_search_result)
         search_entry = ttk.Entry(search_frame, textvariable=self.search_var, width=35)
         search_entry.grid(row=0, column=1, sticky=tk.W, padx=5)
         
@@ -299,14 +304,25 @@ class InvoiceView:
         self.tree.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         tree_scroll_y.grid(row=1, column=1, sticky=(tk.N, tk.S))
         tree_scroll_x.grid(row=2, column=0, sticky=(tk.W, tk.E))
+        
+        # Invoice history is paged by (ngay_gio, ma_hoa_don) and only a window of pages is kept
+        self.pager = PagedTreeview(
+            self.tree, tree_scroll_y,
+            fetch_page=self.fetch_invoice_page,
+            row_key=lambda inv: (inv.get('ngay_gio'), inv.get('ma_hoa_don')),
+            row_iid=lambda inv: inv.get('ma_hoa_don'),
+            row_values=self.invoice_values
+        )
     
     def populate_medicine_combobox(self):
         """Populate medicine combobox from database"""
         if not hasattr(self, 'controller') or not self.controller:
             return
-            
+        self.controller.load_medicines()
+    
+    def set_medicines(self, medicines):
+        """Fill the medicine combobox with rows loaded by the controller"""
         try:
-            medicines = self.controller.get_all_medicines()
             if medicines:
                 display_values = []
                 self.medicine_dict = {}
@@ -481,10 +497,12 @@ class InvoiceView:
         
         giam_gia = float(giam_gia_str or 0)
         
-        success, message = self.controller.create_invoice(
-            ma_hoa_don, ten_khach_hang, ma_nv, giam_gia, self.invoice_items
+        self.controller.create_invoice(
+            ma_hoa_don, ten_khach_hang, ma_nv, giam_gia, list(self.invoice_items)
         )
-        
+    
+    def on_invoice_created(self, success, message):
+        """Result of create_invoice, delivered on the Tk thread"""
         if success:
             messagebox.showinfo("Thành công", message)
             self.on_clear_click()
@@ -516,22 +534,34 @@ class InvoiceView:
         
         self.update_total()
     
+    @staticmethod
+    def invoice_values(inv):
+        """Treeview column values for one invoice row"""
+        return (
+            inv.get('ma_hoa_don', ''),
+            inv.get('ten_khach_hang', ''),
+            inv.get('ngay_gio', ''),
+            f"{inv.get('tong_tien_hang', 0):,.0f}",
+            f"{inv.get('tong_giam_gia', 0):,.0f}",
+            f"{inv.get('thanh_tien', 0):,.0f}"
+        )
+    
+    def fetch_invoice_page(self, callback, limit, after=None, before=None):
+        """Page source for the invoice list"""
+        self.controller.load_invoice_page(callback, limit, after=after, before=before)
+    
+    def display_invoice_pages(self):
+        """Show the newest invoices; older pages are fetched while scrolling"""
+        self.pager.reset()
+    
     def display_invoices(self, invoices):
         """Display invoices in treeview"""
-        # Clear existing items
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        # Search results replace the paged history
+        self.pager.clear()
         
         # Insert new items
         for inv in invoices:
-            self.tree.insert('', tk.END, values=(
-                inv.get('ma_hoa_don', ''),
-                inv.get('ten_khach_hang', ''),
-                inv.get('ngay_gio', ''),
-                f"{inv.get('tong_tien_hang', 0):,.0f}",
-                f"{inv.get('tong_giam_gia', 0):,.0f}",
-                f"{inv.get('thanh_tien', 0):,.0f}"
-            ))
+            self.tree.insert('', tk.END, values=self.invoice_values(inv))
     
     def show_message(self, title, message, msg_type="info"):
         """Show message box"""
@@ -542,8 +572,27 @@ class InvoiceView:
         elif msg_type == "warning":
             messagebox.showwarning(title, message)
     
+    def on_search_change(self, *args):
+        """Handle search field change (for live search)"""
+        search_term = self.search_var.get().strip()
+        if search_term:
+            self.live_search.schedule(search_term)
+        else:
+            # Empty box goes back to the paged history
+            self.live_search.cancel()
+            self.loadData()
+    
+    def find_invoices(self, search_term):
+        """Runs on a TaskRunner worker thread for the live search"""
+        return self.controller.find_invoices(search_term)
+    
+    def on_live_search_result(self, search_term, invoices):
+        """Show the result of the latest live search"""
+        self.display_invoices(invoices)
+    
     def on_search_click(self):
         """Handle search button click"""
+        self.live_search.cancel()
         search_term = self.search_var.get().strip()
         if search_term:
             self.controller.search_invoices(search_term)
@@ -553,3 +602,14 @@ class InvoiceView:
     def loadData(self):
         """Load data into the invoice list"""
         self.controller.load_all_invoices()
+    
+    def refresh(self):
+        """Reload after the data changed, keeping the current search"""
+        self.populate_medicine_combobox()
+        search_term = self.search_var.get().strip()
+        if search_term:
+            # Silent, unlike the search button: a refresh nobody asked for must not pop up "not found"
+            self.controller.runner.submit(self.controller.find_invoices, search_term,
+                                          on_done=self.display_invoices)
+        else:
+            self.loadData()
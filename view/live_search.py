@@ -0,0 +1,66 @@
+from concurrent.futures import Future
+
+
+class LiveSearch:
+    """Debounced search-as-you-type that queries off the Tk thread.
+
+    schedule(term) restarts the debounce timer; when it fires, the term is submitted
+    to the controller's TaskRunner, which get_runner() returns (views get their
+    controller after they are built). A newer term cancels one that has not started
+    yet, and results of a term that is no longer the latest are dropped, so only the
+    latest result reaches on_result(term, rows) on the Tk thread.
+    """
+
+    def __init__(self, widget, get_runner, search_fn, on_result, delay_ms=300):
+        self.widget = widget
+        self.get_runner = get_runner
+        self.search_fn = search_fn
+        self.on_result = on_result
+        self.delay_ms = delay_ms
+        self._after_id = None
+        self._generation = 0
+        self._future = None
+        self.widget.bind('<Destroy>', self._on_destroy, add='+')
+
+    def schedule(self, term):
+        """Call on every keystroke"""
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+        self._after_id = self.widget.after(self.delay_ms, self._submit, term)
+
+    def cancel(self):
+        """Forget the pending keystroke and ignore any query still running"""
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+        self._generation += 1
+        self._drop_queued()
+
+    def close(self):
+        self.cancel()
+
+    def _on_destroy(self, event):
+        if event.widget is self.widget:
+            self.cancel()
+
+    def _drop_queued(self):
+        # SyncRunner returns the result itself; only a TaskRunner future can still be queued
+        if isinstance(self._future, Future):
+            self._future.cancel()
+        self._future = None
+
+    def _submit(self, term):
+        self._after_id = None
+        self._generation += 1
+        self._drop_queued()
+        generation = self._generation
+
+        def done(rows):
+            if generation == self._generation:
+                self.on_result(term, rows)
+
+        def failed(e):
+            print(f"Error in live search: {e}")
+            done([])
+
+        self._future = self.get_runner().submit(self.search_fn, term, on_done=done, on_error=failed)
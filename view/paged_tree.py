@@ -0,0 +1,131 @@
+import tkinter as tk
+
+
+class PagedTreeview:
+    """Show a bounded window of keyset pages in a Treeview, fetching more while scrolling.
+
+    fetch_page(callback, limit, after=None, before=None) passes rows newest first
+    to callback on the Tk thread, either right away or once a background query ends,
+    row_key(row) gives the (ngay_gio, id) key used for paging,
+    row_iid(row) a unique item id and row_values(row) the column values.
+    """
+    # Fetch the next page once the view is this close to either edge
+    EDGE = 0.1
+
+    def __init__(self, tree, scrollbar, fetch_page, row_key, row_iid, row_values,
+                 page_size=100, max_pages=5):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.fetch_page = fetch_page
+        self.row_key = row_key
+        self.row_iid = row_iid
+        self.row_values = row_values
+        self.page_size = page_size
+        self.max_pages = max_pages
+        # Each page: list of item ids, first/last key
+        self._pages = []
+        self._more_after = False
+        self._more_before = False
+        self._enabled = False
+        self._check_pending = False
+        # Only one fetch at a time; bumping the token drops the result of an older one
+        self._loading = False
+        self._token = 0
+        self.tree.configure(yscrollcommand=self._on_tree_scroll)
+
+    def reset(self):
+        """Drop everything and show the newest page"""
+        self.clear()
+        self._enabled = True
+        self._fetch(self._on_first_page)
+
+    def _on_first_page(self, rows):
+        self._append_page(rows)
+        self._more_after = len(rows) == self.page_size
+        self.tree.yview_moveto(0)
+
+    def clear(self):
+        """Empty the tree and stop paging (used when showing search results)"""
+        self._enabled = False
+        self._token += 1
+        self._loading = False
+        self._pages = []
+        self._more_after = self._more_before = False
+        self.tree.delete(*self.tree.get_children())
+
+    def _on_tree_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if self._enabled and not self._check_pending:
+            self._check_pending = True
+            self.tree.after_idle(self._check_edges)
+
+    def _check_edges(self):
+        self._check_pending = False
+        if not self._enabled or not self._pages or self._loading:
+            return
+        first, last = (float(f) for f in self.tree.yview())
+        if last >= 1 - self.EDGE and self._more_after:
+            self._load_after()
+        elif first <= self.EDGE and self._more_before:
+            self._load_before()
+
+    def _fetch(self, handler, after=None, before=None):
+        self._loading = True
+        token = self._token
+
+        def deliver(rows):
+            if token != self._token:
+                return
+            self._loading = False
+            handler(rows or [])
+
+        self.fetch_page(deliver, self.page_size, after=after, before=before)
+
+    def _top_index(self):
+        total = len(self.tree.get_children())
+        return round(float(self.tree.yview()[0]) * total)
+
+    def _load_after(self):
+        self._fetch(self._on_page_after, after=self._pages[-1]['last'])
+
+    def _on_page_after(self, rows):
+        top = self._top_index()
+        self._more_after = len(rows) == self.page_size
+        if not rows:
+            return
+        self._append_page(rows)
+        if len(self._pages) > self.max_pages:
+            dropped = self._pages.pop(0)
+            self.tree.delete(*dropped['iids'])
+            self._more_before = True
+            top -= len(dropped['iids'])
+        self._move_to(top)
+
+    def _load_before(self):
+        self._fetch(self._on_page_before, before=self._pages[0]['first'])
+
+    def _on_page_before(self, rows):
+        top = self._top_index()
+        self._more_before = len(rows) == self.page_size
+        if not rows:
+            return
+        iids = []
+        for index, row in enumerate(rows):
+            iids.append(self.tree.insert('', index, iid=self.row_iid(row), values=self.row_values(row)))
+        self._pages.insert(0, {'iids': iids, 'first': self.row_key(rows[0]), 'last': self.row_key(rows[-1])})
+        if len(self._pages) > self.max_pages:
+            dropped = self._pages.pop()
+            self.tree.delete(*dropped['iids'])
+            self._more_after = True
+        self._move_to(top + len(iids))
+
+    def _append_page(self, rows):
+        if not rows:
+            return
+        iids = [self.tree.insert('', tk.END, iid=self.row_iid(row), values=self.row_values(row)) for row in rows]
+        self._pages.append({'iids': iids, 'first': self.row_key(rows[0]), 'last': self.row_key(rows[-1])})
+
+    def _move_to(self, top):
+        total = len(self.tree.get_children())
+        if total:
+            self.tree.yview_moveto(max(top, 0) / total)
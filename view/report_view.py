@@ -1,35 +1,37 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
+from view.fonts import scale_fonts
 
 class ReportView:
     def __init__(self, parent, controller=None, font_scale=1.0):
         self.parent = parent
         self.controller = controller
         self.font_scale = font_scale
-        self._seniority_rows = []
-        self._revenue_rows = []
 
+        self.apply_styles()
         self._build_ui()
 
-    def _build_ui(self):
-        # Configure font styles with scaling
-        base_size = 16
-        tree_size = 15
-        
-        scaled_base = int(base_size * self.font_scale)
-        scaled_tree = int(tree_size * self.font_scale)
+    def apply_styles(self):
+        """Size the shared named fonts and configure the ttk styles for this view"""
+        # Named fonts are resized in place: zooming redraws widgets without rebuilding them
+        scale_fonts(self.parent, self.font_scale)
         
         style = ttk.Style()
-        style.configure('TLabel', font=('Arial', scaled_base))
-        style.configure('TLabelframe.Label', font=('Arial', scaled_base, 'bold'))
-        style.configure('TButton', font=('Arial', scaled_base), padding=int(8 * self.font_scale))
-        style.configure('TCombobox', font=('Arial', scaled_base), padding=int(5 * self.font_scale))
-        style.configure('Treeview', font=('Arial', scaled_tree), rowheight=int(30 * self.font_scale))
-        style.configure('Treeview.Heading', font=('Arial', scaled_base, 'bold'))
+        style.configure('TLabel', font='AppBase')
+        style.configure('TLabelframe.Label', font='AppBold')
+        style.configure('TButton', font='AppBase', padding=int(8 * self.font_scale))
+        style.configure('TCombobox', font='AppBase', padding=int(5 * self.font_scale))
+        style.configure('Treeview', font='AppTree', rowheight=int(30 * self.font_scale))
+        style.configure('Treeview.Heading', font='AppBold')
         
         # Configure option menu (dropdown) font
-        self.parent.option_add('*TCombobox*Listbox.font', ('Arial', scaled_base))
-        
+        self.parent.option_add('*TCombobox*Listbox.font', 'AppBase')
+
+    def _build_ui(self):
+        # Export progress, packed first so the notebook cannot push it out of view
+        self.export_status = ttk.Label(self.parent, text="")
+        self.export_status.pack(side=tk.BOTTOM, anchor="w", padx=8)
+
         notebook = ttk.Notebook(self.parent)
         notebook.pack(fill=tk.BOTH, expand=True, padx=8, pady=8)
 
@@ -52,11 +54,16 @@ class ReportView:
 
     # Controller callbacks
     def set_positions(self, positions):
-        self.seniority_frame.position_cb["values"] = ["(Tất cả)"] + positions
-        self.seniority_frame.position_cb.current(0)
+        cb = self.seniority_frame.position_cb
+        selected = cb.get()
+        cb["values"] = ["(Tất cả)"] + positions
+        # A reload keeps the chosen position while it still exists
+        if selected in positions:
+            cb.set(selected)
+        else:
+            cb.current(0)
 
     def render_seniority(self, rows):
-        self._seniority_rows = rows
         tv = self.seniority_frame.tree
         tv.delete(*tv.get_children())
         for r in rows:
@@ -70,7 +77,6 @@ class ReportView:
             ))
 
     def render_revenue(self, rows, total):
-        self._revenue_rows = rows
         tv = self.revenue_frame.tree
         tv.delete(*tv.get_children())
         for r in rows:
@@ -84,14 +90,22 @@ class ReportView:
         # Footer total row (disable selection style)
         tv.insert("", tk.END, values=("", "", "", "Tổng cộng", total))
 
-    # Export triggers
+    def refresh(self):
+        """Reload both reports with the filters currently chosen"""
+        self.controller.load_positions()
+        self.controller.load_seniority(self.controller.current_position_filter)
+        self.controller.load_revenue(self.controller.current_month_year or self.revenue_frame.month_year_cb.get())
+
+    def show_export_progress(self, count):
+        """Rows written so far; None clears the line once the export is done"""
+        self.export_status.config(text="" if count is None else f"Đang xuất... {count:,} dòng")
+
+    # Export triggers: the controller re-reads the rows with the current filter and streams them
     def export_seniority(self):
-        self.controller.export_seniority(self._seniority_rows)
+        self.controller.export_seniority()
 
     def export_revenue(self):
-        # Exclude footer
-        data = [r for r in self._revenue_rows]
-        self.controller.export_revenue(data)
+        self.controller.export_revenue()
 
 
 class SeniorityReportFrame:
@@ -124,7 +138,7 @@ class SeniorityReportFrame:
         title_lbl = ttk.Label(
             header_frame,
             text="BÁO CÁO THÂM NIÊN NHÂN VIÊN",
-            font=("Arial", 14, "bold")
+            font="AppTitle"
         )
         title_lbl.grid(row=0, column=1, sticky="e")
 
@@ -195,7 +209,7 @@ class RevenueReportFrame:
         title_lbl = ttk.Label(
             header_frame,
             text="BÁO CÁO DOANH THU THEO THÁNG",
-            font=("Arial", 14, "bold"),
+            font="AppTitle",
         )
         title_lbl.grid(row=0, column=1, sticky="e")
 
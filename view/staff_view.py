@@ -1,5 +1,7 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
+from view.fonts import scale_fonts
+from view.live_search import LiveSearch
 
 
 class StaffView:
@@ -98,33 +100,7 @@ class StaffView:
         self.controller = controller
         self.font_scale = font_scale
         
-        # Configure font styles with scaling
-        base_size = 16
-        heading_size = 18
-        tree_size = 15
-        
-        scaled_base = int(base_size * font_scale)
-        scaled_heading = int(heading_size * font_scale)
-        scaled_tree = int(tree_size * font_scale)
-        
-        self.default_font = ('Arial', scaled_base)
-        self.label_font = ('Arial', scaled_base)
-        self.button_font = ('Arial', scaled_base)
-        self.heading_font = ('Arial', scaled_heading, 'bold')
-        self.input_font = ('Arial', scaled_base)
-        
-        # Configure ttk styles
-        style = ttk.Style()
-        style.configure('TLabel', font=self.label_font)
-        style.configure('TLabelframe.Label', font=('Arial', scaled_base, 'bold'))
-        style.configure('TButton', font=self.button_font, padding=int(8 * font_scale))
-        style.configure('TEntry', font=self.input_font, padding=int(5 * font_scale))
-        style.configure('TCombobox', font=self.input_font, padding=int(5 * font_scale))
-        style.configure('Treeview', font=('Arial', scaled_tree), rowheight=int(30 * font_scale))
-        style.configure('Treeview.Heading', font=('Arial', scaled_base, 'bold'))
-        
-        # Configure option menu (dropdown) font
-        self.root.option_add('*TCombobox*Listbox.font', self.input_font)
+        self.apply_styles()
         
         # Configure root grid
         self.root.grid_rowconfigure(0, weight=1)
@@ -133,8 +109,35 @@ class StaffView:
         # Initialize positions as empty, will load after controller is set
         self.positions = ()
         
+        # Scroll position to put back once refresh() has reloaded the list
+        self._restore_scroll = None
+        
         self.setup_ui()
     
+    def apply_styles(self):
+        """Size the shared named fonts and configure the ttk styles for this view"""
+        # Named fonts are resized in place: zooming redraws widgets without rebuilding them
+        scale_fonts(self.root, self.font_scale)
+        
+        self.default_font = 'AppBase'
+        self.label_font = 'AppBase'
+        self.button_font = 'AppBase'
+        self.heading_font = 'AppHeading'
+        self.input_font = 'AppBase'
+        
+        # Configure ttk styles
+        style = ttk.Style()
+        style.configure('TLabel', font=self.label_font)
+        style.configure('TLabelframe.Label', font='AppBold')
+        style.configure('TButton', font=self.button_font, padding=int(8 * self.font_scale))
+        style.configure('TEntry', font=self.input_font, padding=int(5 * self.font_scale))
+        style.configure('TCombobox', font=self.input_font, padding=int(5 * self.font_scale))
+        style.configure('Treeview', font='AppTree', rowheight=int(30 * self.font_scale))
+        style.configure('Treeview.Heading', font='AppBold')
+        
+        # Configure option menu (dropdown) font
+        self.root.option_add('*TCombobox*Listbox.font', self.input_font)
+    
     def setup_ui(self):
         """Setup the user interface"""
         # Main container
@@ -228,6 +231,9 @@ class StaffView:
         
         self.search_var = tk.StringVar()
         self.search_var.trace('w', self.on_search_change)
+        # Keystrokes are debounced and queried off the Tk thread
+        self.live_search = LiveSearch(self.root, lambda: self.controller.runner, self.find_staff,
+                                      self.on_live_search_result)
         
         search_entry = ttk.Entry(search_frame, textvariable=self.search_var, width=35)
         search_entry.grid(row=0, column=0, sticky=(tk.W, tk.E), padx=5)
@@ -317,17 +323,21 @@ class StaffView:
     
     def on_search_click(self):
         """Handle search button click"""
+        self.live_search.cancel()
         search_term = self.search_var.get().strip()
         self.controller.search_staff(search_term)
     
     def on_search_change(self, *args):
         """Handle search field change (for live search)"""
-        search_term = self.search_var.get().strip()
-        if search_term:
-            self.controller.search_staff(search_term)
-        else:
-            self.loadData()
-        pass
+        self.live_search.schedule(self.search_var.get().strip())
+    
+    def find_staff(self, search_term):
+        """Runs on a TaskRunner worker thread for the live search"""
+        return self.controller.find_staff(search_term)
+    
+    def on_live_search_result(self, search_term, staff_list):
+        """Show the result of the latest live search"""
+        self.display_staff(staff_list)
     
     def on_tree_select(self, event):
         """Handle tree item selection"""
@@ -436,7 +446,15 @@ class StaffView:
     
     def update_positions(self):
         """Update positions in combobox after controller is set"""
-        self.positions = self.load_positions()
+        self.set_positions_tuple(self.load_positions())
+
+    def set_positions(self, positions_data):
+        """Fill the position combobox with rows loaded by the controller"""
+        positions = tuple(pos['chuc_vu'] for pos in positions_data or [])
+        self.set_positions_tuple(positions or ('Nhân viên bán hàng', 'Nhân viên kho', 'Quản lí của hàng', 'Quản lí'))
+
+    def set_positions_tuple(self, positions):
+        self.positions = positions
         if 'chuc_vu' in self.entries:
             self.entries['chuc_vu']['values'] = self.positions
     
@@ -444,6 +462,11 @@ class StaffView:
         """Load data into the staff list based on queries"""
         self.controller.load_all_staff()
     
+    def refresh(self):
+        """Reload the list after the data changed, keeping the search and scroll position"""
+        self._restore_scroll = self.tree.yview()[0]
+        self.controller.search_staff(self.search_var.get().strip())
+    
     def display_staff(self, staff_list):
         """Display staff in the treeview"""
         # Clear existing items
@@ -460,6 +483,10 @@ class StaffView:
                 str(emp.get('ngay_vao_lam', '')),
                 str(emp.get('ma_quan_ly', ''))
             ))
+        
+        if self._restore_scroll is not None:
+            self.tree.yview_moveto(self._restore_scroll)
+            self._restore_scroll = None
     
     def show_message(self, title, message, msg_type="info"):
         """Show message box"""
@@ -0,0 +1,98 @@
+import time
+import tkinter as tk
+from tkinter import ttk
+
+from model import data_version
+
+
+class _Tab:
+    __slots__ = ("name", "build", "tables", "max_age", "frame", "view", "controller", "versions", "loaded_at")
+
+    def __init__(self, name, build, tables, max_age):
+        self.name = name
+        self.build = build
+        self.tables = tuple(tables)
+        self.max_age = max_age
+        self.frame = None
+        self.view = None
+        self.controller = None
+        self.versions = None
+        self.loaded_at = None
+
+
+class TabManager:
+    """Build each tab once and keep it alive: switching tabs only hides and shows frames.
+
+    build(frame) creates the view and controller inside frame, starts the first load and
+    returns (view, controller). Showing a built tab again re-applies its styles (ttk styles
+    are shared by every tab) and calls view.refresh() only when one of its tables changed
+    in this process (model.data_version) or the data is older than max_age seconds.
+    """
+    def __init__(self, container):
+        self.container = container
+        self._tabs = {}
+        self.current = None
+
+    def register(self, name, build, tables=(), max_age=300):
+        self._tabs[name] = _Tab(name, build, tables, max_age)
+
+    def _stale(self, tab):
+        if data_version.current(*tab.tables) != tab.versions:
+            return True
+        return tab.max_age is not None and time.monotonic() - tab.loaded_at > tab.max_age
+
+    def _mark_loaded(self, tab):
+        # Read before the query starts, so a write racing with it still shows up next time
+        tab.versions = data_version.current(*tab.tables)
+        tab.loaded_at = time.monotonic()
+
+    def show(self, name):
+        """Bring tab `name` to the front, building it on first use"""
+        tab = self._tabs[name]
+        if self.current is tab:
+            return tab
+        if self.current is not None:
+            self.current.frame.pack_forget()
+            # The visible tab reloads itself after its own writes
+            if self.current.versions is not None:
+                self.current.versions = data_version.current(*self.current.tables)
+        self.current = tab
+        if tab.frame is None:
+            tab.frame = ttk.Frame(self.container)
+            tab.frame.pack(fill=tk.BOTH, expand=True)
+            self._mark_loaded(tab)
+            tab.view, tab.controller = tab.build(tab.frame)
+            return tab
+        tab.view.apply_styles()
+        tab.frame.pack(fill=tk.BOTH, expand=True)
+        if self._stale(tab):
+            self._mark_loaded(tab)
+            tab.view.refresh()
+        return tab
+
+    def refresh_if_stale(self):
+        """Reload the visible tab if its tables changed behind it (e.g. a background sync)"""
+        tab = self.current
+        if tab is not None and self._stale(tab):
+            self._mark_loaded(tab)
+            tab.view.refresh()
+
+    def built(self):
+        """Tabs built so far"""
+        return [tab for tab in self._tabs.values() if tab.frame is not None]
+
+    def set_font_scale(self, font_scale):
+        """Re-style the built tabs in place; hidden ones apply it when shown again"""
+        for tab in self.built():
+            tab.view.font_scale = font_scale
+        if self.current is not None:
+            self.current.view.apply_styles()
+
+    def close_all(self):
+        """Close every controller and destroy every tab"""
+        for tab in self.built():
+            tab.controller.close()
+            tab.frame.destroy()
+            tab.frame = tab.view = tab.controller = None
+            tab.versions = tab.loaded_at = None
+        self.current = None